@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+
+#--------------------------------------AGGREGATION PARAMETERS---------------------------------------------
+
+# Country classifications for which group values are calculated
+CLASSIFICATIONS = ['Region', 'Income Group', 'Least Developed Countries (LDC)',
+                   'Land Locked Developing Countries (LLDC)',
+                   'Small Island Developing States (SIDS)']
+
+# Classifications with the values 0/1 (only the group with value 1 is kept)
+FLAG_CLASSIFICATIONS = ['Least Developed Countries (LDC)', 'Land Locked Developing Countries (LLDC)',
+                        'Small Island Developing States (SIDS)']
+
+
+#--------------------------------------FUNCTION---------------------------------------------
+
+def aggregate_classifications(df_input, classification_cols=CLASSIFICATIONS, weight_indicator=None, label_col=None):
+
+    """
+    Function that takes a dataframe of country values in long format and returns the mean of
+    every indicator and year for each group of each classification (e.g. every region, every
+    income group, all LDCs). Only country rows are used, so aggregates are never aggregated
+    again. Indicator and year are factorized once and all groups are summed with np.bincount.
+
+    If weight_indicator is an indicator code (e.g. 'SP.POP.TOTL' or 'NY.GDP.MKTP.PP.KD'), the
+    mean is weighted with the value of that indicator of the same country and year; countries
+    without a weight are left out. Otherwise the simple mean is calculated.
+
+    The output has the columns of the classification, 'Indicator', 'Year' and 'Value' (in the
+    order of a groupby). If label_col is given (e.g. 'Country'), the group is written into that
+    column instead: the group value for classifications such as regions, the name of the
+    classification for 0/1 classifications.
+
+    """
+
+    ################################### Prepare country rows #####################################
+
+    # Country rows with a value only (aggregates have no country code)
+    df = df_input
+    if 'Country Code' in df.columns:
+        df = df[df['Country Code'].notna()]
+    df = df[df['Value'].notna()]
+
+    values = df['Value'].to_numpy(dtype='float64')
+
+    # Weight of each row (1 for the simple mean)
+    if weight_indicator is None:
+        weights = np.ones(len(df))
+    else:
+        df_weights = df[df['Indicator Code'] == weight_indicator].drop_duplicates(subset=['Country Code', 'Year'])
+        weight_map = pd.Series(df_weights['Value'].to_numpy(dtype='float64'),
+                               index=pd.MultiIndex.from_arrays([df_weights['Country Code'], df_weights['Year']]))
+        weights = weight_map.reindex(pd.MultiIndex.from_arrays([df['Country Code'], df['Year']])).to_numpy()
+        weights = np.where(np.isnan(weights), 0.0, weights)
+
+    # Factorize indicator and year once for all classifications
+    key_codes, key_uniques = pd.MultiIndex.from_arrays([df['Indicator'], df['Year']]).factorize()
+    n_keys = len(key_uniques)
+
+    ################################### Aggregate each classification #####################################
+
+    df_list = []
+    for col in classification_cols:
+
+        # Rows without a group (NaN) get the code -1 and are left out
+        group_codes, group_uniques = pd.factorize(df[col])
+        valid = group_codes >= 0
+        combined = group_codes[valid] * n_keys + key_codes[valid]
+        size = len(group_uniques) * n_keys
+
+        # Weighted sums and sums of weights of all (group, indicator, year) cells at once
+        sums = np.bincount(combined, weights=(values * weights)[valid], minlength=size)
+        totals = np.bincount(combined, weights=weights[valid], minlength=size)
+
+        cells = np.flatnonzero(totals > 0)
+        df_group = pd.DataFrame({col: group_uniques.take(cells // n_keys),
+                                 'Indicator': key_uniques.get_level_values(0).take(cells % n_keys),
+                                 'Year': key_uniques.get_level_values(1).take(cells % n_keys),
+                                 'Value': sums[cells] / totals[cells]})
+
+        # Countries outside a 0/1 classification are not a group
+        df_group = df_group[~(df_group[col] == 0)]
+        df_group = df_group.sort_values([col, 'Indicator', 'Year'], ignore_index=True)
+
+        if label_col is not None:
+            if col in FLAG_CLASSIFICATIONS:
+                df_group[col] = col
+            df_group = df_group.rename(columns={col: label_col})
+
+        df_list.append(df_group)
+
+    return pd.concat(df_list, ignore_index=True)
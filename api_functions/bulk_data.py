@@ -0,0 +1,171 @@
+#SOURCE WDI BULK DOWNLOAD: https://datacatalog.worldbank.org/search/dataset/0037712/World-Development-Indicators
+#SOURCE ILOSTAT BULK DOWNLOAD: https://ilostat.ilo.org/data/bulk/
+#SOURCE CHUNKED CSV READING: https://pandas.pydata.org/docs/user_guide/io.html#iterating-through-files-chunk-by-chunk
+
+import gzip
+import os
+import zipfile
+from contextlib import contextmanager
+import pandas as pd
+
+#--------------------------------------BULK PARAMETERS---------------------------------------------
+
+# Rows of a bulk file read at a time (only the selected rows of a chunk are kept)
+CHUNK_ROWS = 100000
+
+# Data file inside the WDI archive (newer archives use the first name, older ones the second)
+WDI_DATA_FILES = ['WDICSV.csv', 'WDIData.csv']
+
+# ILOSTAT dimensions that are columns of their own in the bulk files (all other dimensions,
+# e.g. AGE or ECO, are in one of the classification columns)
+ILO_DIM_COLS = {'SEX': 'sex'}
+ILO_CLASSIF_COLS = ['classif1', 'classif2']
+
+# Columns of the ILOSTAT bulk files that are read (notes, sources, ... are skipped)
+ILO_READ_COLS = ['ref_area', 'time', 'obs_value', 'sex'] + ILO_CLASSIF_COLS
+
+# Columns of the output (as returned by get_wb_data and get_ilo_data)
+OUTPUT_COLS = ['Country Code', 'Country', 'Indicator Code', 'Indicator', 'Year', 'Value', 'Region', 'Sub-region',
+               'Income Group', 'Least Developed Countries (LDC)', 'Land Locked Developing Countries (LLDC)',
+               'Small Island Developing States (SIDS)']
+
+
+#--------------------------------------FUNCTIONS---------------------------------------------
+
+def get_wb_bulk_data(bulk_path, feature_map_input, start_year_input, end_year_input, chunk_rows=CHUNK_ROWS):
+
+    """
+    Function that takes the path of a staged WDI bulk download (the CSV archive or its data
+    file), the dictionary of WB indicators and the years, and returns the data in the same
+    long format as get_wb_data (years from start_year_input up to, not including,
+    end_year_input). The file is read in chunks and only the rows of the selected indicators
+    are kept, so the whole file is never in memory.
+
+    """
+
+    indicator_codes = list(feature_map_input.keys())
+
+    # Only the key columns and the selected years are parsed
+    with _open_bulk_file(bulk_path, WDI_DATA_FILES) as file:
+        header = pd.read_csv(file, nrows=0).columns
+    year_cols = [col for col in header if col.strip().isdigit() and start_year_input <= int(col) < end_year_input]
+
+    df_list = []
+    with _open_bulk_file(bulk_path, WDI_DATA_FILES) as file:
+        for chunk in pd.read_csv(file, usecols=['Country Code', 'Indicator Code'] + year_cols, chunksize=chunk_rows):
+            chunk = chunk[chunk['Indicator Code'].isin(indicator_codes)]
+            if len(chunk):
+                df_list.append(chunk.melt(id_vars=['Country Code', 'Indicator Code'], var_name='Year', value_name='Value'))
+
+    df = pd.concat(df_list, ignore_index=True) if df_list else pd.DataFrame(columns=['Country Code', 'Indicator Code', 'Year', 'Value'])
+
+    # Years without a value are blank in the bulk file
+    df = df.dropna(subset=['Value'])
+    df['Indicator'] = df['Indicator Code'].map(feature_map_input)
+
+    return _finish_bulk_data(df)
+
+
+def get_ilo_bulk_data(bulk_dir, indicators_dict, start_year_input, end_year_input, chunk_rows=CHUNK_ROWS):
+
+    """
+    Function that takes the folder of the staged ILOSTAT bulk files (one file per indicator and
+    frequency, e.g. 'EMP_TEMP_SEX_AGE_NB_A.csv.gz'), the dictionary of ILO indicators and the
+    years, and returns the data in the same long format as get_ilo_data. Each file is read once
+    in chunks for all indicators that use it, and only the rows of the selected dimension
+    values (e.g. SEX_T and AGE_YTHADULT_YGE15) are kept.
+
+    """
+
+    # Group the named indicators by the bulk file they are in
+    files = {}
+    for name, params in indicators_dict.items():
+        files.setdefault((params['indicator'], params.get('FREQ', 'A')), []).append((name, params))
+
+    df_list = []
+    for (indicator_id, freq), entries in files.items():
+        # Only the columns the file has are read (e.g. indicators without a sex breakdown have no
+        # sex column)
+        bulk_path = os.path.join(bulk_dir, f"{indicator_id}_{freq}")
+        with _open_bulk_file(bulk_path, None) as file:
+            header = pd.read_csv(file, nrows=0).columns
+        read_cols = [col for col in ILO_READ_COLS if col in header]
+
+        with _open_bulk_file(bulk_path, None) as file:
+            for chunk in pd.read_csv(file, usecols=read_cols, chunksize=chunk_rows, dtype=str):
+
+                # Rows of the selected years (annual periods only)
+                year = pd.to_numeric(chunk['time'], errors='coerce')
+                chunk = chunk[(year >= start_year_input) & (year <= end_year_input)]
+
+                for name, params in entries:
+                    mask = pd.Series(True, index=chunk.index)
+                    for dim, value in params.items():
+                        if dim in ('indicator', 'FREQ'):
+                            continue
+                        if dim in ILO_DIM_COLS:
+                            # A dimension the file does not have matches no rows (as in the API)
+                            if ILO_DIM_COLS[dim] in chunk.columns:
+                                mask &= chunk[ILO_DIM_COLS[dim]] == value
+                            else:
+                                mask &= False
+                        else:
+                            classif_cols = [col for col in ILO_CLASSIF_COLS if col in chunk.columns]
+                            mask &= chunk[classif_cols].eq(value).any(axis=1)
+
+                    df_name = chunk.loc[mask, ['ref_area', 'time', 'obs_value']]
+                    if len(df_name):
+                        df_list.append(df_name.assign(Indicator=name, **{'Indicator Code': indicator_id}))
+
+    df = pd.concat(df_list, ignore_index=True) if df_list else pd.DataFrame(columns=['ref_area', 'time', 'obs_value', 'Indicator', 'Indicator Code'])
+    df = df.rename(columns={'ref_area': 'Country Code', 'time': 'Year', 'obs_value': 'Value'})
+    df['Value'] = pd.to_numeric(df['Value'], errors='coerce')
+    df = df.dropna(subset=['Value'])
+
+    # Rows in the order of the dictionary (as get_ilo_data)
+    order = pd.Categorical(df['Indicator'], categories=list(indicators_dict)).codes
+    df = df.iloc[order.argsort(kind='stable')]
+
+    return _finish_bulk_data(df)
+
+
+#--------------------------------------HELPER FUNCTIONS---------------------------------------------
+
+@contextmanager
+def _open_bulk_file(path, member_names):
+
+    # Open a bulk file as a binary stream: a zip archive (the member in member_names, or the
+    # largest CSV file), a gzip-compressed or a plain CSV file. Without an extension the path
+    # is tried with '.csv.gz', '.csv' and '.zip'.
+    if not os.path.exists(path):
+        for extension in ('.csv.gz', '.csv', '.zip'):
+            if os.path.exists(path + extension):
+                path = path + extension
+                break
+        else:
+            raise FileNotFoundError(f"No bulk file {path}(.csv.gz/.csv/.zip), download it first")
+
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            members = [info for info in archive.infolist() if info.filename.lower().endswith('.csv')]
+            named = [info for name in (member_names or []) for info in members if os.path.basename(info.filename) == name]
+            with archive.open(named[0] if named else max(members, key=lambda info: info.file_size)) as file:
+                yield file
+    elif path.endswith('.gz'):
+        with gzip.open(path, 'rb') as file:
+            yield file
+    else:
+        with open(path, 'rb') as file:
+            yield file
+
+
+def _finish_bulk_data(df):
+
+    # Same processing as the API fetchers: integer years, values rounded, country columns
+    # added from the classifications and all regions / aggregates dropped
+    df = df.assign(Year=pd.to_numeric(df['Year']).astype(int), Value=df['Value'].astype(float).round(2))
+    df_country_codes = pd.read_csv('country_classifications/country_codes.csv')
+    df_country_codes.rename(columns={'ISO-alpha3 Code': 'Country Code', 'Region Name': 'Region', 'Sub-region Name': 'Sub-region'}, inplace=True)
+    df = pd.merge(df, df_country_codes, on=['Country Code'], how="left")
+    df = df.dropna(subset=['Country'])
+    return df[OUTPUT_COLS].reset_index(drop=True)
@@ -0,0 +1,127 @@
+#SOURCE PARQUET IN PANDAS: https://pandas.pydata.org/docs/user_guide/io.html#parquet
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import pandas as pd
+
+#--------------------------------------CHECKPOINT PARAMETERS---------------------------------------------
+
+# Folder of the checkpoints of the refresh runs (one subfolder per get_data script)
+CHECKPOINT_DIR = os.environ.get('DDPP_CHECKPOINT_DIR', 'data/checkpoints')
+
+# File that lists the stored shards of a run
+MANIFEST_FILE = 'manifest.json'
+
+
+#--------------------------------------CLASS---------------------------------------------
+
+class RefreshCheckpoint:
+
+    """
+    Checkpoint of a refresh run (one get_data script). The result of every request (group) of
+    the fetchers is stored as a Parquet shard as soon as it arrives and listed in a manifest,
+    together with a fingerprint of the request (indicators, dimensions, years). When a failed
+    run is started again, the requests with a stored shard of the same fingerprint are read
+    from disk and only the missing ones go to the services. Call clear at the end of a
+    successful run, so that the next run fetches fresh data.
+
+    """
+
+    def __init__(self, name, checkpoint_dir=CHECKPOINT_DIR):
+        self.run_dir = os.path.join(checkpoint_dir, name)
+        self._lock = threading.Lock()
+        os.makedirs(self.run_dir, exist_ok=True)
+        self.manifest = self._read_manifest()
+        if self.manifest['shards']:
+            print(f"Resuming {self.run_dir}: {len(self.manifest['shards'])} shards stored")
+
+    def get_or_fetch(self, shard_id, params, fetch):
+
+        """
+        Function that takes the id of a shard (e.g. 'ilo/EMP_TEMP_SEX_AGE_NB/SEX_T+SEX_F'), the
+        parameters of its request and a function that fetches it (without arguments), and
+        returns the dataframe of the shard: from disk if it was stored with the same parameters,
+        otherwise it is fetched and stored.
+
+        """
+
+        fingerprint = _fingerprint(params)
+        with self._lock:
+            entry = self.manifest['shards'].get(shard_id)
+        if entry and entry['fingerprint'] == fingerprint:
+            path = os.path.join(self.run_dir, entry['file'])
+            if os.path.exists(path):
+                return pd.read_parquet(path, engine='pyarrow')
+
+        df = fetch()
+
+        # Write the shard first, then list it (a shard in the manifest is always complete)
+        file_name = f"{hashlib.sha256(shard_id.encode('utf-8')).hexdigest()[:16]}.parquet"
+        _write_atomic(os.path.join(self.run_dir, file_name), lambda tmp_path: df.to_parquet(tmp_path, engine='pyarrow'))
+        with self._lock:
+            self.manifest['shards'][shard_id] = {'file': file_name, 'fingerprint': fingerprint,
+                                                 'rows': len(df), 'stored_at': time.time()}
+            _write_atomic(os.path.join(self.run_dir, MANIFEST_FILE), self._write_manifest)
+        return df
+
+    def clear(self):
+
+        """Function that deletes all shards of the run (after the dataset was saved)."""
+
+        with self._lock:
+            shutil.rmtree(self.run_dir, ignore_errors=True)
+            os.makedirs(self.run_dir, exist_ok=True)
+            self.manifest = {'shards': {}}
+
+    ########################### Helper functions #############################
+
+    def _read_manifest(self):
+        try:
+            with open(os.path.join(self.run_dir, MANIFEST_FILE)) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {'shards': {}}
+
+    def _write_manifest(self, path):
+        with open(path, 'w') as file:
+            json.dump(self.manifest, file, indent=1)
+
+
+#--------------------------------------FUNCTIONS---------------------------------------------
+
+def checkpointed(checkpoint, shard_id, params, fetch):
+
+    """
+    Function that fetches a shard through the checkpoint (see RefreshCheckpoint.get_or_fetch),
+    or directly with fetch() if the run has no checkpoint (checkpoint is None).
+
+    """
+
+    if checkpoint is None:
+        return fetch()
+    return checkpoint.get_or_fetch(shard_id, params, fetch)
+
+
+def _fingerprint(params):
+
+    # Hash of the request parameters (same parameters, same fingerprint)
+    return hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def _write_atomic(path, write):
+
+    # Write to a temporary file first so that a crash never leaves half a file behind
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,145 @@
+#SOURCE NUMPY NAN FUNCTIONS: https://numpy.org/doc/stable/reference/generated/numpy.nanmean.html
+
+import warnings
+import numpy as np
+import pandas as pd
+from api_functions.aggregation import FLAG_CLASSIFICATIONS
+from api_functions.data_index import COUNTRY_COLS
+
+#--------------------------------------CUBE PARAMETERS---------------------------------------------
+
+# Type of the values in the cube (float32 keeps about 7 significant digits, enough for the charts;
+# use np.float64 to keep the values exactly as in the dataset)
+CUBE_DTYPE = np.float32
+
+
+#--------------------------------------CLASS---------------------------------------------
+
+class DataCube:
+
+    """
+    Values of a dataset as one dense NumPy array with the axes country x indicator x year, and
+    a code map (name -> position) for every axis. Years without data are NaN. A selection is
+    array indexing on the cube, peer and group means are NaN means over the country axis, and
+    to_frame turns a slice back into the long format of get_filtered_data (e.g. for Plotly).
+    The classifications of the countries (region, income group, ...) are kept for the group means.
+
+    """
+
+    def __init__(self, df_input, dtype=CUBE_DTYPE):
+
+        # Rows with a country, an indicator and a year (the first row of duplicates is kept)
+        df = df_input[df_input['Country'].notna() & df_input['Indicator'].notna() & df_input['Year'].notna()]
+        df = df.drop_duplicates(subset=['Country', 'Indicator', 'Year'])
+
+        # Code maps of the axes (countries and indicators in the order of the dataset)
+        country_codes, countries = pd.factorize(df['Country'])
+        indicator_codes, indicators = pd.factorize(df['Indicator'])
+        years = df['Year'].to_numpy().astype(int)
+        self.countries = list(countries)
+        self.indicators = list(indicators)
+        self.country_codes = {country: code for code, country in enumerate(self.countries)}
+        self.indicator_codes = {indicator: code for code, indicator in enumerate(self.indicators)}
+        self.first_year = int(years.min()) if len(years) else 0
+        self.years = np.arange(self.first_year, int(years.max()) + 1 if len(years) else 0)
+
+        # Dense cube, filled in one step
+        self.values = np.full((len(self.countries), len(self.indicators), len(self.years)), np.nan, dtype=dtype)
+        self.values[country_codes, indicator_codes, years - self.first_year] = df['Value'].to_numpy(dtype='float64')
+
+        # Classifications of the countries, in the order of the country axis
+        country_cols = [col for col in COUNTRY_COLS if col in df.columns]
+        self.country_dim = df.groupby('Country', sort=False)[country_cols].first().reindex(self.countries)
+
+    def get_slice(self, country_selec, start_year_selec, end_year_selec, indicator_selec):
+
+        """
+        Function takes the user selection of the dashboard and returns the values as an array
+        with the axes country x indicator x year (in the order of the selections). Countries,
+        indicators and years that are not in the dataset are NaN.
+
+        """
+
+        country_selec, indicator_selec = _as_list(country_selec), _as_list(indicator_selec)
+        country_pos = np.array([self.country_codes.get(country, -1) for country in country_selec], dtype=int)
+        indicator_pos = np.array([self.indicator_codes.get(indicator, -1) for indicator in indicator_selec], dtype=int)
+        year_pos = np.arange(start_year_selec, end_year_selec + 1) - self.first_year
+
+        # Take the cells inside the cube, leave the others empty
+        values = np.full((len(country_pos), len(indicator_pos), len(year_pos)), np.nan, dtype=self.values.dtype)
+        c_ok, i_ok = country_pos >= 0, indicator_pos >= 0
+        y_ok = (year_pos >= 0) & (year_pos < len(self.years))
+        values[np.ix_(c_ok, i_ok, y_ok)] = self.values[np.ix_(country_pos[c_ok], indicator_pos[i_ok], year_pos[y_ok])]
+        return values
+
+    def get_peer_mean(self, country_selec, start_year_selec, end_year_selec, indicator_selec):
+
+        """
+        Function takes a set of countries (e.g. the peers of a country) and returns the mean of
+        the countries with data as an array with the axes indicator x year (NaN if no country
+        has data).
+
+        """
+
+        return _nanmean(self.get_slice(country_selec, start_year_selec, end_year_selec, indicator_selec), axis=0)
+
+    def get_group_means(self, classification, start_year_selec, end_year_selec, indicator_selec):
+
+        """
+        Function takes a classification of the countries (e.g. 'Region' or 'Income Group') and
+        returns the groups and the mean of each group as an array with the axes group x
+        indicator x year. For 0/1 classifications (LDC, LLDC, SIDS) only the group 1 is kept,
+        labelled with the name of the classification.
+
+        """
+
+        group_codes, groups = pd.factorize(self.country_dim[classification])
+        if classification in FLAG_CLASSIFICATIONS:
+            keep = [code for code, group in enumerate(groups) if group == 1]
+            labels = [classification] * len(keep)
+        else:
+            keep = list(range(len(groups)))
+            labels = list(groups)
+
+        values = self.get_slice(self.countries, start_year_selec, end_year_selec, indicator_selec)
+        means = np.stack([_nanmean(values[group_codes == code], axis=0) for code in keep]) if keep \
+            else np.empty((0,) + values.shape[1:], dtype=values.dtype)
+        return labels, means
+
+    def to_frame(self, values, country_selec, start_year_selec, indicator_selec):
+
+        """
+        Function takes an array with the axes country x indicator x year (e.g. from get_slice,
+        or means with a label in country_selec) and returns it in the long format of
+        get_filtered_data: columns Year, Indicator, Country and Value, one row for every year,
+        indicator and country (in this order).
+
+        """
+
+        country_selec, indicator_selec = _as_list(country_selec), _as_list(indicator_selec)
+        n_countries, n_indicators, n_years = values.shape
+
+        # Year is the slowest and country the fastest axis of the rows
+        return pd.DataFrame({
+            'Year': np.repeat(np.arange(start_year_selec, start_year_selec + n_years), n_indicators * n_countries),
+            'Indicator': np.tile(np.repeat(np.array(indicator_selec, dtype=object), n_countries), n_years),
+            'Country': np.tile(np.array(country_selec, dtype=object), n_indicators * n_years),
+            'Value': values.transpose(2, 1, 0).ravel().astype('float64')})
+
+
+#--------------------------------------HELPER FUNCTIONS---------------------------------------------
+
+def _as_list(selection):
+
+    # Selections can be a single value or a list
+    if isinstance(selection, str):
+        return [selection]
+    return list(selection)
+
+
+def _nanmean(values, axis):
+
+    # Mean of the values with data (cells without any data stay NaN without a warning)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        return np.nanmean(values, axis=axis)
@@ -0,0 +1,140 @@
+#SOURCE OPENPYXL WRITE-ONLY MODE: https://openpyxl.readthedocs.io/en/stable/optimized.html#write-only-mode
+#SOURCE PARQUET WRITER: https://arrow.apache.org/docs/python/generated/pyarrow.parquet.ParquetWriter.html
+
+import tempfile
+import threading
+from collections import OrderedDict
+import pyarrow as pa
+import pyarrow.parquet as pq
+from openpyxl import Workbook
+
+#--------------------------------------EXPORT PARAMETERS---------------------------------------------
+
+# File formats of the downloads: file extension and MIME type
+EXPORT_FORMATS = {
+    'CSV': ('csv', 'text/csv'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'Excel': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+
+# Rows encoded at a time (one CSV chunk, Parquet row group or batch of Excel rows)
+CHUNK_ROWS = 50000
+
+# Size up to which an export is kept in memory before it is moved to a temporary file
+MAX_MEMORY_SIZE = 16 * 2**20
+
+# Rows of an Excel sheet (including the header)
+MAX_EXCEL_ROWS = 1048576
+
+# Bytes of the prepared downloads kept per dashboard (the least recently used file is dropped first)
+MAX_CACHE_SIZE = 256 * 2**20
+
+
+#--------------------------------------FUNCTIONS---------------------------------------------
+
+def export_dataset(df_input, file_format, chunk_rows=CHUNK_ROWS):
+
+    """
+    Function that takes a dataset (the full dataset or a selection of it) and one of the
+    EXPORT_FORMATS, and returns the file as a binary file object (positioned at the start).
+    The file is written chunk by chunk into a temporary file that stays in memory while it is
+    small, so neither the encoded file nor a full copy of the data is built at once.
+
+    """
+
+    file = tempfile.SpooledTemporaryFile(max_size=MAX_MEMORY_SIZE)
+    df = df_input.reset_index(drop=True)
+
+    if file_format == 'CSV':
+        for start in range(0, max(len(df), 1), chunk_rows):
+            chunk = df.iloc[start:start + chunk_rows].to_csv(index=False, header=(start == 0))
+            file.write(chunk.encode('utf-8'))
+
+    elif file_format == 'Parquet':
+        schema = pa.Schema.from_pandas(df, preserve_index=False)
+        with pq.ParquetWriter(file, schema) as writer:
+            for start in range(0, max(len(df), 1), chunk_rows):
+                chunk = df.iloc[start:start + chunk_rows]
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+    elif file_format == 'Excel':
+        if len(df) >= MAX_EXCEL_ROWS:
+            raise ValueError(f"{len(df)} rows do not fit into an Excel sheet, use CSV or Parquet")
+
+        # Write-only workbook: rows are written out as they are added
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet('Data')
+        sheet.append(list(df.columns))
+        for start in range(0, len(df), chunk_rows):
+            chunk = df.iloc[start:start + chunk_rows].astype(object)
+            for row in chunk.where(chunk.notna(), None).itertuples(index=False):
+                sheet.append(list(row))
+        workbook.save(file)
+
+    else:
+        raise ValueError(f"Unknown file format '{file_format}', use one of {list(EXPORT_FORMATS)}")
+
+    file.seek(0)
+    return file
+
+
+def get_file_name(name, file_format):
+
+    """Function that returns the file name of a download, e.g. 'employment_data.csv'."""
+
+    return f"{name}.{EXPORT_FORMATS[file_format][0]}"
+
+
+#--------------------------------------CLASS---------------------------------------------
+
+class ExportCache:
+
+    """
+    LRU cache of the prepared download files of a dashboard, shared by all sessions of a
+    server process (create it with st.cache_resource). A file is stored once under its key
+    (data, format, selection and version of the data), so sessions only keep the key and
+    sessions that ask for the same file share one copy. Files larger than the cache are
+    returned but not kept (check with `key in cache`).
+
+    """
+
+    def __init__(self, max_size=MAX_CACHE_SIZE):
+        self.max_size = max_size
+        self.size = 0
+        self._files = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._files
+
+    def get_file(self, key, build_file):
+
+        """
+        Function that takes the key of a download and a function that builds the file (without
+        arguments, returning a file object or bytes), and returns the file as bytes: from the
+        cache if it was built before, otherwise it is built. Returns None for a key that is
+        not cached if build_file is None.
+
+        """
+
+        with self._lock:
+            data = self._files.get(key)
+            if data is not None:
+                self._files.move_to_end(key)
+                return data
+        if build_file is None:
+            return None
+
+        data = build_file()
+        if not isinstance(data, bytes):
+            with data:
+                data = data.read()
+        with self._lock:
+            if key not in self._files and len(data) <= self.max_size:
+                self._files[key] = data
+                self.size += len(data)
+                while self.size > self.max_size:
+                    _, dropped = self._files.popitem(last=False)
+                    self.size -= len(dropped)
+        return data
@@ -0,0 +1,202 @@
+import numpy as np
+import pandas as pd
+from pandas.api.extensions import take
+
+#--------------------------------------INDEX PARAMETERS---------------------------------------------
+
+# Columns that identify a value in the dashboards
+KEY_COLS = ['Year', 'Indicator', 'Country']
+
+# Static attributes of the indicators and countries (taken from the dimension tables)
+INDICATOR_COLS = ['Indicator Code']
+COUNTRY_COLS = ['Country Code', 'Region', 'Sub-region', 'Income Group', 'Least Developed Countries (LDC)',
+                'Land Locked Developing Countries (LLDC)', 'Small Island Developing States (SIDS)']
+
+
+#--------------------------------------CLASS---------------------------------------------
+
+class DatasetIndex:
+
+    """
+    Dataset of a dashboard sorted by country, indicator and year, with the position of every
+    (country, indicator) block in a dictionary. A selection looks up its blocks, cuts the years
+    out of each block with a binary search and builds the complete year x indicator x country
+    grid with NumPy, without scanning or merging the whole dataset. Static attributes of the
+    countries (region, income group, ...) and indicators (code) are kept in dimension tables,
+    the first and last year with data of every country and indicator in a coverage index.
+
+    """
+
+    def __init__(self, df_input, indicator_dim=None):
+
+        # indicator_dim replaces the dimension table of the indicators, e.g. if the dataset is a
+        # part of a larger dataset whose indicators all have to be known
+
+        # Sort by country, indicator and year (stable, so duplicates keep their order)
+        df = df_input.reset_index(drop=True)
+        country_codes, countries = pd.factorize(df['Country'])
+        indicator_codes, indicators = pd.factorize(df['Indicator'])
+        order = np.lexsort((df['Year'].to_numpy(), indicator_codes, country_codes))
+        self.df = df.take(order).reset_index(drop=True)
+        self.years = self.df['Year'].to_numpy()
+
+        # Start and end position of every (country, indicator) block
+        country_codes = country_codes[order]
+        indicator_codes = indicator_codes[order]
+        starts = np.flatnonzero(np.r_[True, (np.diff(country_codes) != 0) | (np.diff(indicator_codes) != 0)][:len(self.df)])
+        ends = np.r_[starts[1:], len(self.df)]
+        self.blocks = {(countries[country_codes[start]], indicators[indicator_codes[start]]): (start, end)
+                       for start, end in zip(starts, ends) if country_codes[start] >= 0 and indicator_codes[start] >= 0}
+
+        # Columns of the output (key columns first, like after a merge on them)
+        self.value_cols = [col for col in self.df.columns if col not in KEY_COLS]
+
+        # Dimension tables with the static attributes of every country and indicator
+        country_cols = [col for col in COUNTRY_COLS if col in self.df.columns]
+        indicator_cols = [col for col in INDICATOR_COLS if col in self.df.columns]
+        self.country_dim = self.df.groupby('Country', sort=False, observed=True)[country_cols].first()
+        if indicator_dim is None:
+            indicator_dim = self.df.groupby('Indicator', sort=False, observed=True)[indicator_cols].first()
+        self.indicator_dim = indicator_dim
+
+        # First and last year with a value of every (country, indicator) block and every country
+        # (and of the whole dataset)
+        self.indicator_years = {}
+        self.country_years = {}
+        self._indicator_set_years = {}
+        has_value = self.df['Value'].notna().to_numpy() if 'Value' in self.df.columns else np.ones(len(self.df), bool)
+        rows = np.flatnonzero(has_value)
+        self.year_range = (int(self.years[rows].min()), int(self.years[rows].max())) if len(rows) else (None, None)
+        if len(rows):
+            block_ids = np.searchsorted(starts, rows, side='right') - 1
+            blocks, first_rows = np.unique(block_ids, return_index=True)
+            last_rows = np.r_[first_rows[1:], len(rows)] - 1
+            for block, first, last in zip(blocks, rows[first_rows], rows[last_rows]):
+                start = starts[block]
+                if country_codes[start] < 0 or indicator_codes[start] < 0:
+                    continue
+                country, indicator = countries[country_codes[start]], indicators[indicator_codes[start]]
+                first_year, last_year = int(self.years[first]), int(self.years[last])
+                self.indicator_years[(country, indicator)] = (first_year, last_year)
+                country_first, country_last = self.country_years.get(country, (first_year, last_year))
+                self.country_years[country] = (min(country_first, first_year), max(country_last, last_year))
+
+    def get_year_range(self, country_selec, indicator_selec=None):
+
+        """
+        Function takes a country or a list of countries (and optionally a set of indicators)
+        and returns the first and last year with data of any of the countries (for these
+        indicators), or (None, None) if there is no data. The years are looked up in the
+        coverage index built with the index.
+
+        """
+
+        if country_selec is None or isinstance(country_selec, str):
+            country_selec = [country_selec]
+        if isinstance(indicator_selec, str):
+            indicator_selec = [indicator_selec]
+
+        ranges = []
+        for country in country_selec:
+            if indicator_selec is None:
+                year_range = self.country_years.get(country, (None, None))
+            else:
+                year_range = self._get_indicator_set_years(country, frozenset(indicator_selec))
+            if year_range[0] is not None:
+                ranges.append(year_range)
+
+        if not ranges:
+            return (None, None)
+        return (min(first for first, _ in ranges), max(last for _, last in ranges))
+
+    def get_filtered_data(self, country_selec, start_year_selec, end_year_selec, indicator_selec):
+
+        """
+        Function takes the user selection of the dashboard as an input and returns the selected
+        data with one row for every year, indicator and country (in this order). Years without
+        data get empty values; the indicator code and the country columns are looked up in the
+        dimension tables.
+
+        """
+
+        # Turn selections into lists
+        if isinstance(country_selec, str):
+            country_selec = [country_selec]
+        if isinstance(indicator_selec, str):
+            indicator_selec = [indicator_selec]
+        country_selec = list(country_selec)
+        indicator_selec = list(indicator_selec)
+
+        n_countries = len(country_selec)
+        n_cells_per_year = len(indicator_selec) * n_countries
+        n_years = max(end_year_selec - start_year_selec + 1, 0)
+
+        ########################### Look up the rows of the selection #############################
+
+        positions = []
+        cells = []
+        for i, indicator in enumerate(indicator_selec):
+            for c, country in enumerate(country_selec):
+                block = self.blocks.get((country, indicator))
+                if block is None:
+                    continue
+                start, end = block
+                first = start + np.searchsorted(self.years[start:end], start_year_selec, side='left')
+                last = start + np.searchsorted(self.years[start:end], end_year_selec, side='right')
+                if first < last:
+                    rows = np.arange(first, last)
+                    positions.append(rows)
+                    cells.append((self.years[rows] - start_year_selec) * n_cells_per_year + i * n_countries + c)
+
+        ########################### Build the complete grid #############################
+
+        # Every cell of the grid gets its rows, cells without data get one empty row (position -1)
+        all_cells = np.arange(n_years * n_cells_per_year)
+        if positions:
+            positions = np.concatenate(positions)
+            cells = np.concatenate(cells)
+            empty = np.setdiff1d(all_cells, cells, assume_unique=False)
+            positions = np.concatenate([positions, np.full(len(empty), -1)])
+            cells = np.concatenate([cells, empty])
+            order = np.argsort(cells, kind='stable')
+            positions, cells = positions[order], cells[order]
+        else:
+            positions = np.full(len(all_cells), -1)
+            cells = all_cells
+
+        country_pos = cells % n_countries
+        indicator_pos = (cells % n_cells_per_year) // n_countries
+        df_out = pd.DataFrame({
+            'Year': start_year_selec + cells // n_cells_per_year,
+            'Indicator': np.array(indicator_selec, dtype=object)[indicator_pos],
+            'Country': np.array(country_selec, dtype=object)[country_pos]})
+
+        # Row of each country and indicator in the dimension tables (-1 if unknown)
+        country_rows = self.country_dim.index.get_indexer(country_selec)[country_pos]
+        indicator_rows = self.indicator_dim.index.get_indexer(indicator_selec)[indicator_pos]
+
+        # Values from the dataset, static attributes from the dimension tables (also for empty rows)
+        for col in self.value_cols:
+            if col in self.country_dim.columns:
+                df_out[col] = take(self.country_dim[col].array, country_rows, allow_fill=True)
+            elif col in self.indicator_dim.columns:
+                df_out[col] = take(self.indicator_dim[col].array, indicator_rows, allow_fill=True)
+            else:
+                df_out[col] = take(self.df[col].array, positions, allow_fill=True)
+
+        return df_out
+
+    ########################### Helper functions #############################
+
+    def _get_indicator_set_years(self, country, indicator_set):
+
+        # Year range of a set of indicators of a country (memoized per country and set)
+        key = (country, indicator_set)
+        if key not in self._indicator_set_years:
+            ranges = [self.indicator_years[(country, indicator)] for indicator in indicator_set
+                      if (country, indicator) in self.indicator_years]
+            if ranges:
+                self._indicator_set_years[key] = (min(first for first, _ in ranges), max(last for _, last in ranges))
+            else:
+                self._indicator_set_years[key] = (None, None)
+        return self._indicator_set_years[key]
@@ -0,0 +1,191 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+from api_functions.data_cube import DataCube
+from api_functions.data_export import export_dataset
+from api_functions.data_index import DatasetIndex
+from api_functions.profile_bundle import IndexProfiles, ProfileBundle
+
+#--------------------------------------CLASS---------------------------------------------
+
+class DataService:
+
+    """
+    Read-only dataset of a dashboard, shared by all sessions of a server process (create it
+    with st.cache_resource). The dataset is loaded once with the loader function and loaded
+    again only when the file (or the files of a Parquet folder) changes. The index of the
+    dataset, the data cube, the CSV download and the profile bundle are built once per
+    version of the file (version counts the loads, e.g. for keys of caches built from the
+    dataset).
+
+    Sessions get shallow copies of a read-only dataset: adding or replacing columns does not
+    change the shared dataset, and changing values in place raises a ValueError (the value
+    arrays are not writeable). While a new version of the file is written, the current version
+    is served.
+
+    """
+
+    def __init__(self, path, loader):
+        self.path = path
+        self.loader = loader
+        self.memory_usage = 0
+        self.version = 0
+        self._signature = None
+        self._df = None
+        self._index = None
+        self._cube = None
+        self._csv = None
+        self._bundle = None
+        self._lock = threading.Lock()
+
+    def get_data(self):
+
+        """Function that returns the dataset (as a shallow copy of the read-only data, see above)."""
+
+        return self._refresh().copy(deep=False)
+
+    def get_index(self):
+
+        """Function that returns the DatasetIndex of the dataset for the data selections."""
+
+        self._refresh()
+        with self._lock:
+            if self._index is None:
+                self._index = DatasetIndex(self._df)
+                self._update_memory_usage()
+            return self._index
+
+    def get_cube(self):
+
+        """Function that returns the DataCube of the dataset (dense array of all values, e.g. for averages)."""
+
+        self._refresh()
+        with self._lock:
+            if self._cube is None:
+                self._cube = DataCube(self._df)
+                self._update_memory_usage()
+            return self._cube
+
+    def get_csv(self, csv_path=None):
+
+        """
+        Function that returns the dataset as CSV (bytes) for the download of the full dataset,
+        built on the first request and shared by all sessions. If the get_data script exported
+        the dataset to csv_path (and the export is not older than the dataset), the file is 
+        served instead of encoding the dataset.
+
+        """
+
+        self._refresh()
+        with self._lock:
+            if self._csv is None:
+                if csv_path and self._is_current(csv_path):
+                    with open(csv_path, 'rb') as file:
+                        self._csv = file.read()
+                else:
+                    self._csv = export_dataset(self._df, 'CSV').read()
+                self._update_memory_usage()
+            return self._csv
+
+    def get_profiles(self, bundle_path):
+
+        """
+        Function that returns the ProfileBundle of the dataset, written by the get_data script.
+        If it is missing or older than the dataset, the profiles are taken from the index of
+        the dataset instead (IndexProfiles); the dashboards never write the bundle.
+
+        """
+
+        self._refresh()
+        with self._lock:
+            if self._bundle is None and self._is_current(bundle_path):
+                self._bundle = ProfileBundle(bundle_path)
+            if self._bundle is not None:
+                return self._bundle
+        return IndexProfiles(self.get_index())
+
+    ########################### Helper functions #############################
+
+    def _file_signature(self):
+
+        # Modification time and size of the file (of all files if the path is a folder)
+        if os.path.isdir(self.path):
+            files = sorted(os.path.join(root, name) for root, _, names in os.walk(self.path) for name in names)
+        else:
+            files = [self.path]
+        signature = []
+        for file in files:
+            stat = os.stat(file)
+            signature.append((file, stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def _is_current(self, path):
+
+        # Whether a file built from the dataset exists and is not older than the dataset
+        data_mtime = max(mtime for _, mtime, _ in self._signature)
+        return os.path.exists(path) and os.stat(path).st_mtime_ns >= data_mtime
+
+    def _refresh(self):
+
+        # Load the dataset if it was not loaded yet or the file changed since. save_dataset
+        # replaces the folder of a Parquet dataset, so files can disappear while they are read:
+        # the current version is served then and the new one is loaded on a later call
+        try:
+            signature = self._file_signature()
+        except FileNotFoundError:
+            if self._df is None:
+                raise
+            return self._df
+        with self._lock:
+            if signature != self._signature:
+                try:
+                    df = _read_only(self.loader(self.path))
+                except FileNotFoundError:
+                    if self._df is None:
+                        raise
+                    return self._df
+                self._df = df
+                self._index = None
+                self._cube = None
+                self._csv = None
+                self._bundle = None
+                self._signature = signature
+                self.version += 1
+                self._update_memory_usage()
+                print(f"Loaded {self.path}: {len(self._df)} rows, {self.memory_usage / 2**20:.1f} MB in memory")
+            return self._df
+
+    def _update_memory_usage(self):
+
+        # Bytes held by the dataset, its index, the data cube and the CSV download
+        memory_usage = int(self._df.memory_usage(deep=True).sum())
+        if self._index is not None:
+            memory_usage += int(self._index.df.memory_usage(deep=True).sum())
+        if self._cube is not None:
+            memory_usage += self._cube.values.nbytes
+        if self._csv is not None:
+            memory_usage += len(self._csv)
+        self.memory_usage = memory_usage
+
+
+#--------------------------------------HELPER FUNCTIONS---------------------------------------------
+
+def _read_only(df_input):
+
+    # Copy of the dataset whose value arrays (and category codes) are not writeable, one
+    # array per column so that no consolidation copies them back into writeable blocks
+    columns = {}
+    for col in df_input.columns:
+        series = df_input[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            codes = series.cat.codes.to_numpy().copy()
+            codes.flags.writeable = False
+            columns[col] = pd.Categorical.from_codes(codes, dtype=series.dtype)
+        elif isinstance(series.dtype, np.dtype):
+            values = series.to_numpy(copy=True)
+            values.flags.writeable = False
+            columns[col] = values
+        else:
+            columns[col] = series.array
+    return pd.DataFrame(columns, index=df_input.index, columns=df_input.columns, copy=False)
@@ -0,0 +1,117 @@
+#SOURCE PARQUET IN PANDAS: https://pandas.pydata.org/docs/user_guide/io.html#parquet
+#SOURCE PARTITIONED DATASETS: https://arrow.apache.org/docs/python/parquet.html#partitioned-datasets-multiple-files
+
+import os
+import shutil
+import tempfile
+import pandas as pd
+
+#--------------------------------------STORE PARAMETERS---------------------------------------------
+
+# Columns that are stored dictionary-encoded (few distinct values repeated on many rows)
+CATEGORICAL_COLS = ['Country Code', 'Country', 'Indicator Code', 'Indicator', 'Region', 'Sub-region',
+                    'Income Group', 'Least Developed Countries (LDC)',
+                    'Land Locked Developing Countries (LLDC)', 'Small Island Developing States (SIDS)']
+
+# The datasets are split into one folder per year
+PARTITION_COLS = ['Year']
+
+# Classification flags (0 or 1, empty for groups)
+FLAG_COLS = ['Least Developed Countries (LDC)', 'Land Locked Developing Countries (LLDC)',
+             'Small Island Developing States (SIDS)']
+
+
+#--------------------------------------FUNCTIONS---------------------------------------------
+
+def merge_datasets(df_inputs):
+
+    """
+    Function that takes the datasets of several sources (in order of priority) and returns
+    them as one dataset. An indicator delivered by more than one source is taken from the
+    first source only, duplicate rows are dropped, rows without a year are left out and the
+    year, value and classification columns get one data type. The rows are sorted by country,
+    indicator and year (the order of the dataset index).
+
+    """
+
+    df = pd.concat([df.assign(_Source=source) for source, df in enumerate(df_inputs)], ignore_index=True)
+
+    # Normalize the data types (sources read from CSV files can have float or string years)
+    df = df.dropna(subset=['Year'])
+    df['Year'] = pd.to_numeric(df['Year']).astype(int)
+    df['Value'] = pd.to_numeric(df['Value'], errors='coerce').astype('float64')
+    for col in FLAG_COLS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float64')
+
+    # Overlapping indicators: keep the rows of the first source that has the indicator
+    first_source = df.groupby('Indicator', dropna=False)['_Source'].transform('min')
+    df = df[df['_Source'] == first_source].drop(columns=['_Source'])
+
+    # Duplicate rows (same country, indicator, year and classification, keep the first value)
+    df = df.drop_duplicates(subset=[col for col in df.columns if col != 'Value'], keep='first')
+
+    return df.sort_values(['Country', 'Indicator', 'Year'], kind='stable').reset_index(drop=True)
+
+
+def save_dataset(df_input, path, excel_path=None, csv_path=None):
+
+    """
+    Function that takes a dataset of one of the dashboards and stores it as a partitioned
+    Parquet dataset (a folder, e.g. 'data/employment_data.parquet'). Country, indicator and
+    classification columns are stored as categories. If excel_path or csv_path is given, the
+    dataset is also exported as an Excel or CSV file.
+
+    """
+
+    df = df_input.reset_index(drop=True)
+    for col in CATEGORICAL_COLS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    df['Year'] = df['Year'].astype(int)
+
+    # Write into a temporary folder first and replace the old dataset at the end, so that the
+    # dashboards never read half a dataset (and no files of an old dataset are left behind)
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(dir=parent, suffix='.tmp')
+    try:
+        df.to_parquet(tmp_path, engine='pyarrow', partition_cols=PARTITION_COLS, index=False)
+        old_path = None
+        if os.path.exists(path):
+            old_path = tempfile.mkdtemp(dir=parent, suffix='.old')
+            os.rmdir(old_path)
+            os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        if old_path:
+            shutil.rmtree(old_path)
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+    # Excel and CSV are only exports for users, the dashboards read the Parquet dataset
+    if excel_path:
+        df_input.to_excel(excel_path, index=False)
+    if csv_path:
+        df_input.to_csv(csv_path, index=False)
+
+
+def load_dataset(path):
+
+    """
+    Function that takes the path of a dataset stored with save_dataset and returns it as a
+    dataframe (categorical columns stay categorical, the year is an integer again).
+
+    """
+
+    df = pd.read_parquet(path, engine='pyarrow')
+
+    # Partition columns are read back as categories
+    df['Year'] = df['Year'].astype(int)
+
+    # Dictionary-encoded numbers (the classification flags) are read back decoded
+    for col in CATEGORICAL_COLS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+
+    return df
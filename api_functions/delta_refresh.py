@@ -0,0 +1,171 @@
+#SOURCE PARQUET IN PANDAS: https://pandas.pydata.org/docs/user_guide/io.html#parquet
+
+import json
+import os
+import tempfile
+import time
+import pandas as pd
+
+#--------------------------------------REFRESH PARAMETERS---------------------------------------------
+
+# Folder of the stored observations (one subfolder per get_data script, one file per source)
+STORE_DIR = os.environ.get('DDPP_OBSERVATION_DIR', 'data/observations')
+
+# Number of years before the last fetched year that are fetched again, because the sources
+# revise their latest values (at least the last fetched year is always fetched again)
+REVISION_LOOKBACK = 2
+
+# Columns that identify an observation (a new value replaces the stored one); any other
+# column of the fetched data that is not a value or an attribute of the country (e.g. a SEX or
+# classif1 dimension) is part of the key as well
+KEY_COLS = ['Country Code', 'Indicator Code', 'Indicator', 'Year']
+ATTRIBUTE_COLS = ['Value', 'Country', 'Region', 'Sub-region', 'Income Group', 'Least Developed Countries (LDC)',
+                  'Land Locked Developing Countries (LLDC)', 'Small Island Developing States (SIDS)']
+
+# Columns of the output if there are no observations (as returned by the fetchers)
+OBSERVATION_COLS = ['Country Code', 'Country', 'Indicator Code', 'Indicator', 'Year', 'Value', 'Region', 'Sub-region',
+                    'Income Group', 'Least Developed Countries (LDC)', 'Land Locked Developing Countries (LLDC)',
+                    'Small Island Developing States (SIDS)']
+
+
+#--------------------------------------CLASS---------------------------------------------
+
+class ObservationStore:
+
+    """
+    Observations fetched by earlier runs of a get_data script, one Parquet file per source
+    (e.g. 'wb', 'ilo', 'imf') and a manifest with the years that were fetched for every
+    indicator. A refresh only asks the sources for the years after the stored ones (plus the
+    revision lookback) and upserts the new observations into the store.
+
+    """
+
+    def __init__(self, name, store_dir=STORE_DIR):
+        self.store_dir = os.path.join(store_dir, name)
+        os.makedirs(self.store_dir, exist_ok=True)
+        self.manifest = self._read_manifest()
+
+    def get_window_start(self, source, indicator, start_year_input, end_year_input, lookback=REVISION_LOOKBACK):
+
+        """
+        Function that takes an indicator of a source and the years of the run, and returns the
+        first year that has to be requested: the start year if the indicator was never fetched
+        from it (or only from a later year), otherwise the last fetched year minus the lookback.
+
+        """
+
+        entry = self.manifest.get(source, {}).get(indicator)
+        if entry is None or entry['start'] > start_year_input:
+            return start_year_input
+        return max(start_year_input, min(entry['end'], end_year_input) - max(lookback, 1))
+
+    def get_observations(self, source):
+
+        """Function that returns all stored observations of a source (empty if there are none)."""
+
+        path = self._path(source)
+        if not os.path.exists(path):
+            return pd.DataFrame()
+        return pd.read_parquet(path, engine='pyarrow')
+
+    def upsert(self, source, df_input, indicators, start_year_input, end_year_input):
+
+        """
+        Function that takes the observations fetched from a source for some indicators and
+        years, and stores them: observations with the same key (country, indicator, year and
+        dimensions, see KEY_COLS) replace the stored ones, all others are added. The fetched
+        years are noted for the indicators.
+
+        """
+
+        # Store the observations (if the fetch returned any)
+        if len(df_input):
+            self._write_observations(source, df_input)
+
+        # Note the fetched years (the store covers the years from the first start year on)
+        entries = self.manifest.setdefault(source, {})
+        for indicator in indicators:
+            entry = entries.get(indicator)
+            start = start_year_input if entry is None else min(entry['start'], start_year_input)
+            end = end_year_input if entry is None else max(entry['end'], end_year_input)
+            entries[indicator] = {'start': start, 'end': end, 'fetched_at': time.time()}
+        self._write_manifest()
+
+    ########################### Helper functions #############################
+
+    def _path(self, source):
+        return os.path.join(self.store_dir, f"{source}.parquet")
+
+    def _write_observations(self, source, df_input):
+
+        # Upsert the observations on their key and sort them by it, so that a refresh returns
+        # the same rows in the same order as the run before
+        df = pd.concat([self.get_observations(source), df_input], ignore_index=True)
+        key_cols = KEY_COLS + [col for col in df.columns if col not in KEY_COLS + ATTRIBUTE_COLS]
+        df = df.drop_duplicates(subset=key_cols, keep='last').sort_values(KEY_COLS, kind='stable').reset_index(drop=True)
+
+        # Write to a temporary file first so that a failed run never leaves half a file behind
+        fd, tmp_path = tempfile.mkstemp(dir=self.store_dir, suffix='.tmp')
+        os.close(fd)
+        try:
+            df.to_parquet(tmp_path, engine='pyarrow', index=False)
+            os.replace(tmp_path, self._path(source))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def _read_manifest(self):
+        try:
+            with open(os.path.join(self.store_dir, 'manifest.json')) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_manifest(self):
+        fd, tmp_path = tempfile.mkstemp(dir=self.store_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as file:
+            json.dump(self.manifest, file, indent=1)
+        os.replace(tmp_path, os.path.join(self.store_dir, 'manifest.json'))
+
+
+#--------------------------------------FUNCTION---------------------------------------------
+
+def refresh_indicators(store, source, indicators_map, start_year_input, end_year_input, fetch,
+                       lookback=REVISION_LOOKBACK):
+
+    """
+    Function that takes the dictionary of indicators of a source (as passed to its fetcher),
+    the years of the run and a function fetch(indicators_map, start_year, end_year) that calls
+    the fetcher (e.g. get_wb_data). The indicators are grouped by the first year they need (see
+    ObservationStore.get_window_start) and every group is fetched for its window only. The new
+    observations are upserted into the store, and the output holds the stored observations of
+    all indicators of the run between the start and end year (in the order of the dictionary).
+
+    The indicator names of the output are the values of the dictionary if they are names
+    (e.g. WB code: name), otherwise the keys (e.g. ILO name: parameters).
+
+    """
+
+    # Group the indicators by the first year to request
+    windows = {}
+    for key in indicators_map:
+        window_start = store.get_window_start(source, key, start_year_input, end_year_input, lookback)
+        windows.setdefault(window_start, []).append(key)
+
+    # Fetch each group for its years only and store the observations. Indicators without any
+    # observation are not noted as fetched, so the next run asks for all their years again
+    names = {key: value if isinstance(value, str) else key for key, value in indicators_map.items()}
+    for window_start, keys in sorted(windows.items()):
+        print(f"{source}: fetching {len(keys)} indicators from {window_start} to {end_year_input}")
+        df_new = fetch({key: indicators_map[key] for key in keys}, window_start, end_year_input)
+        fetched_names = set(df_new['Indicator']) if 'Indicator' in df_new.columns else set()
+        store.upsert(source, df_new, [key for key in keys if names[key] in fetched_names], start_year_input, end_year_input)
+
+    # Observations of the run from the store (none if nothing was ever stored)
+    names = list(names.values())
+    df = store.get_observations(source)
+    if 'Indicator' not in df.columns:
+        return pd.DataFrame(columns=OBSERVATION_COLS)
+    df = df[df['Indicator'].isin(names) & (df['Year'] >= start_year_input) & (df['Year'] <= end_year_input)]
+    order = pd.Categorical(df['Indicator'], categories=names).codes
+    return df.iloc[order.argsort(kind='stable')].reset_index(drop=True)
@@ -0,0 +1,114 @@
+import pandas as pd
+
+#--------------------------------------DERIVED PARAMETERS---------------------------------------------
+
+# Here you define the indicators that are calculated from indicators already in the dataset. The
+# name is used as indicator code and indicator name of the new rows. Available types:
+#   'growth': annual growth rate of 'indicator' in % (needs the value of the previous year)
+#   'share':  'numerator' as % of 'denominator' (same country and year)
+#   'ratio':  'numerator' divided by 'denominator' (same country and year)
+# Derived indicators can be used in the definitions that follow them.
+
+# DERIVED_INDICATORS = {}
+# DERIVED_INDICATORS['GDP Growth'] = {'type': 'growth', 'indicator': 'NY.GDP.MKTP.PP.KD'}
+# DERIVED_INDICATORS['Population Growth'] = {'type': 'growth', 'indicator': 'SP.POP.TOTL'}
+# DERIVED_INDICATORS['GDP per capita (calculated)'] = {'type': 'ratio', 'numerator': 'NY.GDP.MKTP.PP.KD', 'denominator': 'SP.POP.TOTL'}
+
+# Columns that identify a value (all other columns except indicator and value describe the country)
+ID_COLS = ['Country Code', 'Year']
+
+
+#--------------------------------------FUNCTIONS---------------------------------------------
+
+def _previous_year(values):
+
+    # Move the values one year ahead and align them with the original rows, so that each row
+    # holds the value of the previous year of the same country (NaN if there is none)
+    shifted = values.copy()
+    shifted.index = pd.MultiIndex.from_arrays([values.index.get_level_values('Country Code'),
+                                               values.index.get_level_values('Year') + 1], names=ID_COLS)
+    return shifted.reindex(values.index)
+
+
+def add_derived_indicators(df_input, derived_map_input):
+
+    """
+    Function that takes a dataframe in long format (one row per country, indicator and year)
+    and a dictionary of derived indicators, and returns the dataframe with the rows of the
+    derived indicators appended. All indicators are put side by side once and each derived
+    indicator is a vectorized operation on those columns, so no row is looked up twice.
+
+    """
+
+    ################################### Wide table of all indicators #####################################
+
+    # One column per indicator code, one row per country and year (sorted)
+    wide = (df_input.drop_duplicates(subset=ID_COLS + ['Indicator Code'])
+                    .set_index(ID_COLS + ['Indicator Code'])['Value']
+                    .unstack('Indicator Code')
+                    .sort_index())
+
+    ################################### Calculate derived indicators #####################################
+
+    derived = {}
+    for name, definition in derived_map_input.items():
+
+        if definition['type'] == 'growth':
+            values = (wide[definition['indicator']] / _previous_year(wide[definition['indicator']]) - 1) * 100
+        elif definition['type'] == 'share':
+            values = wide[definition['numerator']] / wide[definition['denominator']] * 100
+        elif definition['type'] == 'ratio':
+            values = wide[definition['numerator']] / wide[definition['denominator']]
+        else:
+            raise ValueError(f"Unknown type of derived indicator {name}: {definition['type']}")
+
+        # Make the indicator available to the definitions that follow
+        wide[name] = values
+        derived[name] = values
+
+    if not derived:
+        return df_input
+
+    ################################### Back to long format #####################################
+
+    df_derived = (pd.concat(derived, names=['Indicator Code'])
+                    .dropna()
+                    .round(2)
+                    .rename('Value')
+                    .reset_index())
+    df_derived['Indicator'] = df_derived['Indicator Code']
+
+    # Add the country columns (region, income group, ...) of the original rows
+    country_cols = [col for col in df_input.columns if col not in ID_COLS + ['Indicator Code', 'Indicator', 'Value']]
+    df_countries = df_input.drop_duplicates(subset=['Country Code'])[['Country Code'] + country_cols]
+    df_derived = pd.merge(df_derived, df_countries, on=['Country Code'], how='left')
+
+    return pd.concat([df_input, df_derived[df_input.columns]], ignore_index=True)
+
+
+def share_of_total(df_input, part_indicators, total_indicators):
+
+    """
+    Function that takes data in long format with indicator names (e.g. a selection of the
+    dashboards for any set of countries and years) and returns the share in % of every part
+    indicator in its total: one row per country and year (in the order of the data), one
+    column per part indicator. total_indicators is one indicator for all parts (e.g. the
+    sectors of 'Employment') or a list with the total of each part. The data is pivoted once
+    and all shares are divided in one step.
+
+    """
+
+    part_indicators = list(part_indicators)
+    if isinstance(total_indicators, str):
+        total_indicators = [total_indicators] * len(part_indicators)
+    total_indicators = list(total_indicators)
+
+    # One row per country and year, one column per indicator (missing indicators are empty)
+    rows = pd.MultiIndex.from_frame(df_input[['Country', 'Year']].drop_duplicates())
+    wide = (df_input.drop_duplicates(subset=['Country', 'Year', 'Indicator'])
+                    .set_index(['Country', 'Year', 'Indicator'])['Value']
+                    .unstack('Indicator')
+                    .reindex(index=rows, columns=list(dict.fromkeys(part_indicators + total_indicators))))
+
+    shares = wide[part_indicators].to_numpy(dtype=float) / wide[total_indicators].to_numpy(dtype=float) * 100
+    return pd.DataFrame(shares, index=rows, columns=part_indicators)
@@ -0,0 +1,53 @@
+#SOURCE STREAMLIT FRAGMENTS: https://docs.streamlit.io/develop/api-reference/execution-flow/st.fragment
+#SOURCE STREAMLIT DOWNLOAD BUTTON: https://docs.streamlit.io/develop/api-reference/widgets/st.download_button
+
+import streamlit as st
+from api_functions.data_export import EXPORT_FORMATS, export_dataset, get_file_name
+
+#--------------------------------------FUNCTION---------------------------------------------
+
+@st.fragment
+def show_download(data_service, export_cache, name, country_selec, start_year_selec, end_year_selec, indicator_selec,
+                  csv_path=None):
+
+    """
+    Function shows the download of the data of a dashboard: the current selection (chosen 
+    countries and years, the indicators of indicator_selec) or the full dataset, as CSV, Parquet 
+    or Excel file named after name (e.g. 'employment_data'). The file is only built when the 
+    user asks for it and kept in the export cache shared by all sessions (the session only keeps 
+    its key); a file larger than the export cache is kept by the session itself. csv_path is 
+    the CSV export of the get_data script, if any (see DataService.get_csv). It runs as a 
+    fragment: the download widgets only rerun this function, not the whole page.
+
+    """
+
+    download_scope = st.radio("Data to download", ('Current selection', 'Full dataset'), horizontal=True)
+    download_format = st.selectbox("File format", list(EXPORT_FORMATS))
+    download_key = (download_scope, download_format, tuple(country_selec), start_year_selec, end_year_selec, 
+                    data_service.version)
+
+    def build_file():
+        if download_scope == 'Full dataset' and download_format == 'CSV':
+            return data_service.get_csv(csv_path)
+        if download_scope == 'Full dataset':
+            df_download = data_service.get_data()
+        else:
+            df_download = data_service.get_index().get_filtered_data(country_selec, start_year_selec, end_year_selec, 
+                                                                     indicator_selec)
+            df_download = df_download.dropna(subset=['Value'])
+        return export_dataset(df_download, download_format)
+
+    if st.button("Prepare the file"):
+        download_data = export_cache.get_file(download_key, build_file)
+        st.session_state['download'] = (download_key, None if download_key in export_cache else download_data)
+
+    # The file of the session: from the export cache, or kept by the session if it is too large
+    session_key, session_data = st.session_state.get('download', (None, None))
+    download_data = None
+    if session_key == download_key:
+        download_data = session_data if session_data is not None else export_cache.get_file(download_key, None)
+    if download_data is not None:
+        st.download_button(label=f"Click here to download data as {download_format}",
+                           data=download_data, 
+                           file_name=get_file_name(name, download_format),
+                           mime=EXPORT_FORMATS[download_format][1])
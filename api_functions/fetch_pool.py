@@ -0,0 +1,37 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+#--------------------------------------FUNCTION---------------------------------------------
+
+def run_bounded(tasks, max_workers=1, max_per_host=None):
+
+    """
+    Function that takes a list of tasks as (host, function, arguments) tuples and runs them on
+    a bounded pool of worker threads. At most max_workers tasks run at the same time and at most
+    max_per_host tasks talk to the same host at the same time. The output is a list of the
+    results in the same order as the tasks, no matter in which order they finish.
+
+    """
+
+    # Run sequentially if no parallelism is requested (keeps tracebacks simple)
+    if max_workers is None or max_workers <= 1 or len(tasks) <= 1:
+        return [function(*arguments) for host, function, arguments in tasks]
+
+    # One semaphore per host caps the concurrent requests to the same server
+    host_limits = {}
+    if max_per_host:
+        for host, function, arguments in tasks:
+            host_limits.setdefault(host, threading.BoundedSemaphore(max_per_host))
+
+    def run_task(host, function, arguments):
+        limit = host_limits.get(host)
+        if limit is None:
+            return function(*arguments)
+        with limit:
+            return function(*arguments)
+
+    # Submit all tasks and collect the results in submission order
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(tasks))) as executor:
+        futures = [executor.submit(run_task, host, function, arguments) for host, function, arguments in tasks]
+        return [future.result() for future in futures]
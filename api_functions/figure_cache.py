@@ -0,0 +1,72 @@
+#SOURCE PLOTLY JSON: https://plotly.com/python-api-reference/generated/plotly.io.from_json.html
+
+import threading
+from collections import OrderedDict
+import plotly.io as pio
+
+#--------------------------------------CACHE PARAMETERS---------------------------------------------
+
+# Number of figures kept per dashboard (the least recently used figure is dropped first)
+MAX_FIGURES = 512
+
+
+#--------------------------------------CLASS---------------------------------------------
+
+class FigureCache:
+
+    """
+    LRU cache of the Plotly figures of a dashboard, shared by all sessions of a server process
+    (create it with st.cache_resource). A figure is stored as its JSON spec under the chart, the
+    selected countries, years and indicators and the version of the data, and built again only
+    when one of them changes. Every call gets its own figure object, so sessions can change the
+    figure they get without changing the cached one.
+
+    """
+
+    def __init__(self, maxsize=MAX_FIGURES):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._specs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_figure(self, chart_id, country_selec, start_year_selec, end_year_selec, indicator_selec, data_version, build_figure):
+
+        """
+        Function that takes the id of a chart, its selection, the version of the data and a
+        function that builds the figure (without arguments), and returns the figure: from the
+        cache if the chart was built for this selection and data before, otherwise it is built.
+
+        """
+
+        key = (chart_id, _as_tuple(country_selec), start_year_selec, end_year_selec,
+               _as_tuple(indicator_selec), data_version)
+
+        with self._lock:
+            spec = self._specs.get(key)
+            if spec is not None:
+                self._specs.move_to_end(key)
+                self.hits += 1
+
+        if spec is None:
+            fig = build_figure()
+            spec = fig.to_json()
+            with self._lock:
+                self.misses += 1
+                self._specs[key] = spec
+                self._specs.move_to_end(key)
+                while len(self._specs) > self.maxsize:
+                    self._specs.popitem(last=False)
+
+        # The spec was written by Plotly itself, so it does not need to be validated again
+        return pio.from_json(spec, skip_invalid=True)
+
+
+#--------------------------------------HELPER FUNCTIONS---------------------------------------------
+
+def _as_tuple(selection):
+
+    # Selections can be a single value or a list (the order matters for the colors of a chart)
+    if selection is None or isinstance(selection, str):
+        return (selection,)
+    return tuple(selection)
@@ -0,0 +1,245 @@
+#SOURCE HTTP CACHING (ETag / Last-Modified): https://developer.mozilla.org/en-US/docs/Web/HTTP/Caching
+#SOURCE TRANSPORT ADAPTERS: https://requests.readthedocs.io/en/latest/user/advanced/#transport-adapters
+
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from api_functions.http_retry import ResilientAdapter
+
+#--------------------------------------CACHE PARAMETERS---------------------------------------------
+
+# Folder where the responses are stored (one compressed file per request)
+CACHE_DIR = os.environ.get('DDPP_HTTP_CACHE_DIR', '.http_cache')
+
+# Number of seconds a stored response is used without asking the server again
+CACHE_TTL = int(os.environ.get('DDPP_HTTP_CACHE_TTL', 24 * 60 * 60))
+
+# Set DDPP_HTTP_CACHE=0 to always go to the network
+CACHE_ENABLED = os.environ.get('DDPP_HTTP_CACHE', '1') != '0'
+
+# Response headers that are kept with the stored payload
+STORED_HEADERS = ['Content-Type', 'ETag', 'Last-Modified']
+
+# Size of the chunks used to copy payloads to and from disk
+CHUNK_SIZE = 64 * 1024
+
+
+#--------------------------------------FUNCTIONS---------------------------------------------
+
+def normalize_url(url):
+
+    """
+    Function that takes a URL and returns it in a normalized form (lower case scheme and host,
+    query parameters sorted, no fragment) so that the same request always gets the same key.
+
+    """
+
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, query, ''))
+
+
+def cache_key(request):
+
+    """
+    Function that takes a prepared request and returns the key under which its response is
+    stored. The key covers the method, the normalized URL and the requested content type.
+
+    """
+
+    accept = request.headers.get('Accept', '')
+    raw_key = f"{request.method} {normalize_url(request.url)} {accept}"
+    return hashlib.sha256(raw_key.encode('utf-8')).hexdigest()
+
+
+#--------------------------------------CLASS---------------------------------------------
+
+class CachingAdapter(BaseAdapter):
+
+    """
+    Transport adapter that keeps the payload of every successful GET request gzip-compressed on
+    disk. Stored responses are served without any network access while they are younger than
+    the TTL. After that the server is asked again with If-None-Match / If-Modified-Since, and a
+    304 answer renews the stored response. All other requests are passed on to the inner
+    adapter (a ResilientAdapter by default, which retries transient errors).
+
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, ttl=CACHE_TTL, inner=None):
+        super().__init__()
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.inner = inner or ResilientAdapter()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+
+        send_kwargs = {'timeout': timeout, 'verify': verify, 'cert': cert, 'proxies': proxies}
+
+        # Only GET requests are cached
+        if request.method != 'GET':
+            return self.inner.send(request, stream=stream, **send_kwargs)
+
+        key = cache_key(request)
+        meta = self._read_meta(key)
+
+        # Fresh entry: serve from disk
+        if meta and time.time() - meta['stored_at'] < self.ttl:
+            return self._build_response(request, key, stream)
+
+        # Stale entry: ask the server whether it changed
+        if meta:
+            request = request.copy()
+            if meta['headers'].get('ETag'):
+                request.headers['If-None-Match'] = meta['headers']['ETag']
+            if meta['headers'].get('Last-Modified'):
+                request.headers['If-Modified-Since'] = meta['headers']['Last-Modified']
+
+        response = self.inner.send(request, stream=True, **send_kwargs)
+
+        # Not modified: renew the stored entry
+        if meta and response.status_code == 304:
+            response.close()
+            self._touch(key)
+            return self._build_response(request, key, stream)
+
+        # New payload: store it and serve it from disk
+        if response.status_code == 200:
+            self._store(key, request, response)
+            return self._build_response(request, key, stream)
+
+        # Errors are never cached
+        if not stream:
+            response.content
+        return response
+
+    def close(self):
+        self.inner.close()
+
+    ########################### Helper functions #############################
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.gz")
+
+    def _read_meta(self, key):
+
+        # The first line of every cache file holds the metadata of the response
+        try:
+            with gzip.open(self._path(key), 'rb') as file:
+                return json.loads(file.readline())
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, key, meta, chunks):
+
+        # Write to a temporary file first so that readers never see half a file
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as raw_file, gzip.GzipFile(fileobj=raw_file, mode='wb') as file:
+                file.write(json.dumps(meta).encode('utf-8') + b'\n')
+                for chunk in chunks:
+                    file.write(chunk)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def _store(self, key, request, response):
+        meta = {'url': request.url,
+                'status_code': response.status_code,
+                'reason': response.reason,
+                'headers': {h: response.headers[h] for h in STORED_HEADERS if h in response.headers},
+                'stored_at': time.time()}
+        try:
+            self._write(key, meta, response.iter_content(CHUNK_SIZE))
+        finally:
+            response.close()
+
+    def _touch(self, key):
+
+        # Copy the stored payload into a new file with a new timestamp
+        with gzip.open(self._path(key), 'rb') as file:
+            meta = json.loads(file.readline())
+            meta['stored_at'] = time.time()
+            self._write(key, meta, iter(lambda: file.read(CHUNK_SIZE), b''))
+
+    def _build_response(self, request, key, stream):
+        file = gzip.open(self._path(key), 'rb')
+        meta = json.loads(file.readline())
+
+        response = requests.Response()
+        response.status_code = meta['status_code']
+        response.reason = meta['reason']
+        response.headers = CaseInsensitiveDict(meta['headers'])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+
+        # The payload is read from the compressed file (chunk by chunk if streamed)
+        response.raw = file
+        if not stream:
+            response._content = file.read()
+            response._content_consumed = True
+            file.close()
+        return response
+
+
+#--------------------------------------FUNCTION---------------------------------------------
+
+_session = None
+_transport = None
+_session_lock = threading.Lock()
+
+def get_session():
+
+    """
+    Function that returns the requests session shared by the WB, ILO and IMF fetchers. The
+    session is created once per process and stores all responses in the on-disk cache; the
+    requests that reach the network are retried on transient errors (see http_retry). If
+    DDPP_HTTP_REPLAY is set, the session records or replays the responses instead (see
+    http_replay).
+
+    """
+
+    global _session, _transport
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            if os.environ.get('DDPP_HTTP_REPLAY'):
+                # Imported here, http_replay is built on the adapters of this module
+                from api_functions.http_replay import get_replay_adapter
+                adapter, _transport = get_replay_adapter()
+            else:
+                _transport = ResilientAdapter()
+                adapter = CachingAdapter(inner=_transport) if CACHE_ENABLED else _transport
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+    return _session
+
+
+def get_transport_stats():
+
+    """
+    Function that returns the counters of the requests sent by the shared session, per host
+    (requests, retries, timeouts, errors, throttled answers, circuit breaker openings and
+    rejected requests, seconds waited for the rate limits).
+
+    """
+
+    get_session()
+    with _transport._lock:
+        return {host: dict(counters) for host, counters in _transport.stats.items()}
@@ -0,0 +1,274 @@
+#SOURCE TRANSPORT ADAPTERS: https://requests.readthedocs.io/en/latest/user/advanced/#transport-adapters
+#SOURCE HTTP SERVER: https://docs.python.org/3/library/http.server.html
+
+import argparse
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from api_functions.http_cache import CachingAdapter
+from api_functions.http_retry import PermanentConnectionError, ResilientAdapter
+
+#--------------------------------------REPLAY PARAMETERS---------------------------------------------
+
+# How the fetchers reach the WB, ILO and IMF services:
+#   ''        live services (through the on-disk cache of http_cache)
+#   'record'  live services, every successful GET response is stored in the fixture corpus
+#   'replay'  responses are served from the fixture corpus in-process, without any network access
+#   'standin' requests are sent to the local stand-in server (see serve_fixtures) over HTTP
+REPLAY_MODE = os.environ.get('DDPP_HTTP_REPLAY', '')
+
+# Folder of the fixture corpus (one compressed file per request, in the format of http_cache)
+FIXTURE_DIR = os.environ.get('DDPP_HTTP_FIXTURES', 'http_fixtures')
+
+# Address of the stand-in server
+STANDIN_URL = os.environ.get('DDPP_HTTP_STANDIN_URL', 'http://127.0.0.1:8765')
+
+# Injected faults of the replayed responses: latency per request in seconds, share of requests
+# answered with a 503 error and share of requests answered with a 429 (throttled) response
+FAULT_LATENCY = float(os.environ.get('DDPP_FAULT_LATENCY', 0))
+FAULT_ERROR_RATE = float(os.environ.get('DDPP_FAULT_ERROR_RATE', 0))
+FAULT_THROTTLE_RATE = float(os.environ.get('DDPP_FAULT_THROTTLE_RATE', 0))
+
+# Seed of the injected faults (the same seed gives the same faults in the same order)
+FAULT_SEED = int(os.environ.get('DDPP_FAULT_SEED', 0))
+
+# Seconds a throttled client is asked to wait (Retry-After header of the 429 responses)
+THROTTLE_RETRY_AFTER = 1
+
+
+#--------------------------------------CLASSES---------------------------------------------
+
+class NotRecordedError(PermanentConnectionError):
+
+    """Raised in replay mode for requests without a recorded response (they are not retried)."""
+
+
+class FaultInjector:
+
+    """
+    Decides for every request whether it is answered normally, with a 503 error or with a 429
+    (throttled) response, after waiting the injected latency. The decisions come from a seeded
+    random generator, so a benchmark run can be repeated with the same faults.
+
+    """
+
+    def __init__(self, latency=FAULT_LATENCY, error_rate=FAULT_ERROR_RATE, throttle_rate=FAULT_THROTTLE_RATE,
+                 seed=FAULT_SEED):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.counts = {'requests': 0, 'errors': 0, 'throttled': 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def is_active(self):
+        return bool(self.latency or self.error_rate or self.throttle_rate)
+
+    def next_fault(self):
+
+        """
+        Function that waits the injected latency and returns the fault of the next request as
+        (status code, reason, headers), or None if the request is answered normally.
+
+        """
+
+        with self._lock:
+            draw = self._random.random()
+            self.counts['requests'] += 1
+            if draw < self.error_rate:
+                self.counts['errors'] += 1
+                fault = (503, 'Service Unavailable', {})
+            elif draw < self.error_rate + self.throttle_rate:
+                self.counts['throttled'] += 1
+                fault = (429, 'Too Many Requests', {'Retry-After': str(THROTTLE_RETRY_AFTER)})
+            else:
+                fault = None
+
+        if self.latency:
+            time.sleep(self.latency)
+        return fault
+
+
+class OfflineAdapter(BaseAdapter):
+
+    """Transport adapter for runs without network access: every request fails."""
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        raise NotRecordedError(f"No recorded response for {request.method} {request.url}", request=request)
+
+    def close(self):
+        pass
+
+
+class FaultInjectingAdapter(BaseAdapter):
+
+    """
+    Transport adapter that injects the faults of a FaultInjector (latency, 503 errors, 429
+    responses) before the request is passed on to the inner adapter.
+
+    """
+
+    def __init__(self, inner, injector=None):
+        super().__init__()
+        self.inner = inner
+        self.injector = injector or FaultInjector()
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        fault = self.injector.next_fault()
+        if fault is None:
+            return self.inner.send(request, stream=stream, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+
+        status_code, reason, headers = fault
+        response = requests.Response()
+        response.status_code = status_code
+        response.reason = reason
+        response.headers = CaseInsensitiveDict(headers)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response._content = reason.encode('utf-8')
+        response._content_consumed = True
+        return response
+
+    def close(self):
+        self.inner.close()
+
+
+class StandInAdapter(BaseAdapter):
+
+    """
+    Transport adapter that sends every request to the stand-in server instead of the service.
+    The original URL is kept in the path ('/<scheme>/<host>/<path>'), so the server can look it
+    up in the fixture corpus.
+
+    """
+
+    def __init__(self, standin_url=STANDIN_URL, inner=None):
+        super().__init__()
+        self.standin_url = standin_url.rstrip('/')
+        self.inner = inner or HTTPAdapter()
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        original = urlsplit(request.url)
+        standin = urlsplit(self.standin_url)
+        path = f"{standin.path}/{original.scheme}/{original.netloc}{original.path}"
+
+        request = request.copy()
+        request.url = urlunsplit((standin.scheme, standin.netloc, path, original.query, ''))
+        if 'Host' in request.headers:
+            del request.headers['Host']
+        return self.inner.send(request, stream=stream, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+
+    def close(self):
+        self.inner.close()
+
+
+#--------------------------------------FUNCTIONS---------------------------------------------
+
+def get_replay_adapter(mode=REPLAY_MODE, fixture_dir=FIXTURE_DIR, injector=None):
+
+    """
+    Function that takes a replay mode (see REPLAY_MODE) and returns the transport adapter of
+    the shared session for it and the ResilientAdapter in it (which retries the requests, also
+    the ones that fail because of injected faults). Recorded responses never expire, and only
+    successful GET responses are recorded (errors are what the fault injection is for). Faults
+    are injected in replay mode if any are configured; the stand-in server injects its own.
+
+    """
+
+    if mode == 'record':
+        transport = ResilientAdapter()
+        return CachingAdapter(cache_dir=fixture_dir, ttl=float('inf'), inner=transport), transport
+
+    if mode == 'replay':
+        adapter = CachingAdapter(cache_dir=fixture_dir, ttl=float('inf'), inner=OfflineAdapter())
+        injector = injector or FaultInjector()
+        transport = ResilientAdapter(FaultInjectingAdapter(adapter, injector) if injector.is_active() else adapter)
+        return transport, transport
+
+    if mode == 'standin':
+        transport = ResilientAdapter(StandInAdapter())
+        return transport, transport
+
+    raise ValueError(f"Unknown replay mode '{mode}', use 'record', 'replay' or 'standin'")
+
+
+def serve_fixtures(fixture_dir=FIXTURE_DIR, host='127.0.0.1', port=8765, injector=None):
+
+    """
+    Function that serves the fixture corpus as a local stand-in of the WB, ILO and IMF services
+    (until it is stopped), with the faults of the injector. Requests for responses that were
+    not recorded are answered with 404.
+
+    """
+
+    replay = CachingAdapter(cache_dir=fixture_dir, ttl=float('inf'), inner=OfflineAdapter())
+    injector = injector or FaultInjector()
+
+    class StandInHandler(BaseHTTPRequestHandler):
+
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+
+            # Rebuild the URL of the service from the path ('/<scheme>/<host>/<path>?<query>')
+            parts = urlsplit(self.path)
+            _, scheme, netloc, path = (parts.path.split('/', 3) + [''])[:4]
+            url = urlunsplit((scheme, netloc, '/' + path, parts.query, ''))
+            headers = {'Accept': self.headers['Accept']} if self.headers['Accept'] else {}
+            request = requests.Request('GET', url, headers=headers).prepare()
+
+            fault = injector.next_fault()
+            if fault is not None:
+                status_code, reason, fault_headers = fault
+                self._respond(status_code, fault_headers, reason.encode('utf-8'))
+                return
+
+            try:
+                response = replay.send(request)
+            except NotRecordedError as error:
+                self._respond(404, {'Content-Type': 'text/plain'}, str(error).encode('utf-8'))
+                return
+            self._respond(response.status_code, dict(response.headers), response.content)
+
+        def _respond(self, status_code, headers, body):
+            self.send_response(status_code)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), StandInHandler)
+    print(f"Serving {fixture_dir} on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+
+    # e.g. python -m api_functions.http_replay --port 8765 --latency 0.05 --error-rate 0.02
+    parser = argparse.ArgumentParser(description='Local stand-in of the WB, ILO and IMF services')
+    parser.add_argument('--fixtures', default=FIXTURE_DIR)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=FAULT_LATENCY)
+    parser.add_argument('--error-rate', type=float, default=FAULT_ERROR_RATE)
+    parser.add_argument('--throttle-rate', type=float, default=FAULT_THROTTLE_RATE)
+    parser.add_argument('--seed', type=int, default=FAULT_SEED)
+    args = parser.parse_args()
+
+    serve_fixtures(args.fixtures, args.host, args.port,
+                   FaultInjector(args.latency, args.error_rate, args.throttle_rate, args.seed))
@@ -0,0 +1,191 @@
+#SOURCE EXPONENTIAL BACKOFF AND JITTER: https://aws.amazon.com/blogs/architecture/exponential-backoff-and-jitter/
+#SOURCE RETRY-AFTER: https://developer.mozilla.org/en-US/docs/Web/HTTP/Headers/Retry-After
+#SOURCE CIRCUIT BREAKER: https://martinfowler.com/bliki/CircuitBreaker.html
+
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+
+#--------------------------------------RETRY PARAMETERS---------------------------------------------
+
+# Number of times a failed request is sent again (0 = no retries)
+MAX_RETRIES = int(os.environ.get('DDPP_HTTP_RETRIES', 5))
+
+# Backoff before a retry: random between 0 and BACKOFF_BASE * 2^attempt seconds, at most MAX_BACKOFF
+BACKOFF_BASE = 1.0
+MAX_BACKOFF = 60.0
+
+# Timeout of a request if the caller sets none: seconds to connect and seconds to wait for data
+TIMEOUT = (10, int(os.environ.get('DDPP_HTTP_TIMEOUT', 120)))
+
+# Status codes of transient errors (answers with other codes are returned as they are)
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# Only requests that can be sent twice without side effects are retried
+RETRY_METHODS = {'GET', 'HEAD'}
+
+# Minimum number of seconds between two requests to the same host (0 = no limit)
+MIN_INTERVAL = float(os.environ.get('DDPP_HTTP_MIN_INTERVAL', 0))
+
+# Failed requests in a row after which a host is not asked for COOLDOWN seconds
+FAILURE_THRESHOLD = 8
+COOLDOWN = 120.0
+
+
+#--------------------------------------CLASSES---------------------------------------------
+
+class PermanentConnectionError(requests.ConnectionError):
+
+    """Base of the connection errors that are not transient (they are raised without retries)."""
+
+
+class CircuitOpenError(PermanentConnectionError):
+
+    """Raised for requests to a host whose circuit is open (it failed too often in a row)."""
+
+
+class ResilientAdapter(BaseAdapter):
+
+    """
+    Transport adapter that makes the requests of the fetchers survive transient errors. Timeouts,
+    connection errors (except PermanentConnectionError) and 429/5xx answers of GET requests are
+    retried with jittered exponential backoff. Per host, requests are spaced by MIN_INTERVAL and
+    wait as long as a Retry-After header asks, and a circuit breaker stops sending requests to a
+    host that failed FAILURE_THRESHOLD times in a row (for COOLDOWN seconds, then it is tried
+    again). All requests are passed on to the inner adapter (a plain HTTPAdapter by default);
+    stats holds the counters of every host.
+
+    """
+
+    def __init__(self, inner=None, max_retries=MAX_RETRIES, timeout=TIMEOUT):
+        super().__init__()
+        self.inner = inner or HTTPAdapter()
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.stats = {}
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+
+        send_kwargs = {'stream': stream, 'timeout': timeout or self.timeout, 'verify': verify,
+                       'cert': cert, 'proxies': proxies}
+        host = urlsplit(request.url).netloc.lower()
+        retries = self.max_retries if request.method in RETRY_METHODS else 0
+
+        attempt = 0
+        while True:
+            self._wait_for_host(host)
+            self._count(host, 'requests')
+
+            try:
+                response = self.inner.send(request, **send_kwargs)
+            except PermanentConnectionError:
+                raise
+            except (requests.ConnectionError, requests.Timeout) as error:
+                self._count(host, 'timeouts' if isinstance(error, requests.Timeout) else 'errors')
+                self._record_result(host, failed=True)
+                if attempt >= retries:
+                    raise
+            else:
+                if response.status_code == 429:
+                    self._count(host, 'throttled')
+                elif response.status_code >= 500:
+                    self._count(host, 'errors')
+                self._record_result(host, failed=response.status_code >= 500)
+                self._delay_host(host, _retry_after(response))
+                if response.status_code not in RETRY_STATUS or attempt >= retries:
+                    return response
+                response.close()
+
+            # Jittered exponential backoff before the next attempt
+            self._count(host, 'retries')
+            time.sleep(random.uniform(0, min(MAX_BACKOFF, BACKOFF_BASE * 2 ** attempt)))
+            attempt += 1
+
+    def close(self):
+        self.inner.close()
+
+    ########################### Helper functions #############################
+
+    def _host(self, host):
+
+        # State of a host: earliest time of the next request, failures in a row, opening time
+        # of the circuit (None while it is closed)
+        return self._hosts.setdefault(host, {'next_request': 0.0, 'failures': 0, 'opened_at': None})
+
+    def _count(self, host, counter, amount=1):
+        with self._lock:
+            stats = self.stats.setdefault(host, {'requests': 0, 'retries': 0, 'timeouts': 0, 'errors': 0,
+                                                 'throttled': 0, 'circuit_opened': 0, 'rejected': 0,
+                                                 'waited_seconds': 0.0})
+            stats[counter] += amount
+
+    def _wait_for_host(self, host):
+
+        # Refuse requests while the circuit is open, then reserve the next free slot of the host
+        with self._lock:
+            state = self._host(host)
+            if state['opened_at'] is not None and time.time() - state['opened_at'] < COOLDOWN:
+                rejected = True
+            else:
+                rejected = False
+                now = time.time()
+                start = max(now, state['next_request'])
+                state['next_request'] = start + MIN_INTERVAL
+                wait = start - now
+
+        if rejected:
+            self._count(host, 'rejected')
+            raise CircuitOpenError(f"{host} failed {FAILURE_THRESHOLD} times in a row, not asked again for {COOLDOWN:.0f}s")
+        if wait > 0:
+            self._count(host, 'waited_seconds', wait)
+            time.sleep(wait)
+
+    def _delay_host(self, host, delay):
+
+        # Do not send the next request to the host before the delay (Retry-After) has passed
+        if delay:
+            with self._lock:
+                state = self._host(host)
+                state['next_request'] = max(state['next_request'], time.time() + delay)
+
+    def _record_result(self, host, failed):
+
+        # Open the circuit after too many failures in a row, close it after a success
+        opened = False
+        with self._lock:
+            state = self._host(host)
+            if not failed:
+                state['failures'] = 0
+                state['opened_at'] = None
+            else:
+                state['failures'] += 1
+                if state['failures'] >= FAILURE_THRESHOLD:
+                    opened = state['opened_at'] is None or time.time() - state['opened_at'] >= COOLDOWN
+                    state['opened_at'] = time.time()
+        if opened:
+            self._count(host, 'circuit_opened')
+
+
+#--------------------------------------HELPER FUNCTIONS---------------------------------------------
+
+def _retry_after(response):
+
+    # Seconds of the Retry-After header (a number of seconds or a date), None if there is none
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        try:
+            return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+        except (TypeError, ValueError):
+            return None
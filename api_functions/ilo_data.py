@@ -11,6 +11,12 @@
 
 import pandasdmx as sdmx
 import pandas as pd
+from api_functions.checkpoint import checkpointed
+from api_functions.fetch_pool import run_bounded
+from api_functions.http_cache import get_session
+
+# Host of the ILO SDMX service (used to cap the number of parallel requests)
+ILO_HOST = 'www.ilo.org'
 
 
 # #--------------------------------------ILO PARAMETERS---------------------------------------------#
@@ -82,34 +88,96 @@ import pandas as pd
 # }
 
 
+#--------------------------------------FUNCTION---------------------------------------------
+
+# Plan the requests (indicators that only differ by one dimension value share one request)
+
+def plan_ilo_requests(indicators_dict):
+
+    """
+    Function that takes the dictionary of ILO indicators and groups all indicators that use the
+    same dataflow and only differ by the value of one dimension (e.g. SEX_T and SEX_F) into one
+    SDMX request with an OR-key (e.g. 'SEX_T+SEX_F'). The output is a list of requests, each a 
+    dictionary with the dataflow ('indicator'), the query key ('key'), the dimension the result
+    has to be split on ('split_dim', None if not merged) and the indicator names for each value
+    of that dimension ('names').
+
+    """
+
+    # Group the indicators by dataflow and the dimensions they filter on
+    groups = {}
+    for key, value in indicators_dict.items():
+        params = {k: v for k, v in value.items() if k != 'indicator'}
+        groups.setdefault((value['indicator'], tuple(sorted(params))), []).append((key, params))
+
+    plan = []
+    for (indicator_id, dims), entries in groups.items():
+
+        # Nothing to merge if there is only one indicator or no dimension to filter on
+        if len(entries) == 1 or not dims:
+            for name, params in entries:
+                plan.append({'indicator': indicator_id, 'key': params, 'split_dim': None, 'names': {None: [name]}})
+            continue
+
+        # Find the dimension that, when merged, leaves the fewest requests
+        best_dim, best_partitions = None, None
+        for dim in dims:
+            partitions = {}
+            for name, params in entries:
+                other_values = tuple(params[d] for d in dims if d != dim)
+                partitions.setdefault(other_values, []).append((name, params))
+            if best_partitions is None or len(partitions) < len(best_partitions):
+                best_dim, best_partitions = dim, partitions
+
+        # Create one request per partition with all values of the merged dimension
+        for partition in best_partitions.values():
+            names = {}
+            for name, params in partition:
+                names.setdefault(params[best_dim], []).append(name)
+            request_key = dict(partition[0][1])
+            request_key[best_dim] = '+'.join(names)
+            plan.append({'indicator': indicator_id, 'key': request_key, 'split_dim': best_dim, 'names': names})
+
+    return plan
+
+
 #--------------------------------------FUNCTION---------------------------------------------
 
 #Overall function to retrieve the data 
 
-def get_ilo_data(indicators_dict, start_year_input, end_year_input, featureMap_params_input): 
+def get_ilo_data(indicators_dict, start_year_input, end_year_input, featureMap_params_input,
+                 max_workers=1, max_per_host=4, checkpoint=None): 
 
     """
     Funtion to retrieve a list of indicator values from the Ilostat webpage. The output is a 
     dataframe in long format and a csv file of all indicator values.
+
+    Indicators that only differ by one dimension value are fetched with one request (see
+    plan_ilo_requests) and split back into the named indicators afterwards. The requests are 
+    sent in parallel on up to max_workers threads, with at most max_per_host requests open 
+    against the ILO service at the same time. The rows of the output are always in the order 
+    of indicators_dict. If a RefreshCheckpoint is given, every request is stored as a shard as
+    soon as it arrives, and requests with a stored shard are not sent again.
     
     """
 
     ########################### Define data retrieval function #############################
 
-    # Retrieve data for one indicator
+    # Retrieve data for one request
 
-    def access_ilo_data(indicator_id_input, indicator_name_input, params_input): 
+    def access_ilo_data(indicator_id_input, params_input): 
         
         """
         Function that takes an ILOSTAT indicator code and the requested query string parameters
         to filter as an input and then retrieves the values for one specific indicator from the 
-        Ilostat webpage through the API. The output is a dataframe containing the data for the 
-        indicator.
+        Ilostat webpage through the API. Parameter values can be '+'-joined to retrieve several
+        values of a dimension at once. The output is a dataframe containing the data for the 
+        indicator with the raw dimension codes.
 
         """
 
-        # Specify the request
-        ilo = sdmx.Request('ILO')
+        # Specify the request (through the shared session with the on-disk cache)
+        ilo = sdmx.Request('ILO', session=get_session())
 
         # If parameter are specified (data filtered for age etc.)
         if params_input:
@@ -131,9 +199,6 @@ def get_ilo_data(indicators_dict, start_year_input, end_year_input, featureMap_p
 
         # Change the indicator code to the full code (including parameters) so that the right indicator name will be mapped
         df['MEASURE'] = indicator_id_input
-        
-        # Add indicator name
-        df['Indicator'] = indicator_name_input
 
         #Change the column names 
         df.rename(columns={"REF_AREA": "Country Code", "MEASURE": "Indicator Code", "TIME_PERIOD": "Year", "value": "Value"}, inplace=True)
@@ -142,12 +207,6 @@ def get_ilo_data(indicators_dict, start_year_input, end_year_input, featureMap_p
         # Ensure years are in the right format (integer)
         df['Year'] = df['Year'].astype('int')
 
-        # Rename the parameter values to full names
-        if featureMap_params_input:  
-            for param in params_input: 
-                if param in df.columns: 
-                    df[param] = df[param].map(featureMap_params_input)
-
         # Round indicator values to two decimals behind comma 
         df['Value'] = df['Value'].round(2)
 
@@ -155,29 +214,46 @@ def get_ilo_data(indicators_dict, start_year_input, end_year_input, featureMap_p
         return df
 
 
+    # Retrieve one request through the checkpoint (from its shard if it was stored before)
+
+    def fetch_ilo_request(indicator_id_input, params_input):
+        shard_id = f"ilo/{indicator_id_input}/{'.'.join(f'{k}={v}' for k, v in sorted(params_input.items()))}"
+        params = {'indicator': indicator_id_input, 'key': params_input, 'start': start_year_input, 'end': end_year_input}
+        return checkpointed(checkpoint, shard_id, params, lambda: access_ilo_data(indicator_id_input, params_input))
+
+
     ##################################### Get data #######################################
 
-    # Create an empty dataframe to store the data 
-    df_full = pd.DataFrame()
+    # Plan the requests and collect one task per request
+    plan = plan_ilo_requests(indicators_dict)
+    tasks = [(ILO_HOST, fetch_ilo_request, (request['indicator'], request['key'])) for request in plan]
 
-    # Loop through each indicator in the dictionary
-    for key, value in indicators_dict.items(): 
+    # Retrieve the data for all requests through the api (results keep the task order)
+    df_list = run_bounded(tasks, max_workers=max_workers, max_per_host=max_per_host)
 
-        # Retrieve the parameters
-        exclude_keys = ['indicator']
-        param_keys = {k: value[k] for k in set(list(value.keys())) - set(exclude_keys)}
+    # Split the results back into the named indicators
+    df_by_name = {}
+    for request, df in zip(plan, df_list):
+        for param_value, names in request['names'].items():
 
-        # Retrieve indicator key
-        indicator_id = value['indicator']
+            # Select the rows of this dimension value (all rows if nothing was merged)
+            if request['split_dim'] is None:
+                df_id = df.copy()
+            else:
+                df_id = df[df[request['split_dim']] == param_value].copy()
 
-        # Retrieve the indicator name 
-        indicator_name = key
+            # Rename the parameter values to full names
+            if featureMap_params_input:  
+                for param in request['key']: 
+                    if param in df_id.columns: 
+                        df_id[param] = df_id[param].map(featureMap_params_input)
 
-        # Retrieve the data for the indicator through the api 
-        df_id = access_ilo_data(indicator_id, indicator_name,  param_keys)
-        
-        # Attach data to dataframe 
-        df_full = pd.concat([df_full, df_id])
+            # Add indicator name
+            for name in names:
+                df_by_name[name] = df_id.assign(Indicator=name)
+
+    # Attach data to one dataframe in the order of the dictionary
+    df_full = pd.concat([df_by_name[name] for name in indicators_dict])
     
      # Add country and region columns
     df_country_codes = pd.read_csv('country_classifications/country_codes.csv')
@@ -0,0 +1,185 @@
+# SOURCE METADATA QUERY: http://www.bd-econ.com/imfapi3.html
+# SOURCE: https://datahelp.imf.org/knowledgebase/articles/667681-json-restful-web-service
+
+#url_dataflows = "http://dataservices.imf.org/REST/SDMX_JSON.svc/Dataflow"
+#url_structure = "http://dataservices.imf.org/REST/SDMX_JSON.svc/DataStructure/IFS"
+#url_codelist = "http://dataservices.imf.org/REST/SDMX_JSON.svc/CodeList/CL_AREA_IFS"
+
+import json
+import os
+import tempfile
+import threading
+import time
+from api_functions.http_cache import get_session
+
+#--------------------------------------REGISTRY PARAMETERS---------------------------------------------
+
+BASE_URL = "http://dataservices.imf.org/REST/SDMX_JSON.svc/"
+
+# Folder where the codelists are kept between runs (one file per dataset)
+CODELIST_DIR = os.environ.get('DDPP_IMF_CODELIST_DIR', '.imf_codelists')
+
+# Number of seconds after which stored codelists are fetched again, even if the version is unchanged
+CODELIST_MAX_AGE = int(os.environ.get('DDPP_IMF_CODELIST_MAX_AGE', 7 * 24 * 60 * 60))
+
+# Format of the stored files (files written with another format are ignored)
+REGISTRY_FORMAT = 1
+
+
+#--------------------------------------FUNCTIONS---------------------------------------------
+
+def _as_list(value):
+
+    # The IMF service returns a single dictionary instead of a list if there is only one element
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def parse_codelists(structure):
+
+    """
+    Function that takes a 'Structure' message of the IMF service (from the DataStructure or the
+    CodeList endpoint) and returns all codelists in it as a dictionary of the form
+    {codelist id: {'version': version, 'codes': {code: description}}}.
+
+    """
+
+    codelists = {}
+    for codelist in _as_list(structure['Structure']['CodeLists']['CodeList']):
+        codes = {}
+        for code in _as_list(codelist.get('Code')):
+            description = code['Description']
+            codes[code['@value']] = description['#text'] if isinstance(description, dict) else description
+        codelists[codelist['@id']] = {'version': codelist.get('@version'), 'codes': codes}
+    return codelists
+
+
+#--------------------------------------CLASS---------------------------------------------
+
+class CodelistRegistry:
+
+    """
+    Process-wide store of IMF codelists. All codelists of a dataset (IFS, BOP, HPDD, PGCS, ...)
+    are taken from one DataStructure request and kept in memory and on disk. A stored dataset is
+    reused as long as its structure version matches the version announced by the Dataflow
+    endpoint and it is younger than max_age. Codelists that are not part of a dataset structure
+    are fetched on their own from the CodeList endpoint.
+
+    """
+
+    def __init__(self, codelist_dir=CODELIST_DIR, max_age=CODELIST_MAX_AGE):
+        self.codelist_dir = codelist_dir
+        self.max_age = max_age
+        self._entries = {}
+        self._versions = None
+        self._lock = threading.Lock()
+
+    def get_codelist(self, codelist_id, dataset_id=None):
+
+        """
+        Function that takes a codelist id (e.g. 'CL_AREA_IFS') and optionally the dataset it
+        belongs to, and returns the codelist as a dictionary {code: description}.
+
+        """
+
+        with self._lock:
+
+            # Look in the structure of the dataset first (one fetch for all its codelists)
+            if dataset_id:
+                entry = self._get_entry(dataset_id, f"{BASE_URL}DataStructure/{dataset_id}", self._dataset_version(dataset_id))
+                codes = self._find(entry, codelist_id)
+                if codes is not None:
+                    return codes
+
+            # Otherwise fetch the codelist on its own
+            entry = self._get_entry(f"CodeList_{codelist_id}", f"{BASE_URL}CodeList/{codelist_id}", None)
+            codes = self._find(entry, codelist_id)
+            if codes is None:
+                raise KeyError(f"Codelist {codelist_id} not found in the IMF service")
+            return codes
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+            self._versions = None
+
+    ########################### Helper functions #############################
+
+    def _find(self, entry, codelist_id):
+
+        # Codelist ids are not always written with the same case (e.g. CL_Country_PGCS)
+        for key, codelist in entry['codelists'].items():
+            if key.upper() == codelist_id.upper():
+                return codelist['codes']
+        return None
+
+    def _dataset_version(self, dataset_id):
+
+        # Versions of all dataset structures from one request to the Dataflow endpoint
+        if self._versions is None:
+            self._versions = {}
+            try:
+                dataflows = get_session().get(f"{BASE_URL}Dataflow").json()
+                for dataflow in _as_list(dataflows['Structure']['Dataflows']['Dataflow']):
+                    self._versions[dataflow['KeyFamilyRef']['KeyFamilyID']] = dataflow.get('@version')
+            except Exception as e:
+                print('Dataflow versions could not be retrieved, using the age of the codelists only:', e)
+        return self._versions.get(dataset_id)
+
+    def _get_entry(self, name, url, version):
+
+        # Memory first, then disk, then the IMF service
+        entry = self._entries.get(name)
+        if entry is None or not self._is_valid(entry, version):
+            entry = self._read(name)
+            if entry is None or not self._is_valid(entry, version):
+                entry = {'format': REGISTRY_FORMAT,
+                         'version': version,
+                         'fetched_at': time.time(),
+                         'codelists': parse_codelists(get_session().get(url).json())}
+                self._write(name, entry)
+            self._entries[name] = entry
+        return entry
+
+    def _is_valid(self, entry, version):
+        if entry.get('format') != REGISTRY_FORMAT:
+            return False
+        if time.time() - entry['fetched_at'] > self.max_age:
+            return False
+        return version is None or entry.get('version') == version
+
+    def _path(self, name):
+        return os.path.join(self.codelist_dir, f"{name}.json")
+
+    def _read(self, name):
+        try:
+            with open(self._path(name), encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, name, entry):
+
+        # Write to a temporary file first so that a crash never leaves half a file
+        os.makedirs(self.codelist_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.codelist_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            json.dump(entry, file)
+        os.replace(tmp_path, self._path(name))
+
+
+#--------------------------------------FUNCTION---------------------------------------------
+
+# One registry per process
+REGISTRY = CodelistRegistry()
+
+def get_codelist(codelist_id, dataset_id=None):
+
+    """
+    Function that takes a codelist id and optionally its dataset and returns the codelist as a
+    dictionary {code: description} from the process-wide registry.
+
+    """
+
+    return REGISTRY.get_codelist(codelist_id, dataset_id)
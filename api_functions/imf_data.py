@@ -9,10 +9,12 @@
 #url_countries = "http://dataservices.imf.org/REST/SDMX_JSON.svc/CodeList/CL_REF_AREA"
 ## url if start and end year included: http://dataservices.imf.org/REST/SDMX_JSON.svc/CompactData/PGCS/A..rnna.?startPeriod=2015&endPeriod=2020
 
-import requests 
 import pandas as pd
-import urllib.request
-import json
+import requests
+from api_functions.checkpoint import checkpointed
+from api_functions.http_cache import get_session
+from api_functions.imf_codelists import get_codelist
+from api_functions.imf_parser import read_compact_data
 #--------------------------------------IMF PARAMETERS---------------------------------------------
 
 # Here you define the indicators you want to retrieve and assign them a name that shows up in the dataset
@@ -29,75 +31,65 @@ import json
 # # Dataset used (currently only works for one dataset at a time)
 # DATASET = "PGCS"
 
+# Maximum number of indicators joined into one CompactData request (keeps the URL short)
+MAX_INDICATORS_PER_REQUEST = 20
+
 
 #--------------------------------------FUNCTION---------------------------------------------
 
-def get_imf_data(feature_map_input, start_year_input, end_year_input, dataset_input):
+def get_imf_data(feature_map_input, start_year_input, end_year_input, dataset_input, checkpoint=None):
 
   # Define base url (only for PGCS dataset!)
   BASE_URL = "http://dataservices.imf.org/REST/SDMX_JSON.svc/CompactData/"
   
   ######################### Prepare indicators and country names ############################
 
-  country_code_list = requests.get(f"http://dataservices.imf.org/REST/SDMX_JSON.svc/CodeList/CL_Country_{dataset_input}").json()\
-      ['Structure']['CodeLists']['CodeList']['Code']
-
-  featureMap_countries = {code['@value']: code['Description']['#text'] for code in country_code_list}
+  # Country names from the process-wide codelist registry (fetched once per dataset)
+  featureMap_countries = get_codelist(f"CL_Country_{dataset_input}", dataset_input)
 
   ################################### Define function ####################################
 
-  # Define function to retrieve individual indicator from website
+  # Define function to retrieve indicators from website
   def access_imf_data(indicator_id): 
 
     """
-    Functions that takes an indicator ID as an input, accesses the indicator data from IMF 
-    through the API and returns a dataframe with the data for the indicator as an output. 
+    Functions that takes an indicator ID (or several IDs joined with '+') as an input, accesses
+    the indicator data from IMF through the API and returns a dataframe with the data for the 
+    indicators as an output. 
     
     """
   
-    # Get data from the above URL using the requests package
-    data = requests.get(f"{BASE_URL}{dataset_input}/A..{indicator_id}.?startPeriod={str(start_year_input)}&endPeriod={str(end_year_input)}").json()
-
-    # Load data into a pandas dataframe
-    auxp = pd.DataFrame(data['CompactData']['DataSet']['Series'])
-
-    # Explode the lists of dictionaries into separate rows
-    auxp = auxp.explode('Obs', ignore_index=True)
-
-    # Normalize the dictionaries into separate columns
-    obs_normalized = pd.json_normalize(auxp['Obs'])
-
-    # Merge the normalized data with the original DataFrame and drop the original list column
-    df = pd.concat([auxp.drop('Obs', axis=1), obs_normalized], axis=1)
+    # Stream the response into typed columns (area, indicator, period, value, unit_mult)
+    df = read_compact_data(f"{BASE_URL}{dataset_input}/A..{indicator_id}.?startPeriod={str(start_year_input)}&endPeriod={str(end_year_input)}")
     
     return df 
   
   ##################################### Get data #######################################
 
-  # Create an empty dataframe to store the data 
-  df_full = pd.DataFrame()
-
-  # Loop through each indicator in the dictionary and access data
-  for key, value in feature_map_input.items(): 
+  # Request the indicators with '+'-joined codes (one request instead of one per indicator),
+  # each request is one shard of the checkpoint (if given)
+  indicator_codes = list(feature_map_input.keys())
+  df_list = []
+  for i in range(0, len(indicator_codes), MAX_INDICATORS_PER_REQUEST):
+    indicator_id = '+'.join(indicator_codes[i:i + MAX_INDICATORS_PER_REQUEST])
+    params = {'dataset': dataset_input, 'indicator': indicator_id, 'start': start_year_input, 'end': end_year_input}
+    df_list.append(checkpointed(checkpoint, f"imf/{dataset_input}/{indicator_id}", params,
+                                lambda: access_imf_data(indicator_id)))
 
-    df_id = access_imf_data(key)
-
-    # Attach data to dataframe 
-    df_full = pd.concat([df_full, df_id])
+  # Attach data to one dataframe 
+  df_full = pd.concat(df_list)
 
   
   ##################################### Process data #######################################
 
   # Drop, rename and reorder columns columns 
-  df_full.drop(columns={'@FREQ', '@UNIT_MULT', '@TIME_FORMAT'}, inplace=True)
-  df_full.rename(columns={'@REF_AREA': 'WEO Country Code', '@INDICATOR': 'Indicator Code', '@TIME_PERIOD': 'Year', '@OBS_VALUE': 'Value'}, inplace=True)
-  df_full.to_csv('temp1.csv')
+  df_full.drop(columns=['unit_mult'], inplace=True)
+  df_full.rename(columns={'area': 'WEO Country Code', 'indicator': 'Indicator Code', 'period': 'Year', 'value': 'Value'}, inplace=True)
   # Add country name column
   df_full['Country'] = df_full['WEO Country Code'].map(featureMap_countries)
 
   # Drop all rows where the country code cannot be converted into int (those are regions)
   df_full = df_full[df_full['WEO Country Code'].apply(lambda x: isinstance(x, (int, float)) or (isinstance(x, str) and x.isnumeric()))]
-  df_full.to_csv('temp2.csv')
   # Make sure all columns are the right data type and rounded
   df_full[['WEO Country Code', 'Year']] = df_full[['WEO Country Code', 'Year']].astype(int)
   df_full['Value'] = df_full['Value'].astype(float).round(2)
@@ -130,8 +122,41 @@ def get_imf_data(feature_map_input, start_year_input, end_year_input, dataset_in
 
 #--------------------------------------FUNCTION---------------------------------------------
 
+def plan_imf_requests(indicators_map, max_indicators=MAX_INDICATORS_PER_REQUEST):
+
+  """
+  Function that takes the dictionary of IMF indicators (name: dimension map) and groups the
+  indicators by dataset, frequency and area, so that each group is fetched with one CompactData 
+  request with '+'-joined indicator codes. The output is a list of dimension maps in the same 
+  form as the input (the indicator entry holds the joined codes) with an additional entry 
+  'names' that maps each indicator code to its indicator names.
+
+  """
+
+  # Group the indicator codes (and their names) by dataset, frequency and area
+  groups = {}
+  for key, value in indicators_map.items():
+    area_code_name = list(value.keys())[2]
+    datasetID = value['datasetID']
+    group_key = (datasetID, value['CL_FREQ'], area_code_name, value[area_code_name])
+    groups.setdefault(group_key, {}).setdefault(value[f'CL_INDICATOR_{datasetID}'], []).append(key)
+
+  # Create one dimension map per group (split if there are too many indicators for one URL)
+  plan = []
+  for (datasetID, freq, area_code_name, area_codeID), names in groups.items():
+    codes = list(names.keys())
+    for i in range(0, len(codes), max_indicators):
+      chunk = codes[i:i + max_indicators]
+      plan.append({'datasetID': datasetID, 'CL_FREQ': freq, area_code_name: area_codeID,
+                   f'CL_INDICATOR_{datasetID}': '+'.join(chunk),
+                   'names': {code: names[code] for code in chunk}})
+
+  return plan
+
+#--------------------------------------FUNCTION---------------------------------------------
+
 def get_imf_indicator_data(dimension_map_input, start_year_input =2000, end_year_input=2023):
-  """This is to get particular indicator data from IMF"""
+  """This is to get particular indicator data from IMF (several indicators can be joined with '+')"""
 
   # Define base url and extract all params from dimesnion 
   BASE_URL = "http://dataservices.imf.org/REST/SDMX_JSON.svc/CompactData/"
@@ -143,28 +168,18 @@ def get_imf_indicator_data(dimension_map_input, start_year_input =2000, end_year
   
   ######################### Prepare indicators and country names ############################
 
-  area_code_list = requests.get(f"http://dataservices.imf.org/REST/SDMX_JSON.svc/CodeList/{area_code_name}").json()\
-      ['Structure']['CodeLists']['CodeList']['Code']
-
-  featureMap_areas = {code['@value']: code['Description']['#text'] for code in area_code_list}
+  # Area names from the process-wide codelist registry (fetched once per dataset)
+  featureMap_areas = get_codelist(area_code_name, datasetID)
   ##### prepare URL and get data #########
 
   url = f"{BASE_URL}{datasetID}/{freq}.{area_codeID}.{indicatorID}.?startPeriod={str(start_year_input)}&endPeriod={str(end_year_input)}"
   # print(url)
-  data = requests.get(url).json()
-  # Load data into a pandas dataframe
-  auxp = pd.DataFrame(data['CompactData']['DataSet']['Series'])
-  # Explode the lists of dictionaries into separate rows
-  auxp = auxp.explode('Obs', ignore_index=True)
 
-  # Normalize the dictionaries into separate columns
-  obs_normalized = pd.json_normalize(auxp['Obs'])
-  # Merge the normalized data with the original DataFrame and drop the original list column
-  df = pd.concat([auxp.drop('Obs', axis=1), obs_normalized], axis=1)
+  # Stream the response into typed columns (area, indicator, period, value, unit_mult)
+  df = read_compact_data(url)
 
-  # Drop, rename and reorder columns columns 
-  # df.drop(columns={'@FREQ', '@UNIT_MULT', '@TIME_FORMAT'}, inplace=True)
-  df.rename(columns={'@REF_AREA': 'ISO-alpha2 Code', '@INDICATOR': 'Indicator Code', '@TIME_PERIOD': 'Year', '@OBS_VALUE': 'Value'}, inplace=True)
+  # Rename columns 
+  df.rename(columns={'area': 'ISO-alpha2 Code', 'indicator': 'Indicator Code', 'period': 'Year', 'value': 'Value', 'unit_mult': '@UNIT_MULT'}, inplace=True)
   # Add country name column
   df['Country'] = df['ISO-alpha2 Code'].map(featureMap_areas)
 
@@ -183,46 +198,46 @@ def get_imf_indicator_data(dimension_map_input, start_year_input =2000, end_year
 
 
 def get_dataset_structure(datasetID):
-    # we try first requests library, if json decoding fails we try urllib
-    # if urllib also fails we try just report the error, rememeber this is not
+    # The shared session retries timeouts and server errors (see http_retry), so a failure
+    # here means the service is down or the answer is not valid, remember this is not 
     # time determinsitic thing, as due to internet issue or server issue we can 
     # get bad request repsonse or any other server error.
     try:
-    # response  = urllib.request.urlopen(f"http://dataservices.imf.org/REST/SDMX_JSON.svc/DataStructure/{code}").read()
-        schema_structure = requests.get(f"http://dataservices.imf.org/REST/SDMX_JSON.svc/DataStructure/{datasetID}").json()
-    except:
-        print(datasetID, 'Request failed, trying urllib')
-        try:
-            response  = urllib.request.urlopen(f"http://dataservices.imf.org/REST/SDMX_JSON.svc/DataStructure/{datasetID}").read()
-            schema_structure = json.loads(response.decode('utf-8'))
-        except Exception as e:
-            print(e)
-            return None
+        response = get_session().get(f"http://dataservices.imf.org/REST/SDMX_JSON.svc/DataStructure/{datasetID}")
+        response.raise_for_status()
+        schema_structure = response.json()
+    except (requests.RequestException, ValueError) as e:
+        print(datasetID, 'Request failed:', e)
+        return None
     return schema_structure
 
-def get_imf_data_updated(indicators_map):
+def get_imf_data_updated(indicators_map, start_year_input=2000, end_year_input=2023, checkpoint=None):
 
   ##################################### Get all IMF data #######################################
 
-  # Create an empty dataframe to store the data 
-  df_full = pd.DataFrame()
+  # Fetch each group of indicators (same dataset, frequency and area) with one request for the
+  # years (stored as one shard of the checkpoint, if given)
+  df_by_name = {}
+  for request in plan_imf_requests(indicators_map):
 
-  # Loop through each indicator in the dictionary and access data
-  for key, value in indicators_map.items(): 
-    # print(key, value)
+    shard_id = f'imf/{start_year_input}-{end_year_input}/' + '/'.join(str(value) for key, value in request.items() if key != 'names')
+    df_group = checkpointed(checkpoint, shard_id, dict(request, start=start_year_input, end=end_year_input),
+                            lambda: get_imf_indicator_data(request, start_year_input, end_year_input))
 
-    df_id = get_imf_indicator_data(value)
-    # df_id.to_csv(f'imf_ds/{key}.csv')
-    df_id['Indicator'] = key
+    # Split the result back into the named indicators
+    for code, names in request['names'].items():
+      for name in names:
+        df_by_name[name] = df_group[df_group['Indicator Code'] == code].assign(Indicator=name)
 
-    # Attach data to dataframe 
-    df_full = pd.concat([df_full, df_id])
+  # Attach data to one dataframe in the order of the dictionary
+  df_full = pd.concat([df_by_name[key] for key in indicators_map])
 
   df_full.drop(columns = ['@FREQ', '@UNIT_MULT',
        '@TIME_FORMAT', 'Country_y', 'M49 Code', 
        '@BASE_YEAR', '@OBS_STATUS',
-       '@OFFICIAL_BPM'], inplace=True)
+       '@OFFICIAL_BPM'], errors='ignore', inplace=True)
 
+  df_full['Year'] = df_full['Year'].astype(int)
   df_full['Value'] = df_full['Value'].astype(float).round(2)
   df_full.rename(columns = {'Country_x':'Country'},inplace=True)
 
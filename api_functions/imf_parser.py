@@ -0,0 +1,174 @@
+# SOURCE: https://datahelp.imf.org/knowledgebase/articles/667681-json-restful-web-service
+# SOURCE INCREMENTAL JSON DECODING: https://docs.python.org/3/library/json.html#json.JSONDecoder.raw_decode
+
+# Layout of a CompactData payload:
+# {"CompactData": {"Header": {...}, "DataSet": {"Series": [{"@REF_AREA": "DE", "@INDICATOR": "NGDP_XDC", "@UNIT_MULT": "6",
+#                                                           "Obs": [{"@TIME_PERIOD": "2000", "@OBS_VALUE": "2116.48"}, ...]}, ...]}}}
+
+import codecs
+import json
+import numpy as np
+import pandas as pd
+from api_functions.http_cache import get_session
+
+#--------------------------------------PARSER PARAMETERS---------------------------------------------
+
+# Number of bytes read from the response at a time
+READ_SIZE = 64 * 1024
+
+# Number of observations per chunk yielded by the parser
+CHUNK_ROWS = 50000
+
+# Columns of the chunks yielded by the parser and their types
+COLUMNS = ['area', 'indicator', 'period', 'value', 'unit_mult']
+DTYPES = [object, object, object, 'float64', 'int64']
+
+_decoder = json.JSONDecoder()
+_whitespace = ' \t\n\r'
+
+
+#--------------------------------------FUNCTIONS---------------------------------------------
+
+def iter_compact_series(byte_chunks):
+
+    """
+    Function that takes the payload of a CompactData response as an iterable of byte chunks and
+    yields the series of the data set one at a time. Only the series that is currently decoded
+    and the unread part of the payload are held in memory.
+
+    """
+
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    byte_chunks = iter(byte_chunks)
+    buffer = ''
+    eof = False
+
+    def read_more():
+        nonlocal buffer, eof
+        for chunk in byte_chunks:
+            if chunk:
+                buffer += text_decoder.decode(chunk)
+                return True
+        buffer += text_decoder.decode(b'', final=True)
+        eof = True
+        return False
+
+    def skip(characters):
+        # Drop leading characters (reading on if the buffer runs empty) and return the next one
+        nonlocal buffer
+        while True:
+            buffer = buffer.lstrip(characters)
+            if buffer or not read_more():
+                return buffer[:1]
+
+    def decode_object():
+        # Decode one JSON object from the start of the buffer (reading on until it is complete)
+        nonlocal buffer
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof or not read_more():
+                    raise
+                continue
+            buffer = buffer[end:]
+            return obj
+
+    # Find the "Series" entry of the data set
+    marker = '"Series"'
+    while marker not in buffer:
+        if eof or not read_more():
+            return
+        if marker not in buffer:
+            buffer = buffer[-len(marker):]
+    buffer = buffer[buffer.index(marker) + len(marker):]
+    if skip(_whitespace) != ':':
+        raise ValueError('Malformed CompactData payload: expected ":" after "Series"')
+    buffer = buffer[1:]
+
+    # A single series is not wrapped in a list
+    opening = skip(_whitespace)
+    if opening == '{':
+        yield decode_object()
+        return
+    if opening != '[':
+        raise ValueError('Malformed CompactData payload: expected a list of series')
+    buffer = buffer[1:]
+
+    # Decode the series one by one
+    while True:
+        character = skip(_whitespace + ',')
+        if character == ']':
+            return
+        if character == '':
+            raise ValueError('Truncated CompactData payload')
+        yield decode_object()
+
+
+def iter_compact_chunks(byte_chunks, chunk_rows=CHUNK_ROWS):
+
+    """
+    Function that takes the payload of a CompactData response as an iterable of byte chunks and
+    yields dataframes with the typed columns area, indicator, period (str), value (float) and
+    unit_mult (int), each holding about chunk_rows observations (whole series only).
+
+    """
+
+    columns = {column: [] for column in COLUMNS}
+
+    def make_chunk():
+        chunk = pd.DataFrame({'area': pd.Series(columns['area'], dtype=object),
+                              'indicator': pd.Series(columns['indicator'], dtype=object),
+                              'period': pd.Series(columns['period'], dtype=object),
+                              'value': np.array(columns['value'], dtype='float64'),
+                              'unit_mult': np.array(columns['unit_mult'], dtype='int64')})
+        for values in columns.values():
+            values.clear()
+        return chunk
+
+    for series in iter_compact_series(byte_chunks):
+        area = series.get('@REF_AREA')
+        indicator = series.get('@INDICATOR')
+        unit_mult = int(series.get('@UNIT_MULT', 0) or 0)
+
+        # A single observation is not wrapped in a list
+        observations = series.get('Obs', [])
+        if isinstance(observations, dict):
+            observations = [observations]
+
+        for obs in observations:
+            value = obs.get('@OBS_VALUE')
+            columns['area'].append(area)
+            columns['indicator'].append(indicator)
+            columns['period'].append(obs.get('@TIME_PERIOD'))
+            columns['value'].append(float(value) if value not in (None, '') else np.nan)
+            columns['unit_mult'].append(unit_mult)
+
+        if len(columns['value']) >= chunk_rows:
+            yield make_chunk()
+
+    if columns['value']:
+        yield make_chunk()
+
+
+def read_compact_data(url, chunk_rows=CHUNK_ROWS):
+
+    """
+    Function that takes a CompactData URL, streams the response through the shared session and
+    returns all observations as one dataframe with the columns area, indicator, period, value
+    and unit_mult. The payload is never held in memory as a whole.
+
+    """
+
+    # The chunks are taken apart into their column arrays as they arrive and every column is
+    # joined once at the end (the dataframes of the chunks are not kept)
+    parts = {column: [] for column in COLUMNS}
+    with get_session().get(url, stream=True) as response:
+        response.raise_for_status()
+        for chunk in iter_compact_chunks(response.iter_content(READ_SIZE), chunk_rows):
+            for column in COLUMNS:
+                parts[column].append(chunk[column].to_numpy())
+
+    # Empty columns of the right type if the data set has no series
+    return pd.DataFrame({column: np.concatenate(parts[column]) if parts[column] else np.array([], dtype=dtype)
+                         for column, dtype in zip(COLUMNS, DTYPES)})
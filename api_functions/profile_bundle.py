@@ -0,0 +1,180 @@
+#SOURCE ARROW IPC FILES: https://arrow.apache.org/docs/python/ipc.html
+#SOURCE MEMORY MAPPING: https://arrow.apache.org/docs/python/memory.html#memory-mapped-files
+
+import json
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from api_functions.data_index import INDICATOR_COLS, KEY_COLS, DatasetIndex
+
+#--------------------------------------BUNDLE PARAMETERS---------------------------------------------
+
+# Keys of the schema metadata: position of every country in the bundle, first and last year of
+# the dataset and the static attributes of every indicator (see DatasetIndex.indicator_dim)
+OFFSETS_KEY = b'profile_offsets'
+YEARS_KEY = b'profile_years'
+INDICATORS_KEY = b'profile_indicators'
+
+
+#--------------------------------------FUNCTIONS---------------------------------------------
+
+def build_profile_bundle(df_input, path):
+
+    """
+    Function that takes the dataset of a dashboard and writes the profile of every country
+    into one Arrow file: the observed values of all indicators (rows with a value only),
+    sorted by country, indicator and year. The position of each country, the years of the
+    dataset and the attributes of the indicators are stored in the file, so that the profile
+    of a country is one slice of the memory-mapped file. Run it in the get_data script, after
+    the dataset was saved (the dashboards do not build bundles).
+
+    """
+
+    ################################### Build the profiles #####################################
+
+    df = df_input.assign(Year=df_input['Year'].astype(int))
+    df = df.dropna(subset=['Country', 'Indicator', 'Value'])
+    countries = list(pd.unique(df['Country']))
+    indicators = list(pd.unique(df['Indicator']))
+
+    # Sort by country, indicator and year (in the order of the dataset), columns in the layout
+    # of get_filtered_data
+    country_pos = pd.Categorical(df['Country'], categories=countries).codes
+    indicator_pos = pd.Categorical(df['Indicator'], categories=indicators).codes
+    df = df.take(np.lexsort((df['Year'].to_numpy(), indicator_pos, country_pos))).reset_index(drop=True)
+    df = df[KEY_COLS + [col for col in df.columns if col not in KEY_COLS]]
+
+    # Text columns are stored dictionary-encoded (few distinct values repeated on many rows)
+    for col in df.columns:
+        if col in ('Country', 'Indicator') or df[col].dtype == object:
+            df[col] = df[col].astype('category')
+
+    # Start and number of rows of every country
+    counts = df['Country'].value_counts(sort=False)
+    starts = np.r_[0, np.cumsum([counts[country] for country in countries])[:-1]]
+    offsets = {country: [int(start), int(counts[country])] for country, start in zip(countries, starts)}
+
+    # Attributes of the indicators (also needed for the years a country has no value)
+    indicator_cols = [col for col in INDICATOR_COLS if col in df.columns]
+    indicator_dim = df.groupby('Indicator', sort=False, observed=True)[indicator_cols].first().astype(object)
+    indicator_dim = indicator_dim.where(indicator_dim.notna(), None)
+
+    ################################### Write the bundle #####################################
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        OFFSETS_KEY: json.dumps(offsets).encode('utf-8'),
+        YEARS_KEY: json.dumps([int(df_input['Year'].min()), int(df_input['Year'].max())]).encode('utf-8'),
+        INDICATORS_KEY: json.dumps(indicator_dim.to_dict(orient='split')).encode('utf-8')})
+
+    # Write to a temporary file first so that the dashboards never map half a file
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as file, pa.ipc.new_file(file, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def get_chart_data(df_profiles, indicator_selec, country_selec=None):
+    """
+    Function that takes the profiles of the selected countries (from ProfileBundle.get_profiles)
+    and the indicators of a chart, and returns the data of the chart in the layout of
+    get_filtered_data (rows ordered by year, indicator and country, in the order of the
+    selections). If country_selec is given, only these countries of the profiles are kept.
+
+    """
+
+    if isinstance(country_selec, str):
+        country_selec = [country_selec]
+    indicator_selec = list(indicator_selec)
+    df = df_profiles[df_profiles['Indicator'].isin(indicator_selec)]
+    if country_selec is not None:
+        df = df[df['Country'].isin(country_selec)]
+    indicator_pos = pd.Categorical(df['Indicator'], categories=indicator_selec).codes
+    order = np.lexsort((df['_Country Position'].to_numpy(), indicator_pos, df['Year'].to_numpy()))
+    return df.take(order).drop(columns=['_Country Position']).reset_index(drop=True)
+
+
+#--------------------------------------CLASSES---------------------------------------------
+
+class ProfileBundle:
+
+    """
+    Memory-mapped bundle of country profiles written by build_profile_bundle. Opening a country
+    page reads the slices of the selected countries (one lookup each) and fills in the years
+    without a value, so the profiles hold every indicator for every year of the selection.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+        metadata = self.table.schema.metadata
+        self.offsets = json.loads(metadata[OFFSETS_KEY])
+        self.years = json.loads(metadata[YEARS_KEY])
+        indicator_dim = json.loads(metadata[INDICATORS_KEY])
+        self.indicator_dim = pd.DataFrame(indicator_dim['data'], index=pd.Index(indicator_dim['index'], name='Indicator'),
+                                          columns=indicator_dim['columns'])
+
+    def get_profiles(self, country_selec, start_year_selec, end_year_selec):
+
+        """
+        Function that takes the selected countries and years and returns the profiles of the
+        countries for these years (all indicators). Use get_chart_data to select the data of a
+        chart from it.
+
+        """
+
+        if isinstance(country_selec, str):
+            country_selec = [country_selec]
+
+        # One slice of the bundle per country (countries without a profile are left out)
+        countries = [country for country in dict.fromkeys(country_selec) if country in self.offsets]
+        table = pa.concat_tables([self.table.slice(*self.offsets[country]) for country in countries] or [self.table.slice(0, 0)])
+        index = DatasetIndex(table.to_pandas(), indicator_dim=self.indicator_dim)
+        return _get_profiles(index, country_selec, countries, list(self.indicator_dim.index),
+                             max(start_year_selec, self.years[0]), min(end_year_selec, self.years[1]))
+
+
+class IndexProfiles:
+
+    """
+    Country profiles taken from the DatasetIndex of the dataset, with the same get_profiles as
+    ProfileBundle. Used by the dashboards while there is no current bundle (the get_data
+    script was not run since the dataset changed).
+
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.years = (int(index.years.min()), int(index.years.max())) if len(index.years) else (0, -1)
+
+    def get_profiles(self, country_selec, start_year_selec, end_year_selec):
+
+        """Function that returns the profiles of the selected countries (see ProfileBundle)."""
+
+        if isinstance(country_selec, str):
+            country_selec = [country_selec]
+        countries = [country for country in dict.fromkeys(country_selec) if country in self.index.country_dim.index]
+        return _get_profiles(self.index, country_selec, countries, list(self.index.indicator_dim.index),
+                             max(start_year_selec, self.years[0]), min(end_year_selec, self.years[1]))
+
+
+#--------------------------------------HELPER FUNCTIONS---------------------------------------------
+
+def _get_profiles(index, country_selec, countries, indicators, start_year_selec, end_year_selec):
+
+    # All indicators of the countries for every year of the selection (years without a value
+    # as empty rows), with the position of the country in the selection
+    df = index.get_filtered_data(countries, start_year_selec, end_year_selec, indicators)
+    positions = {country: position for position, country in reversed(list(enumerate(country_selec)))}
+    df['_Country Position'] = df['Country'].map(positions).astype('int64')
+    return df
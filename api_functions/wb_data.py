@@ -2,6 +2,10 @@
 
 import wbgapi as wb
 import pandas as pd
+from contextlib import contextmanager
+from types import SimpleNamespace
+from api_functions.checkpoint import checkpointed
+from api_functions.http_cache import get_session
 
 #-------------------------------------- WB PARAMETERS---------------------------------------------
 
@@ -23,12 +27,13 @@ import pandas as pd
 #--------------------------------------FUNCTION---------------------------------------------
 
 
-def get_wb_data(feature_map_input, start_year_input, end_year_input):
+def get_wb_data(feature_map_input, start_year_input, end_year_input, checkpoint=None):
 
     """
     Function that takes a list of indicator codes as an input and retrieves the
     values through the world bank API. The output is a dataframe and a csv file of the data 
-    that is stored in the directory.  
+    that is stored in the directory. If a RefreshCheckpoint is given, the retrieved data is
+    stored as a shard and read from it when a failed run is started again.
 
     """
 
@@ -40,9 +45,10 @@ def get_wb_data(feature_map_input, start_year_input, end_year_input):
     for key, value in feature_map_input.items(): 
         list_of_indicators.append(key)
 
-    # Retrieve data for all indicators
+    # Retrieve data for all indicators (one shard of the checkpoint)
 
-    df = wb.data.DataFrame(list_of_indicators, time=range(start_year_input, end_year_input), skipBlanks=True, columns='series', labels=True).reset_index()
+    df = checkpointed(checkpoint, f"wb/{start_year_input}-{end_year_input}/{'+'.join(list_of_indicators)}", {'indicators': list_of_indicators, 'start': start_year_input, 'end': end_year_input},
+                      lambda: _fetch_wb_frame(list_of_indicators, start_year_input, end_year_input))
 
     ################################### Process data #####################################
 
@@ -90,4 +96,25 @@ def get_wb_data(feature_map_input, start_year_input, end_year_input):
 
     return df
 
-#print(get_wb_data(featureMap_indicators, START_YEAR, END_YEAR))
\ No newline at end of file
+#print(get_wb_data(featureMap_indicators, START_YEAR, END_YEAR))
+
+
+#--------------------------------------HELPER FUNCTIONS---------------------------------------------
+
+@contextmanager
+def _shared_session():
+
+    # wbgapi sends all its requests through requests.get and has no option to pass a session,
+    # so its requests module is replaced by the shared session with the on-disk cache while
+    # the data is retrieved (and restored afterwards)
+    original = wb.requests
+    wb.requests = SimpleNamespace(get=get_session().get)
+    try:
+        yield
+    finally:
+        wb.requests = original
+
+
+def _fetch_wb_frame(list_of_indicators, start_year_input, end_year_input):
+    with _shared_session():
+        return wb.data.DataFrame(list_of_indicators, time=range(start_year_input, end_year_input), skipBlanks=True, columns='series', labels=True).reset_index()
@@ -2,6 +2,13 @@ import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
 import plotly.express as px
+from api_functions.data_export import ExportCache
+from api_functions.data_service import DataService
+from api_functions.download_section import show_download
+from api_functions.data_store import load_dataset
+from api_functions.derived_data import share_of_total
+from api_functions.figure_cache import FigureCache
+from api_functions.profile_bundle import get_chart_data
 
 # Git checkout
 # Use full screen 
@@ -9,14 +16,31 @@ st.set_page_config(layout="wide")
 
 #---------------------------------- LOAD DATA AND PARAMETERS ---------------------------------#
 
-# Create import function with cache (cache so data is only loaded once)
-@st.cache_data
-def load_data(path):
-    df = pd.read_excel(path, engine='openpyxl')
-    return df
+# Data service shared by all sessions (data is only loaded once per server process and again 
+# when the file changes, sessions get views of the same data instead of copies)
+@st.cache_resource
+def get_data_service(path):
+    return DataService(path, load_dataset)
 
-# Load data 
-df_employ = load_data("data/employment_data.xlsx")
+# Load data (load_dataset returns the years as integers)
+data_service = get_data_service("data/employment_data.parquet")
+df_employ = data_service.get_data()
+df_index = data_service.get_index()
+profile_bundle = data_service.get_profiles("data/employment_profiles.arrow")
+
+# Figure cache shared by all sessions (see get_figure)
+@st.cache_resource
+def get_figure_cache():
+    return FigureCache()
+
+figure_cache = get_figure_cache()
+
+# Export cache shared by all sessions (see show_download)
+@st.cache_resource
+def get_export_cache():
+    return ExportCache()
+
+export_cache = get_export_cache()
 
 # Get a country, region and indicator list
 df_countries = df_employ['Country'].unique().tolist()
@@ -25,9 +49,44 @@ df_regions = df_employ['Region'].unique().tolist()
 df_subregion = df_employ['Sub-region'].unique().tolist()
 df_sub_region = df_regions + df_subregion
 
-# Turn years into int (str necessary first because Streamlit)
-df_employ['Year'] = df_employ['Year'].astype(str)
-df_employ['Year'] = df_employ['Year'].astype(int)
+# Sectors of table 2 and their group
+table2_featureMap = {'Employment Agriculture': 'Primary',
+                    'Employment Mining and quarrying': 'Secondary',
+                    'Employment Manufacturing': 'Secondary',
+                    'Employment Utilities': 'Secondary',
+                    'Employment Construct': 'Secondary',
+                    'Employment Wholesale': 'Tertiary', 
+                    'Employment Transport': 'Tertiary',
+                    'Employment Accomodation': 'Tertiary',
+                    'Employment Financial': 'Tertiary',
+                    'Employment Real estate': 'Tertiary',
+                    'Employment Public administration and defence': 'Tertiary',
+                    'Employment Education': 'Tertiary',
+                    'Employment Human health and social work activities': 'Tertiary',
+                    'Employment Other services': 'Tertiary'}
+
+# Indicators of the charts and tables (the year slider covers the years with data for the
+# indicators of the page)
+CHART_INDICATORS = {
+    'chart1': ['Population',
+               'Population in working age',
+               'Labour force',
+               'Employment'],
+    'table1': ['Population',
+               'Population in working age',
+               'Labour force',
+               'Employment',
+               'Youth unemployment',
+               'Population, female share',
+               'Population in working age, female share',
+               'Labour force, female share',
+               'Employment, female share',
+               'Youth unemployment, female share'],
+    'chart2': ['Labour force participation rate',
+               'Unemployment rate'],
+    'table2': list(table2_featureMap.keys()) + ['Employment'],
+}
+PAGE_INDICATORS = list(dict.fromkeys(indicator for indicators in CHART_INDICATORS.values() for indicator in indicators))
 
 #------------------------------ Functions  ------------------------------------#
 
@@ -37,54 +96,43 @@ def get_filtered_data(country_selec, start_year_selec, end_year_selec, indicator
 
     """
     Function takes the user selection of the dashboard as an input and retrieves the
-    corresponding data from the dataset. The output is a filtered dataframe. 
+    corresponding data from the dataset (through the index of the dataset). The output is a 
+    filtered dataframe with one row for every year, indicator and country. 
 
     """
 
-    # Turn country selection into list if not list 
-    if isinstance(country_selec, str):
-        country_selec = [country_selec]
+    return df_index.get_filtered_data(country_selec, start_year_selec, end_year_selec, indicator_selec)
 
-    # Create a dataframe with all years and indicators first
-    ## This is necessary to add the missing years with "None" values
-    df_empty = pd.DataFrame([(year, indicator, country) 
-                            for year in range(start_year_selec, end_year_selec+1)
-                            for indicator in indicator_selec
-                            for country in country_selec],
-                            columns=['Year', 'Indicator', 'Country'])
+# Figure Selection 
+def get_figure(chart_id, country_selec, start_year_selec, end_year_selec, indicator_selec, build_figure):
 
-    
-    # Retrieve the selected data from df
-    df_fltr = df_employ[(df_employ['Country'].isin(country_selec)) & 
-                       (df_employ['Year'] >= start_year_selec) & 
-                       (df_employ['Indicator'].isin(indicator_selec)) &
-                       (df_employ['Year'] <= end_year_selec)]
-    
-    ## Merge 
-    df_merged = pd.merge(df_empty, df_fltr, on=['Year', 'Indicator', 'Country'], how='left')
-
-    ## Fill other columns 
-    df_merged['Indicator Code'] = df_merged.groupby('Indicator')['Indicator Code'].apply(lambda x: x.fillna(method='ffill').fillna(method='bfill'))
-
-    for col in ['Country Code', 'Region', 'Sub-region', 'Income Group', 'Least Developed Countries (LDC)', 'Land Locked Developing Countries (LLDC)', 'Small Island Developing States (SIDS)']:
-        df_merged[col] = df_merged.groupby('Country')[col].apply(lambda x: x.fillna(method='ffill').fillna(method='bfill'))
+    """
+    Function takes a chart, the user selection it shows and a function that builds the figure
+    of the chart, and returns the figure from the figure cache. The figure is only built again 
+    if the selection of the chart or the data changed since it was last built.
 
-    # Turn year column into datetime format
+    """
 
-    return df_merged
+    return figure_cache.get_figure(chart_id, country_selec, start_year_selec, end_year_selec, indicator_selec, 
+                                   data_service.version, build_figure)
 
 # Year Selection 
-def get_years(country_input): 
+def get_years(country_input, indicator_input=None): 
 
     """
-    Takes a country as an input and retrieves the corresponding minimum and maximum year
-    available. This can be used to adjust the year slider. 
+    Takes the selected countries (and the indicators shown) as an input and retrieves the 
+    minimum and maximum year with data for any of them (from the year coverage of the index), 
+    or the years of the whole dataset if the selection has no data. This can be used to adjust 
+    the year slider. 
 
     """
-    start_year_country = int(df_employ[df_employ['Country'] == country_input]['Year'].min())
-    end_year_country = int(df_employ[df_employ['Country'] == country_input]['Year'].max())
 
-    return start_year_country, end_year_country
+    first_year, last_year = df_index.get_year_range(country_input, indicator_input)
+    if first_year is None:
+        first_year, last_year = df_index.year_range
+
+    # The slider needs two different years
+    return first_year, max(last_year, first_year + 1)
 
 
 
@@ -124,7 +172,7 @@ selected_peer = st.sidebar.multiselect(
 # START AND END YEAR SLIDER 
 
 # Update based on data availability for chosen country 
-START_YEAR, END_YEAR = get_years(selected_country)
+START_YEAR, END_YEAR = get_years([selected_country] + selected_region + selected_peer, PAGE_INDICATORS)
 
 # Widget
 selected_years = st.sidebar.slider(
@@ -134,21 +182,16 @@ selected_years = st.sidebar.slider(
 selected_start_year = selected_years[0]
 selected_end_year = selected_years[1]
 
-# DOWNLOAD WIDGET 
-
-# Create a csv version of the dataframe (cache so it doesn't rerun)
-@st.cache_data
-def convert_df(df):
-    return df.to_csv().encode('utf-8')
+# Profiles of the chosen country, regions and peers (all indicators, read from the profile bundle)
+df_profiles = profile_bundle.get_profiles([selected_country] + selected_region + selected_peer, selected_start_year, selected_end_year)
 
-csv = convert_df(df_employ)
+# DOWNLOAD WIDGET 
 
 # Add empty space to create some distance 
 st.sidebar.header("")
 
-st.sidebar.download_button(label="Click here to download data as csv",
-                   data=csv, 
-                   file_name='employment_data.xlsx')
+with st.sidebar:
+    show_download(data_service, export_cache, 'employment_data', [selected_country] + selected_region + selected_peer, selected_start_year, selected_end_year, df_indicators)
 
 st.sidebar.header("")
 
@@ -212,27 +255,28 @@ with col1:
 with col1: 
 
     # Get data
-    chart1_data = get_filtered_data(selected_country, selected_start_year, selected_end_year, ['Population', 'Population in working age', 'Labour force', 'Employment'])
-    
-    ### Group data by year
-    chart1_data = chart1_data.groupby([chart1_data.Indicator],group_keys=False,sort=False).apply(pd.DataFrame.sort_values,'Year')
+    chart1_indicators = CHART_INDICATORS['chart1']
+    chart1_data = get_chart_data(df_profiles, chart1_indicators, selected_country)
     
-    # Configure plot
-    fig = px.line(chart1_data,
-                    x="Year", 
-                    y="Value",   
-                    color='Indicator',
-                    hover_name="Value"
-                    )
+    # Configure plot (only built again when the selection or the data changed)
+    def build_figure():
+        fig = px.line(chart1_data,
+                        x="Year", 
+                        y="Value",   
+                        color='Indicator',
+                        hover_name="Value"
+                        )
     
-    # Move legend 
-    fig.update_layout(legend=dict(
-       # orientation="h",
-        yanchor="bottom",
-        y=1.05,
-        xanchor="left",
-        x=0.01
-        ))
+        # Move legend 
+        fig.update_layout(legend=dict(
+           # orientation="h",
+            yanchor="bottom",
+            y=1.05,
+            xanchor="left",
+            x=0.01
+            ))
+        return fig
+    fig = get_figure('chart1', selected_country, selected_start_year, selected_end_year, chart1_indicators, build_figure)
     
     # Display graph
     st.plotly_chart(fig, use_container_width=True)
@@ -262,40 +306,27 @@ with col3:
 
     #### (3) Table 1
 
-    table1_indicators = ['Population', 
-                        'Population in working age',
-                        'Labour force',
-                        'Employment',
-                        'Youth unemployment', 
-                        'Population, female share', 
-                        'Population in working age, female share',
-                        'Labour force, female share',
-                        'Employment, female share',
-                        'Youth unemployment, female share']
+    table1_indicators = CHART_INDICATORS['table1']
     
     table1_data = get_filtered_data(selected_country, selected_end_year, selected_end_year, table1_indicators)
 
     # Try whether the data for the given year is available
     try: 
-        # Create the table 
-        indicator_values = {}
-        for ind in table1_indicators:
-
-            # Retrieve the values
-            indicator_values[ind] = round(table1_data[table1_data['Indicator'] == ind].values[0][5])
+        # Retrieve the values (women's share: female indicators as share of the totals)
+        indicator_values = table1_data.drop_duplicates('Indicator').set_index('Indicator')['Value'].reindex(table1_indicators)
+        womens_shares = share_of_total(table1_data, table1_indicators[5:], table1_indicators[:5])
 
         # Create table
         table1_dict = {
             'Indicator': ['Population', 'Working age population', 'Labour force', 'Formal employment', 'Youth unemployment'],
-            'Total': [indicator_values[ind] for ind in table1_indicators[:5]],
-            'Women': [indicator_values[ind] for ind in table1_indicators[5:]]}
+            'Total': indicator_values[table1_indicators[:5]].round().astype(int).to_numpy(),
+            'Women': indicator_values[table1_indicators[5:]].round().astype(int).to_numpy()}
 
         table1 = pd.DataFrame(table1_dict).reset_index(drop=True)
         table1.set_index('Indicator', inplace=True)
 
         # Add women's share column and round to two digits
-        table1["Women's share (%)"] = round(table1['Women'] / table1['Total'].apply(lambda x: round(x / 100)),2)
-        table1["Women's share (%)"] = table1["Women's share (%)"].apply(lambda x: format(x,".2f" ))
+        table1["Women's share (%)"] = womens_shares.iloc[0].round(2).apply(lambda x: format(x,".2f" )).to_numpy()
 
         #add commas 
         table1['Total'] = table1["Total"].apply(lambda x: format (x, ',d'))
@@ -349,77 +380,89 @@ with col1:
 with col3:
 
     # Get data for country and for comparison chosen
-    chart2_data = get_filtered_data(selected_country, selected_start_year, selected_end_year, ['Labour force participation rate', 'Unemployment rate'])
-    chart2_data_unemp = get_filtered_data([selected_country] + selected_region + selected_peer, selected_start_year, selected_end_year, ['Unemployment rate'])
-    chart2_data_lf = get_filtered_data([selected_country] + selected_region + selected_peer, selected_start_year, selected_end_year, ['Labour force participation rate'])
+    chart2_indicators = CHART_INDICATORS['chart2']
+    chart2_data = get_chart_data(df_profiles, chart2_indicators, selected_country)
+    chart2_unemp_indicators = ['Unemployment rate']
+    chart2_data_unemp = get_chart_data(df_profiles, chart2_unemp_indicators)
+    chart2_lf_indicators = ['Labour force participation rate']
+    chart2_data_lf = get_chart_data(df_profiles, chart2_lf_indicators)
     
     #  Graphs
     tab1, tab2, tab3 = st.tabs(["Country Data", "Unemployment Comparison", "Labour Force Comparison"])
 
     with tab1:
       
-        # Configure plot
-        fig = px.line(chart2_data,
-                        x="Year", 
-                        y="Value", 
-                        color='Indicator',
-                        hover_name="Value"
-                        )
-        # Fix y-axis to always show (100%)
-        fig.update_yaxes(range=[0, 100])
-
-        # Move legend 
-        fig.update_layout(legend=dict(
-            #orientation="h",
-            yanchor="bottom",
-            y=1.05,
-            xanchor="left",
-            x=0.01
-            ))
+        # Configure plot (only built again when the selection or the data changed)
+        def build_figure():
+            fig = px.line(chart2_data,
+                            x="Year", 
+                            y="Value", 
+                            color='Indicator',
+                            hover_name="Value"
+                            )
+            # Fix y-axis to always show (100%)
+            fig.update_yaxes(range=[0, 100])
+
+            # Move legend 
+            fig.update_layout(legend=dict(
+                #orientation="h",
+                yanchor="bottom",
+                y=1.05,
+                xanchor="left",
+                x=0.01
+                ))
+            return fig
+        fig = get_figure('chart2', selected_country, selected_start_year, selected_end_year, chart2_indicators, build_figure)
 
         # Display graph
         st.plotly_chart(fig, use_container_width=True)
     
     with tab2: 
 
-        # Configure plot
-        fig = px.line(chart2_data_unemp,
-                        x="Year", 
-                        y="Value", 
-                        color='Country',
-                        hover_name="Value"
-                        )
+        # Configure plot (only built again when the selection or the data changed)
+        def build_figure():
+            fig = px.line(chart2_data_unemp,
+                            x="Year", 
+                            y="Value", 
+                            color='Country',
+                            hover_name="Value"
+                            )
         
-        # Move legend 
-        fig.update_layout(legend=dict(
-            #orientation="h",
-            yanchor="bottom",
-            y=1.05,
-            xanchor="left",
-            x=0.01
-            ))
+            # Move legend 
+            fig.update_layout(legend=dict(
+                #orientation="h",
+                yanchor="bottom",
+                y=1.05,
+                xanchor="left",
+                x=0.01
+                ))
+            return fig
+        fig = get_figure('chart2_unemp', [selected_country] + selected_region + selected_peer, selected_start_year, selected_end_year, chart2_unemp_indicators, build_figure)
 
         # Display graph
         st.plotly_chart(fig, use_container_width=True)
 
     with tab3: 
 
-        # Configure plot
-        fig = px.line(chart2_data_lf,
-                        x="Year", 
-                        y="Value", 
-                        color='Country',
-                        hover_name="Value"
-                        )
+        # Configure plot (only built again when the selection or the data changed)
+        def build_figure():
+            fig = px.line(chart2_data_lf,
+                            x="Year", 
+                            y="Value", 
+                            color='Country',
+                            hover_name="Value"
+                            )
         
-        # Move legend 
-        fig.update_layout(legend=dict(
-            #orientation="h",
-            yanchor="bottom",
-            y=1.05,
-            xanchor="left",
-            x=0.01
-            ))
+            # Move legend 
+            fig.update_layout(legend=dict(
+                #orientation="h",
+                yanchor="bottom",
+                y=1.05,
+                xanchor="left",
+                x=0.01
+                ))
+            return fig
+        fig = get_figure('chart2_lf', [selected_country] + selected_region + selected_peer, selected_start_year, selected_end_year, chart2_lf_indicators, build_figure)
 
         # Display graph
         st.plotly_chart(fig, use_container_width=True)
@@ -464,41 +507,15 @@ st.header("")
 # Configure columns
 col1, col2, col3 = st.columns([1,0.05,1])
 
+# Retrieve the sectors and total employment for the year
+table2_data = get_filtered_data(selected_country, selected_end_year, selected_end_year, CHART_INDICATORS['table2'])
 
-table2_featureMap = {'Employment Agriculture': 'Primary',
-                    'Employment Mining and quarrying': 'Secondary',
-                    'Employment Manufacturing': 'Secondary',
-                    'Employment Utilities': 'Secondary',
-                    'Employment Construct': 'Secondary',
-                    'Employment Wholesale': 'Tertiary', 
-                    'Employment Transport': 'Tertiary',
-                    'Employment Accomodation': 'Tertiary',
-                    'Employment Financial': 'Tertiary',
-                    'Employment Real estate': 'Tertiary',
-                    'Employment Public administration and defence': 'Tertiary',
-                    'Employment Education': 'Tertiary',
-                    'Employment Human health and social work activities': 'Tertiary',
-                    'Employment Other services': 'Tertiary'}             
-
-table2_data = get_filtered_data(selected_country, selected_end_year, selected_end_year, table2_featureMap.keys())
-
-#  Retrieve employment value for the year
-employment_in_year = get_filtered_data(selected_country, selected_end_year, selected_end_year, ["Employment"]).values[0][5]
-
-# Create the table 
-indicator_values_table2 = {}
-
-for ind in table2_featureMap.keys():
-
-    # Retrieve the value 
-    employ_value = table2_data[table2_data['Indicator'] == ind].values[0][5]
-
-    # Assign value
-    indicator_values_table2[ind] = format(round((employ_value / employment_in_year) *100,2),".2f")
+# Create the table (employment of the sectors as share of total employment)
+employment_shares = share_of_total(table2_data, table2_featureMap.keys(), 'Employment')
 
 table2_dict = {
-    'Sub Sector': indicator_values_table2.keys(),
-    'Employment Share (%)': indicator_values_table2.values()}
+    'Sub Sector': list(table2_featureMap.keys()),
+    'Employment Share (%)': employment_shares.iloc[0].round(2).apply(lambda x: format(x,".2f")).to_numpy()}
 
 table2 = pd.DataFrame(table2_dict).reset_index(drop=True)
 
@@ -529,15 +546,18 @@ if sum(table2['Employment Share (%)'] == 'nan') < (len(table2['Employment Share
         table2['Employment Share (%)'] = table2['Employment Share (%)'].astype(float)
         #table2.loc[table2['Employment Share (%)'] < 2, 'Sub Sector'] = 'Other Sectors' # Represent only large countries
 
-        # Configure plot
-        fig_2 = px.pie(table2,
-                    values="Employment Share (%)",
-                    title=f"Employment Shares for {selected_country} in {selected_end_year}",
-                    names="Sub Sector")
+        # Configure plot (only built again when the selection or the data changed)
+        def build_figure():
+            fig_2 = px.pie(table2,
+                        values="Employment Share (%)",
+                        title=f"Employment Shares for {selected_country} in {selected_end_year}",
+                        names="Sub Sector")
         
-        fig_2.update_layout(margin=dict(t=35, b=1, l=1, r=1))
-        fig_2.update(layout_showlegend=False)
-        fig_2.update_traces(textposition='inside', textinfo='percent+label')
+            fig_2.update_layout(margin=dict(t=35, b=1, l=1, r=1))
+            fig_2.update(layout_showlegend=False)
+            fig_2.update_traces(textposition='inside', textinfo='percent+label')
+            return fig_2
+        fig_2 = get_figure('table2_pie', selected_country, selected_end_year, selected_end_year, table2_featureMap.keys(), build_figure)
 
         
         # Display graph
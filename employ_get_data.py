@@ -1,12 +1,35 @@
 import pandas as pd 
 from api_functions.wb_data import get_wb_data
 from api_functions.ilo_data import get_ilo_data
+from api_functions.aggregation import aggregate_classifications
+from api_functions.bulk_data import get_ilo_bulk_data, get_wb_bulk_data
+from api_functions.checkpoint import RefreshCheckpoint
+from api_functions.data_store import save_dataset
+from api_functions.delta_refresh import ObservationStore, refresh_indicators
+from api_functions.profile_bundle import build_profile_bundle
 
 ########################### SPECIFY START AND END YEAR ###############################
 
 START_YEAR = 2000
 END_YEAR = 2023
 
+########################### SPECIFY THE NUMBER OF PARALLEL REQUESTS ###############################
+
+# Number of indicators fetched at the same time and maximum open requests per data provider
+MAX_WORKERS = 8
+MAX_PER_HOST = 4
+
+########################### SPECIFY THE OUTPUT ###############################
+
+# The dashboard reads the Parquet dataset, set to True to also export an Excel file
+EXPORT_EXCEL = False
+
+########################### SPECIFY THE AGGREGATION ###############################
+
+# Indicator code used to weight the group values of regions, income groups, ... 
+# (e.g. 'SP.POP.TOTL' for population-weighted means, None for simple means)
+AGGREGATION_WEIGHT = None
+
 ########################### SPECIFY THE WB INDICATORS NEEDED ##########################
 
 featureMap_indicators={
@@ -75,13 +98,46 @@ featureMap_params = {
 
 }
 
+########################### SPECIFY THE DATA SOURCE ###############################
+
+# 'api' fetches the data from the WB and ILO services, 'bulk' reads the staged bulk downloads
+# instead (faster for many indicators): the WDI CSV archive and one ILOSTAT bulk file per
+# indicator (e.g. EMP_TEMP_SEX_AGE_NB_A.csv.gz)
+DATA_BACKEND = 'api'
+WDI_BULK_PATH = 'data/bulk/WDI_CSV.zip'
+ILOSTAT_BULK_DIR = 'data/bulk/ilostat'
+
+########################### SPECIFY THE CHECKPOINT ###############################
+
+# Every request is stored in data/checkpoints/employment as soon as it arrives. If the run fails,
+# start the script again: stored requests are read from disk and only the missing ones are sent
+checkpoint = RefreshCheckpoint('employment')
+
+########################### SPECIFY THE REFRESH ###############################
+
+# Observations of earlier runs are kept in data/observations/employment. Only the years after them
+# are fetched, plus the last REVISION_LOOKBACK years (the sources revise their latest values).
+# Delete the folder to fetch the full history again.
+REVISION_LOOKBACK = 2
+store = ObservationStore('employment')
+
 ########################### RETRIEVE DATA ##########################
 
+# Fetch functions of the data source (called with the indicators and years to fetch)
+if DATA_BACKEND == 'bulk':
+    fetch_wb = lambda indicators, start, end: get_wb_bulk_data(WDI_BULK_PATH, indicators, start, end)
+    fetch_ilo = lambda indicators, start, end: get_ilo_bulk_data(ILOSTAT_BULK_DIR, indicators, start, end)
+else:
+    fetch_wb = lambda indicators, start, end: get_wb_data(indicators, start, end, checkpoint=checkpoint)
+    fetch_ilo = lambda indicators, start, end: get_ilo_data(indicators, start, end, featureMap_params,
+                                                            max_workers=MAX_WORKERS, max_per_host=MAX_PER_HOST,
+                                                            checkpoint=checkpoint)
+
 # World Bank 
-wb_data = get_wb_data(featureMap_indicators, START_YEAR, END_YEAR)
+wb_data = refresh_indicators(store, 'wb', featureMap_indicators, START_YEAR, END_YEAR, fetch_wb, lookback=REVISION_LOOKBACK)
 
 # ILOSTAT
-ilo_data = get_ilo_data(INDICATORS_ILO, START_YEAR, END_YEAR, featureMap_params)
+ilo_data = refresh_indicators(store, 'ilo', INDICATORS_ILO, START_YEAR, END_YEAR, fetch_ilo, lookback=REVISION_LOOKBACK)
 
 
 ########################### PROCESS DATA ##########################
@@ -94,28 +150,17 @@ ilo_data.loc[conditions, 'Value'] = ilo_data.loc[conditions, 'Value'] * 1000
 df_employ = pd.concat([wb_data, ilo_data])
 
 # Calculate region values for the indicators and attach to df
+# (the group is shown in the country column: region or income group name, or the classification name)
+df_employ = pd.concat([df_employ, aggregate_classifications(df_employ, weight_indicator=AGGREGATION_WEIGHT, label_col='Country')])
 
-# Region 
-mean_values = df_employ.groupby(['Region' , 'Indicator', 'Year'])['Value'].mean().reset_index()
-mean_values = mean_values[~(mean_values['Region'] == 0)]
-mean_values.rename(columns={'Region': 'Country'}, inplace=True)
-df_employ = pd.concat([df_employ, mean_values])
-
-
-# Other
-selected_cols  = ['Income Group', 'Least Developed Countries (LDC)', 
-                  'Land Locked Developing Countries (LLDC)', 
-                  'Small Island Developing States (SIDS)']
+# Save as Parquet dataset (and as Excel file if EXPORT_EXCEL)
+save_dataset(df_employ, 'data/employment_data.parquet', excel_path='data/employment_data.xlsx' if EXPORT_EXCEL else None)
 
-for ele in selected_cols: 
-    mean_values = df_employ.groupby([ele , 'Indicator', 'Year'])['Value'].mean().reset_index()
-    mean_values = mean_values[~(mean_values[ele] == 0)]
-    mean_values[ele] = mean_values[ele].apply(lambda x: ele)
-    mean_values.rename(columns={ele: 'Country'}, inplace=True)
-    df_employ = pd.concat([df_employ, mean_values])
+# Save the country profiles of the Guided pages (written after the dataset, so it is newer)
+build_profile_bundle(df_employ, 'data/employment_profiles.arrow')
 
-# Save as excel file
-df_employ.to_excel('data/employment_data.xlsx', index=False)
+# The run is complete, the next run fetches fresh data
+checkpoint.clear()
 
 
 
@@ -2,19 +2,40 @@ import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
 import plotly.express as px
+from api_functions.data_export import ExportCache
+from api_functions.data_service import DataService
+from api_functions.download_section import show_download
+from api_functions.data_store import load_dataset
+from api_functions.figure_cache import FigureCache
 
 st.set_page_config(layout="wide")
 
 #---------------------------------- LOAD DATA AND PARAMETERS ---------------------------------#
 
-# Create import function with cache (cache so data is only loaded once)
-@st.cache_data
-def load_data(path):
-    df = pd.read_excel(path, engine='openpyxl')
-    return df
+# Data service shared by all sessions (data is only loaded once per server process and again 
+# when the file changes, sessions get views of the same data instead of copies)
+@st.cache_resource
+def get_data_service(path):
+    return DataService(path, load_dataset)
 
-# Load data 
-df_income = load_data("data/income_data.xlsx")
+# Load data (load_dataset returns the years as integers)
+data_service = get_data_service("data/income_data.parquet")
+df_income = data_service.get_data()
+df_index = data_service.get_index()
+
+# Figure cache shared by all sessions (see get_figure)
+@st.cache_resource
+def get_figure_cache():
+    return FigureCache()
+
+figure_cache = get_figure_cache()
+
+# Export cache shared by all sessions (see show_download)
+@st.cache_resource
+def get_export_cache():
+    return ExportCache()
+
+export_cache = get_export_cache()
 
 # Get a country, region and indicator list
 df_countries = df_income['Country'].unique().tolist()
@@ -23,10 +44,21 @@ df_regions = df_income['Region'].unique().tolist()
 df_subregion = df_income['Sub-region'].unique().tolist()
 df_sub_region = df_regions + df_subregion
 
-
-# Turn years into int (str necessary first because Streamlit)
-df_income['Year'] = df_income['Year'].astype(str)
-df_income['Year'] = df_income['Year'].astype(int)
+# Indicators of the charts (the year slider covers the years with data for the indicators
+# of the page)
+CHART_INDICATORS = {
+    'chart1': ['Labour income share estimates'],
+    'chart2': ['Gini index'],
+    'chart3': ['GDP per capita',
+               'GNI per capita'],
+    'area1': ['Income share held by highest 20%',
+              'Income share held by second 20%',
+              'Income share held by third 20%',
+              'Income share held by fourth 20%',
+              'Income share held by lowest 20%'],
+    'chart4': ['Poverty Share'],
+}
+PAGE_INDICATORS = list(dict.fromkeys(indicator for indicators in CHART_INDICATORS.values() for indicator in indicators))
 
 #------------------------------ Functions  ------------------------------------#
 
@@ -35,7 +67,8 @@ def get_filtered_data(country_selec, peer_selec, region_select, start_year_selec
 
     """
     Function takes the user selection of the dashboard as an input and retrieves the
-    corresponding data from the dataset. The output is a filtered dataframe. 
+    corresponding data from the dataset (through the index of the dataset). The output is a 
+    filtered dataframe with one row for every year, indicator and country. 
 
     """
 
@@ -52,47 +85,38 @@ def get_filtered_data(country_selec, peer_selec, region_select, start_year_selec
     # Combine selected countries
     countries_selec = country_selec + peer_selec + region_select
 
-    # Create a dataframe with all years and indicators first
-    ## This is necessary to add the missing years with "None" values
-    df_empty = pd.DataFrame([(year, indicator, country) 
-                            for year in range(start_year_selec, end_year_selec+1)
-                            for indicator in indicator_selec
-                            for country in countries_selec],
-                            columns=['Year', 'Indicator', 'Country'])
+    return df_index.get_filtered_data(countries_selec, start_year_selec, end_year_selec, indicator_selec)
 
-    
-    # Retrieve the selected data from df
-    df_fltr = df_income[(df_income['Country'].isin(countries_selec)) & 
-                       (df_income['Year'] >= start_year_selec) & 
-                       (df_income['Indicator'].isin(indicator_selec)) &
-                       (df_income['Year'] <= end_year_selec)]
-    
-    ## Merge 
-    df_merged = pd.merge(df_empty, df_fltr, on=['Year', 'Indicator', 'Country'], how='left')
-
-    ## Fill other columns 
-    df_merged['Indicator Code'] = df_merged.groupby('Indicator')['Indicator Code'].apply(lambda x: x.fillna(method='ffill').fillna(method='bfill'))
+# Figure Selection 
+def get_figure(chart_id, country_selec, start_year_selec, end_year_selec, indicator_selec, build_figure):
 
-    for col in ['Country Code', 'Region', 'Sub-region', 'Income Group', 'Least Developed Countries (LDC)', 'Land Locked Developing Countries (LLDC)', 'Small Island Developing States (SIDS)']:
-        df_merged[col] = df_merged.groupby('Country')[col].apply(lambda x: x.fillna(method='ffill').fillna(method='bfill'))
-
-    # Turn year column into datetime format
+    """
+    Function takes a chart, the user selection it shows and a function that builds the figure
+    of the chart, and returns the figure from the figure cache. The figure is only built again 
+    if the selection of the chart or the data changed since it was last built.
 
-    return df_merged
+    """
 
+    return figure_cache.get_figure(chart_id, country_selec, start_year_selec, end_year_selec, indicator_selec, 
+                                   data_service.version, build_figure)
 
 # Year Selection 
-def get_years(country_input): 
+def get_years(country_input, indicator_input=None): 
 
     """
-    Takes a country as an input and retrieves the corresponding minimum and maximum year
-    available. This can be used to adjust the year slider. 
+    Takes the selected countries (and the indicators shown) as an input and retrieves the 
+    minimum and maximum year with data for any of them (from the year coverage of the index), 
+    or the years of the whole dataset if the selection has no data. This can be used to adjust 
+    the year slider. 
 
     """
-    start_year_country = int(df_income[df_income['Country'] == country_input]['Year'].min())
-    end_year_country = int(df_income[df_income['Country'] == country_input]['Year'].max())
 
-    return start_year_country, end_year_country
+    first_year, last_year = df_index.get_year_range(country_input, indicator_input)
+    if first_year is None:
+        first_year, last_year = df_index.year_range
+
+    # The slider needs two different years
+    return first_year, max(last_year, first_year + 1)
 
 #---------------------------------------- SIDEBAR ---------------------------------
 
@@ -131,7 +155,7 @@ selected_peer = st.sidebar.multiselect(
 # START AND END YEAR SLIDER 
 
 # Update based on data availability for chosen country 
-START_YEAR, END_YEAR = get_years(selected_country)
+START_YEAR, END_YEAR = get_years([selected_country] + selected_peer + selected_region, PAGE_INDICATORS)
 
 # Widget
 selected_years = st.sidebar.slider(
@@ -143,19 +167,11 @@ selected_end_year = selected_years[1]
 
 # DOWNLOAD WIDGET 
 
-# Create a csv version of the dataframe (cache so it doesn't rerun)
-@st.cache_data
-def convert_df(df):
-    return df.to_csv().encode('utf-8')
-
-csv = convert_df(df_income)
-
 # Add empty space to create some distance 
 st.sidebar.header("")
 
-st.sidebar.download_button(label="Click here to download data as csv",
-                   data=csv, 
-                   file_name='income_data.xlsx')
+with st.sidebar:
+    show_download(data_service, export_cache, 'income_data', [selected_country] + selected_peer + selected_region, selected_start_year, selected_end_year, df_indicators)
 
 st.sidebar.header("")
 
@@ -225,27 +241,31 @@ with col1:
 with col1: 
 
     # Get data
-    chart1_data = get_filtered_data(selected_country, selected_peer, selected_region, selected_start_year, selected_end_year, ['Labour income share estimates'])
+    chart1_indicators = CHART_INDICATORS['chart1']
+    chart1_data = get_filtered_data(selected_country, selected_peer, selected_region, selected_start_year, selected_end_year, chart1_indicators)
     
     ### Group data by year
     chart1_data = chart1_data.groupby([chart1_data.Indicator],group_keys=False,sort=False).apply(pd.DataFrame.sort_values,'Year')
     
-    # Configure plot
-    fig = px.line(chart1_data,
-                    x="Year", 
-                    y="Value",   
-                    color='Country',
-                    hover_name="Country"
-                    )
+    # Configure plot (only built again when the selection or the data changed)
+    def build_figure():
+        fig = px.line(chart1_data,
+                        x="Year", 
+                        y="Value",   
+                        color='Country',
+                        hover_name="Country"
+                        )
     
-    # Move legend 
-    fig.update_layout(legend=dict(
-       # orientation="h",
-        yanchor="bottom",
-        y=1.05,
-        xanchor="left",
-        x=0.01
-        ))
+        # Move legend 
+        fig.update_layout(legend=dict(
+           # orientation="h",
+            yanchor="bottom",
+            y=1.05,
+            xanchor="left",
+            x=0.01
+            ))
+        return fig
+    fig = get_figure('chart1', [selected_country] + selected_peer + selected_region, selected_start_year, selected_end_year, chart1_indicators, build_figure)
     
     # Display graph
     st.plotly_chart(fig, use_container_width=True)
@@ -275,27 +295,31 @@ with col3:
     #st.subheader("Gini Coefficient")    
 
     # Get data
-    chart2_data = get_filtered_data(selected_country, selected_peer, selected_region, selected_start_year, selected_end_year, ['Gini index'])
+    chart2_indicators = CHART_INDICATORS['chart2']
+    chart2_data = get_filtered_data(selected_country, selected_peer, selected_region, selected_start_year, selected_end_year, chart2_indicators)
     
     ### Group data by year
     chart2_data = chart2_data.groupby([chart2_data.Indicator],group_keys=False,sort=False).apply(pd.DataFrame.sort_values,'Year')
     
-    # Configure plot
-    fig = px.line(chart2_data,
-                    x="Year", 
-                    y="Value",   
-                    color='Country',
-                    hover_name="Country"
-                    )
+    # Configure plot (only built again when the selection or the data changed)
+    def build_figure():
+        fig = px.line(chart2_data,
+                        x="Year", 
+                        y="Value",   
+                        color='Country',
+                        hover_name="Country"
+                        )
     
-    # Move legend 
-    fig.update_layout(legend=dict(
-       # orientation="h",
-        yanchor="bottom",
-        y=1.05,
-        xanchor="left",
-        x=0.01
-        ))
+        # Move legend 
+        fig.update_layout(legend=dict(
+           # orientation="h",
+            yanchor="bottom",
+            y=1.05,
+            xanchor="left",
+            x=0.01
+            ))
+        return fig
+    fig = get_figure('chart2', [selected_country] + selected_peer + selected_region, selected_start_year, selected_end_year, chart2_indicators, build_figure)
     
     # Display graph
     st.plotly_chart(fig, use_container_width=True)
@@ -336,29 +360,33 @@ with col1:
 with col1: 
 
     # Get data
-    chart3_data = get_filtered_data(selected_country, selected_peer, selected_region, selected_start_year, selected_end_year, ['GDP per capita', 'GNI per capita'])
+    chart3_indicators = CHART_INDICATORS['chart3']
+    chart3_data = get_filtered_data(selected_country, selected_peer, selected_region, selected_start_year, selected_end_year, chart3_indicators)
     
     ### Group data by year
     chart3_data = chart3_data.groupby(['Indicator'],group_keys=False,sort=False).apply(pd.DataFrame.sort_values,['Year'])
     
-    # Configure plot
-    fig = px.line(chart3_data,
-                  x='Year', 
-                  y='Value',
-                  color='Indicator',
-                  line_group='Country',  # Group lines by Country
-                  labels={'Value': 'Indicator Value'},# Update y-axis label
-                  hover_name='Country'
-                  )
-
-    # Move legend 
-    fig.update_layout(legend=dict(
-       # orientation="h",
-        yanchor="bottom",
-        y=1.05,
-        xanchor="left",
-        x=0.01
-        ))
+    # Configure plot (only built again when the selection or the data changed)
+    def build_figure():
+        fig = px.line(chart3_data,
+                      x='Year', 
+                      y='Value',
+                      color='Indicator',
+                      line_group='Country',  # Group lines by Country
+                      labels={'Value': 'Indicator Value'},# Update y-axis label
+                      hover_name='Country'
+                      )
+
+        # Move legend 
+        fig.update_layout(legend=dict(
+           # orientation="h",
+            yanchor="bottom",
+            y=1.05,
+            xanchor="left",
+            x=0.01
+            ))
+        return fig
+    fig = get_figure('chart3', [selected_country] + selected_peer + selected_region, selected_start_year, selected_end_year, chart3_indicators, build_figure)
     
     
     # Display graph
@@ -373,38 +401,37 @@ with col3:
     st.subheader("Income Shares GNI per Capita")
 
     # Get data
+    area1_indicators = CHART_INDICATORS['area1']
     area1_data =  get_filtered_data(selected_country, selected_peer, selected_region, selected_start_year, selected_end_year, 
-                                          ['Income share held by highest 20%', 
-                                           'Income share held by second 20%',
-                                           'Income share held by third 20%',
-                                           'Income share held by fourth 20%',
-                                           'Income share held by lowest 20%',
-                                           ])
+                                          area1_indicators)
     ### Group data by year
     area1_data = area1_data.groupby([chart1_data.Indicator],group_keys=False,sort=False).apply(pd.DataFrame.sort_values,'Year')
 
 
-    # Configure plot
-    fig = px.area(area1_data,
-                  x="Year", 
-                  y="Value",
-                  color='Indicator',
-                  facet_col='Country',
-                  facet_col_wrap=2,
-                  hover_name="Country"
-                  )
+    # Configure plot (only built again when the selection or the data changed)
+    def build_figure():
+        fig = px.area(area1_data,
+                      x="Year", 
+                      y="Value",
+                      color='Indicator',
+                      facet_col='Country',
+                      facet_col_wrap=2,
+                      hover_name="Country"
+                      )
     
-    # Fix y-axis to always show (100%)
-    fig.update_yaxes(range=[0, 100])
-
-    # Move legend 
-    fig.update_layout(legend=dict(
-            #orientation="h",
-            yanchor="bottom",
-            y=1.05,
-            xanchor="left",
-            x=0.01
-            ))
+        # Fix y-axis to always show (100%)
+        fig.update_yaxes(range=[0, 100])
+
+        # Move legend 
+        fig.update_layout(legend=dict(
+                #orientation="h",
+                yanchor="bottom",
+                y=1.05,
+                xanchor="left",
+                x=0.01
+                ))
+        return fig
+    fig = get_figure('area1', [selected_country] + selected_peer + selected_region, selected_start_year, selected_end_year, area1_indicators, build_figure)
 
     # Display graph
     st.plotly_chart(fig, use_container_width=True)
@@ -412,29 +439,33 @@ with col3:
     # Subheader for poverty share
     st.subheader("Share of population that lives with less than 6$ per person a day")
     # Get data for the poverty share
-    chart4_data = get_filtered_data(selected_country, selected_peer, selected_region, selected_start_year, selected_end_year, ['Poverty Share'])
+    chart4_indicators = CHART_INDICATORS['chart4']
+    chart4_data = get_filtered_data(selected_country, selected_peer, selected_region, selected_start_year, selected_end_year, chart4_indicators)
     
     ### Group data by year
     chart4_data = chart4_data.groupby([chart4_data.Indicator],group_keys=False,sort=False).apply(pd.DataFrame.sort_values,'Year')
     
-    # Configure plot
-    fig = px.line(chart4_data,
-                    x="Year", 
-                    y="Value",   
-                    color='Indicator',
-                    line_group='Country',  # Group lines by Country
-                    labels={'Value': 'Indicator Value'},# Update y-axis label
-                    hover_name="Country"
-                    )
-
-    # Move legend 
-    fig.update_layout(legend=dict(
-       # orientation="h",
-        yanchor="bottom",
-        y=1.05,
-        xanchor="left",
-        x=0.01
-        ))
+    # Configure plot (only built again when the selection or the data changed)
+    def build_figure():
+        fig = px.line(chart4_data,
+                        x="Year", 
+                        y="Value",   
+                        color='Indicator',
+                        line_group='Country',  # Group lines by Country
+                        labels={'Value': 'Indicator Value'},# Update y-axis label
+                        hover_name="Country"
+                        )
+
+        # Move legend 
+        fig.update_layout(legend=dict(
+           # orientation="h",
+            yanchor="bottom",
+            y=1.05,
+            xanchor="left",
+            x=0.01
+            ))
+        return fig
+    fig = get_figure('chart4', [selected_country] + selected_peer + selected_region, selected_start_year, selected_end_year, chart4_indicators, build_figure)
     
     # Display graph
     st.plotly_chart(fig, use_container_width=True)
@@ -2,6 +2,11 @@ import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
 import plotly.express as px
+from api_functions.data_export import ExportCache
+from api_functions.data_service import DataService
+from api_functions.download_section import show_download
+from api_functions.data_store import load_dataset
+from api_functions.figure_cache import FigureCache
 
 # Git checkout
 # Use full screen 
@@ -10,14 +15,30 @@ st.set_page_config(layout="wide")
 
 #---------------------------------- LOAD DATA AND PARAMETERS ---------------------------------#
 
-# Create import function with cache (cache so data is only loaded once)
-@st.cache_data
-def load_data(path):
-    df = pd.read_excel(path, engine='openpyxl')
-    return df
+# Data service shared by all sessions (data is only loaded once per server process and again 
+# when the file changes, sessions get views of the same data instead of copies)
+@st.cache_resource
+def get_data_service(path):
+    return DataService(path, load_dataset)
 
-# Load data 
-df_prod = load_data("data/production_data.xlsx")
+# Load data (load_dataset returns the years as integers)
+data_service = get_data_service("data/production_data.parquet")
+df_prod = data_service.get_data()
+df_index = data_service.get_index()
+
+# Figure cache shared by all sessions (see get_figure)
+@st.cache_resource
+def get_figure_cache():
+    return FigureCache()
+
+figure_cache = get_figure_cache()
+
+# Export cache shared by all sessions (see show_download)
+@st.cache_resource
+def get_export_cache():
+    return ExportCache()
+
+export_cache = get_export_cache()
 
 # Get a country, region and indicator list
 df_countries = df_prod['Country'].unique().tolist()
@@ -26,9 +47,18 @@ df_regions = df_prod['Region'].unique().tolist()
 df_subregion = df_prod['Sub-region'].unique().tolist()
 df_sub_region = df_regions + df_subregion
 
-# Turn years into int (str necessary first because Streamlit)
-df_prod['Year'] = df_prod['Year'].astype(str)
-df_prod['Year'] = df_prod['Year'].astype(int)
+# Indicators of the charts (the year slider covers the years with data for the indicators
+# of the page)
+CHART_INDICATORS = {
+    'chart1': ['GDP per capita'],
+    'chart2': ['GDP'],
+    'chart3': ['Total population'],
+    'chart4': ['Capital stock (in bil. 2011US$)'],
+    'chart5': ['Population Growth Rate',
+               'GDP Growth',
+               'Growth rate in total capital (%)'],
+}
+PAGE_INDICATORS = list(dict.fromkeys(indicator for indicators in CHART_INDICATORS.values() for indicator in indicators))
 
 # Define start and end year 
 df_years = df_prod['Year'].unique().tolist()
@@ -43,54 +73,43 @@ def get_filtered_data(country_selec, start_year_selec, end_year_selec, indicator
 
     """
     Function takes the user selection of the dashboard as an input and retrieves the
-    corresponding data from the dataset. The output is a filtered dataframe. 
+    corresponding data from the dataset (through the index of the dataset). The output is a 
+    filtered dataframe with one row for every year, indicator and country. 
 
     """
 
-    # Turn country selection into list if not list 
-    if isinstance(country_selec, str):
-        country_selec = [country_selec]
-
-    # Create a dataframe with all years and indicators first
-    ## This is necessary to add the missing years with "None" values
-    df_empty = pd.DataFrame([(year, indicator, country) 
-                            for year in range(start_year_selec, end_year_selec+1)
-                            for indicator in indicator_selec
-                            for country in country_selec],
-                            columns=['Year', 'Indicator', 'Country'])
-
-    
-    # Retrieve the selected data from df
-    df_fltr = df_prod[(df_prod['Country'].isin(country_selec)) & 
-                       (df_prod['Year'] >= start_year_selec) & 
-                       (df_prod['Indicator'].isin(indicator_selec)) &
-                       (df_prod['Year'] <= end_year_selec)]
-    
-    ## Merge 
-    df_merged = pd.merge(df_empty, df_fltr, on=['Year', 'Indicator', 'Country'], how='left')
+    return df_index.get_filtered_data(country_selec, start_year_selec, end_year_selec, indicator_selec)
 
-    ## Fill other columns 
-    df_merged['Indicator Code'] = df_merged.groupby('Indicator')['Indicator Code'].apply(lambda x: x.fillna(method='ffill').fillna(method='bfill'))
+# Figure Selection 
+def get_figure(chart_id, country_selec, start_year_selec, end_year_selec, indicator_selec, build_figure):
 
-    for col in ['Country Code', 'Region', 'Sub-region', 'Income Group', 'Least Developed Countries (LDC)', 'Land Locked Developing Countries (LLDC)', 'Small Island Developing States (SIDS)']:
-        df_merged[col] = df_merged.groupby('Country')[col].apply(lambda x: x.fillna(method='ffill').fillna(method='bfill'))
+    """
+    Function takes a chart, the user selection it shows and a function that builds the figure
+    of the chart, and returns the figure from the figure cache. The figure is only built again 
+    if the selection of the chart or the data changed since it was last built.
 
-    # Turn year column into datetime format
+    """
 
-    return df_merged
+    return figure_cache.get_figure(chart_id, country_selec, start_year_selec, end_year_selec, indicator_selec, 
+                                   data_service.version, build_figure)
 
 # Year Selection 
-def get_years(country_input): 
+def get_years(country_input, indicator_input=None): 
 
     """
-    Takes a country as an input and retrieves the corresponding minimum and maximum year
-    available. This can be used to adjust the year slider. 
+    Takes the selected countries (and the indicators shown) as an input and retrieves the 
+    minimum and maximum year with data for any of them (from the year coverage of the index), 
+    or the years of the whole dataset if the selection has no data. This can be used to adjust 
+    the year slider. 
 
     """
-    start_year_country = int(df_prod[df_prod['Country'] == country_input]['Year'].min())
-    end_year_country = int(df_prod[df_prod['Country'] == country_input]['Year'].max())
 
-    return start_year_country, end_year_country
+    first_year, last_year = df_index.get_year_range(country_input, indicator_input)
+    if first_year is None:
+        first_year, last_year = df_index.year_range
+
+    # The slider needs two different years
+    return first_year, max(last_year, first_year + 1)
 
 #---------------------------------------- SIDEBAR ---------------------------------
 
@@ -128,7 +147,7 @@ selected_peer = st.sidebar.multiselect(
 # START AND END YEAR SLIDER 
 
 # # Update based on data availability for chosen country 
-START_YEAR, END_YEAR = get_years(selected_country)
+START_YEAR, END_YEAR = get_years([selected_country] + selected_peer, PAGE_INDICATORS)
 
 # Widget
 selected_years = st.sidebar.slider(
@@ -140,19 +159,11 @@ selected_end_year = selected_years[1]
 
 # DOWNLOAD WIDGET 
 
-# Create a csv version of the dataframe (cache so it doesn't rerun)
-@st.cache_data
-def convert_df(df):
-    return df.to_csv().encode('utf-8')
-
-csv = convert_df(df_prod)
-
 # Add empty space to create some distance 
 st.sidebar.header("")
 
-st.sidebar.download_button(label="Click here to download data as csv",
-                   data=csv, 
-                   file_name='employment_data.xlsx')
+with st.sidebar:
+    show_download(data_service, export_cache, 'production_data', [selected_country] + selected_peer, selected_start_year, selected_end_year, df_indicators)
 
 st.sidebar.header("")
 
@@ -276,20 +287,24 @@ with col3:
     with tab1: 
 
         # Get data
-        chart1_data = get_filtered_data([selected_country] + selected_peer, selected_start_year, selected_end_year, ['GDP per capita'])
+        chart1_indicators = CHART_INDICATORS['chart1']
+        chart1_data = get_filtered_data([selected_country] + selected_peer, selected_start_year, selected_end_year, chart1_indicators)
 
         # ### Group data by year
         chart1_data = chart1_data.groupby([chart1_data.Indicator],group_keys=False,sort=False).apply(pd.DataFrame.sort_values,'Year')
 
-        # Configure plot
-        fig = px.line(chart1_data,
-                        x="Year", 
-                        y="Value",   
-                        color='Country',
-                        title='Chart 1 - GDP per capita',
-                        hover_name="Value",
-                        color_discrete_sequence=px.colors.qualitative.Plotly
-                        )
+        # Configure plot (only built again when the selection or the data changed)
+        def build_figure():
+            fig = px.line(chart1_data,
+                            x="Year", 
+                            y="Value",   
+                            color='Country',
+                            title='Chart 1 - GDP per capita',
+                            hover_name="Value",
+                            color_discrete_sequence=px.colors.qualitative.Plotly
+                            )
+            return fig
+        fig = get_figure('chart1', [selected_country] + selected_peer, selected_start_year, selected_end_year, chart1_indicators, build_figure)
 
         # # Move legend 
         # fig.update_layout(legend=dict(
@@ -309,20 +324,24 @@ with col3:
     with tab2: 
         
         # Get data
-        chart2_data = get_filtered_data([selected_country] + selected_peer, selected_start_year, selected_end_year, ['GDP'])
+        chart2_indicators = CHART_INDICATORS['chart2']
+        chart2_data = get_filtered_data([selected_country] + selected_peer, selected_start_year, selected_end_year, chart2_indicators)
 
         # ### Group data by year
         chart2_data = chart2_data.groupby([chart2_data.Indicator],group_keys=False,sort=False).apply(pd.DataFrame.sort_values,'Year')
 
-        # Configure plot
-        fig = px.line(chart2_data,
-                        x="Year", 
-                        y="Value",   
-                        color='Country',
-                        title='Chart 2 - GDP',
-                        hover_name="Value",
-                        color_discrete_sequence=px.colors.qualitative.Plotly
-                        )
+        # Configure plot (only built again when the selection or the data changed)
+        def build_figure():
+            fig = px.line(chart2_data,
+                            x="Year", 
+                            y="Value",   
+                            color='Country',
+                            title='Chart 2 - GDP',
+                            hover_name="Value",
+                            color_discrete_sequence=px.colors.qualitative.Plotly
+                            )
+            return fig
+        fig = get_figure('chart2', [selected_country] + selected_peer, selected_start_year, selected_end_year, chart2_indicators, build_figure)
 
         # # Move legend 
         # fig.update_layout(legend=dict(
@@ -404,29 +423,33 @@ col1, col2, col3 = st.columns([1,1,1])
 with col1: 
     
   # Get data
-    chart3_data = get_filtered_data([selected_country] + selected_peer, selected_start_year, selected_end_year, ['Total population'])
+    chart3_indicators = CHART_INDICATORS['chart3']
+    chart3_data = get_filtered_data([selected_country] + selected_peer, selected_start_year, selected_end_year, chart3_indicators)
 
     # ### Group data by year
     chart3_data = chart3_data.groupby([chart3_data.Indicator],group_keys=False,sort=False).apply(pd.DataFrame.sort_values,'Year')
 
-    # Configure plot
-    fig = px.line(chart3_data,
-                    x="Year", 
-                    y="Value",   
-                    color='Country',
-                    title='Chart 3 - Total Population',
-                    hover_name="Value",
-                    color_discrete_sequence=px.colors.qualitative.Plotly
-                    )
-
-    # Move legend 
-    fig.update_layout(legend=dict(
-        # orientation="h",
-        yanchor="bottom",
-        y=-0.5,
-        xanchor="left",
-        x=0.01
-        ))
+    # Configure plot (only built again when the selection or the data changed)
+    def build_figure():
+        fig = px.line(chart3_data,
+                        x="Year", 
+                        y="Value",   
+                        color='Country',
+                        title='Chart 3 - Total Population',
+                        hover_name="Value",
+                        color_discrete_sequence=px.colors.qualitative.Plotly
+                        )
+
+        # Move legend 
+        fig.update_layout(legend=dict(
+            # orientation="h",
+            yanchor="bottom",
+            y=-0.5,
+            xanchor="left",
+            x=0.01
+            ))
+        return fig
+    fig = get_figure('chart3', [selected_country] + selected_peer, selected_start_year, selected_end_year, chart3_indicators, build_figure)
 
     # Display graph
     st.plotly_chart(fig, use_container_width=True)
@@ -440,29 +463,33 @@ with col1:
 with col2: 
     
   # Get data
-    chart4_data = get_filtered_data([selected_country] + selected_peer, selected_start_year, selected_end_year, ['Capital stock (in bil. 2011US$)'])
+    chart4_indicators = CHART_INDICATORS['chart4']
+    chart4_data = get_filtered_data([selected_country] + selected_peer, selected_start_year, selected_end_year, chart4_indicators)
 
     # ### Group data by year
     chart4_data = chart4_data.groupby([chart4_data.Indicator],group_keys=False,sort=False).apply(pd.DataFrame.sort_values,'Year')
 
-    # Configure plot
-    fig = px.line(chart4_data,
-                    x="Year", 
-                    y="Value",   
-                    color='Country',
-                    title='Chart 4 - Capital stock (in bil. 2011US$)',
-                    hover_name="Value",
-                    color_discrete_sequence=px.colors.qualitative.Plotly
-                    )
-
-    # Move legend 
-    fig.update_layout(legend=dict(
-        # orientation="h",
-        yanchor="bottom",
-        y=-0.5,
-        xanchor="left",
-        x=0.01
-        ))
+    # Configure plot (only built again when the selection or the data changed)
+    def build_figure():
+        fig = px.line(chart4_data,
+                        x="Year", 
+                        y="Value",   
+                        color='Country',
+                        title='Chart 4 - Capital stock (in bil. 2011US$)',
+                        hover_name="Value",
+                        color_discrete_sequence=px.colors.qualitative.Plotly
+                        )
+
+        # Move legend 
+        fig.update_layout(legend=dict(
+            # orientation="h",
+            yanchor="bottom",
+            y=-0.5,
+            xanchor="left",
+            x=0.01
+            ))
+        return fig
+    fig = get_figure('chart4', [selected_country] + selected_peer, selected_start_year, selected_end_year, chart4_indicators, build_figure)
 
     # Display graph
     st.plotly_chart(fig, use_container_width=True)
@@ -475,29 +502,33 @@ with col2:
 with col3: 
     
   # Get data
-    chart5_data = get_filtered_data([selected_country] + selected_peer, selected_start_year, selected_end_year, ['Population Growth Rate', 'GDP Growth', 'Growth rate in total capital (%)'])
+    chart5_indicators = CHART_INDICATORS['chart5']
+    chart5_data = get_filtered_data([selected_country] + selected_peer, selected_start_year, selected_end_year, chart5_indicators)
 
     # ### Group data by year
     chart5_data = chart5_data.groupby([chart5_data.Indicator],group_keys=False,sort=False).apply(pd.DataFrame.sort_values,'Year')
 
-    # Configure plot
-    fig = px.line(chart5_data,
-                    x="Year", 
-                    y="Value",   
-                    color='Indicator',
-                    title="Chart 5 - Your Country's Annual Growth Rates [%]: GDP, Population & Capital",
-                    hover_name="Value",
-                    color_discrete_sequence=px.colors.qualitative.Plotly
-                    )
-
-    # Move legend 
-    fig.update_layout(legend=dict(
-        # orientation="h",
-        yanchor="bottom",
-        y=-0.5,
-        xanchor="left",
-        x=0.01
-        ))
+    # Configure plot (only built again when the selection or the data changed)
+    def build_figure():
+        fig = px.line(chart5_data,
+                        x="Year", 
+                        y="Value",   
+                        color='Indicator',
+                        title="Chart 5 - Your Country's Annual Growth Rates [%]: GDP, Population & Capital",
+                        hover_name="Value",
+                        color_discrete_sequence=px.colors.qualitative.Plotly
+                        )
+
+        # Move legend 
+        fig.update_layout(legend=dict(
+            # orientation="h",
+            yanchor="bottom",
+            y=-0.5,
+            xanchor="left",
+            x=0.01
+            ))
+        return fig
+    fig = get_figure('chart5', [selected_country] + selected_peer, selected_start_year, selected_end_year, chart5_indicators, build_figure)
 
     # Display graph
     st.plotly_chart(fig, use_container_width=True)
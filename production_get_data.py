@@ -1,6 +1,12 @@
 import pandas as pd 
 from api_functions.wb_data import get_wb_data
 from api_functions.imf_data import get_imf_data
+from api_functions.derived_data import add_derived_indicators
+from api_functions.aggregation import aggregate_classifications
+from api_functions.bulk_data import get_wb_bulk_data
+from api_functions.checkpoint import RefreshCheckpoint
+from api_functions.data_store import save_dataset
+from api_functions.delta_refresh import ObservationStore, refresh_indicators
 
 ########################### SPECIFY START AND END YEAR ###############################
 
@@ -10,6 +16,17 @@ from api_functions.imf_data import get_imf_data
 START_YEAR = 2000
 END_YEAR = 2017
 
+########################### SPECIFY THE OUTPUT ###############################
+
+# The dashboard reads the Parquet dataset, set to True to also export an Excel file
+EXPORT_EXCEL = False
+
+########################### SPECIFY THE AGGREGATION ###############################
+
+# Indicator code used to weight the group values of regions, income groups, ... 
+# (e.g. 'SP.POP.TOTL' for population-weighted means, None for simple means)
+AGGREGATION_WEIGHT = None
+
 ########################### SPECIFY THE WB INDICATORS NEEDED ##########################
 
 featureMap_indicators_wb={
@@ -28,65 +45,64 @@ featureMap_indicators_imf = {
 # Dataset used (currently only works for one dataset at a time)
 DATASET = "PGCS"
 
-########################### RETRIEVE THE DATA ##########################
+########################### SPECIFY THE DERIVED INDICATORS NEEDED #########################
 
-# World Bank 
-wb_data = get_wb_data(featureMap_indicators_wb, START_YEAR, END_YEAR)
+# Indicators calculated from the retrieved data (see api_functions/derived_data.py for the types)
 
-# IMF 
-imf_data = get_imf_data(featureMap_indicators_imf, START_YEAR, END_YEAR, DATASET)
+DERIVED_INDICATORS_WB = {}
+DERIVED_INDICATORS_WB['GDP Growth'] = {'type': 'growth', 'indicator': 'NY.GDP.MKTP.PP.KD'}
 
+########################### SPECIFY THE DATA SOURCE ###############################
 
-########################### MANUALLY CALCULATE GDP GROWTH ##########################
+# 'api' fetches the WB data from the service, 'bulk' reads the staged WDI CSV archive instead
+# (faster for many indicators); the IMF data is always fetched from the service
+DATA_BACKEND = 'api'
+WDI_BULK_PATH = 'data/bulk/WDI_CSV.zip'
 
-# Step 1: Create an empty list to store new rows
-new_rows = []
+########################### SPECIFY THE CHECKPOINT ###############################
 
-# Step 2-3: Iterate through each row in the dataframe
-for index, row in wb_data.iterrows():
+# Every request is stored in data/checkpoints/production as soon as it arrives. If the run fails,
+# start the script again: stored requests are read from disk and only the missing ones are sent
+checkpoint = RefreshCheckpoint('production')
 
-    if row['Indicator Code'] == 'NY.GDP.MKTP.PP.KD':  # Check if indicators column has the desired value
-        country = row['Country Code']
-        year = row['Year']
-        prev_year = year - 1
+########################### SPECIFY THE REFRESH ###############################
 
-        # Find the corresponding row from the previous year
-        prev_year_row = wb_data[(wb_data['Country Code'] == country) & 
-                                (wb_data['Year'] == prev_year) & 
-                                (wb_data['Indicator Code'] == 'NY.GDP.MKTP.PP.KD')]
+# Observations of earlier runs are kept in data/observations/production. Only the years after them
+# are fetched, plus the last REVISION_LOOKBACK years (the sources revise their latest values).
+# Delete the folder to fetch the full history again.
+REVISION_LOOKBACK = 2
+store = ObservationStore('production')
 
-        if not prev_year_row.empty:
-                prev_year_value = prev_year_row['Value'].values[0]
-                current_value = row['Value']
+########################### RETRIEVE THE DATA ##########################
+
+# Fetch function of the WB data source (called with the indicators and years to fetch)
+if DATA_BACKEND == 'bulk':
+    fetch_wb = lambda indicators, start, end: get_wb_bulk_data(WDI_BULK_PATH, indicators, start, end)
+else:
+    fetch_wb = lambda indicators, start, end: get_wb_data(indicators, start, end, checkpoint=checkpoint)
 
-                # Calculate the new value based on the formula
-                new_value =((current_value / prev_year_value) - 1) * 100
-                new_value = round(new_value, 2)
+# World Bank 
+wb_data = refresh_indicators(store, 'wb', featureMap_indicators_wb, START_YEAR, END_YEAR, fetch_wb, lookback=REVISION_LOOKBACK)
 
-                # Create a new row with the calculated value and all other columns from the current year's row
-                new_row = row.copy()  # Copy all columns
-                new_row['Year'] = year
-                new_row['Value'] = new_value
-                new_row['Indicator'] = 'GDP Growth'
-                new_row['Indicator Code'] = 'GDP Growth'
-                new_rows.append(new_row)
+# IMF 
+imf_data = refresh_indicators(store, 'imf', featureMap_indicators_imf, START_YEAR, END_YEAR,
+                              lambda indicators, start, end: get_imf_data(indicators, start, end, DATASET, checkpoint=checkpoint),
+                              lookback=REVISION_LOOKBACK)
 
-# Step 4-5: Append new rows to the original dataframe
-wb_data = wb_data.append(new_rows, ignore_index=True)
+
+########################### CALCULATE DERIVED INDICATORS ##########################
+
+# World Bank data 
+wb_data = add_derived_indicators(wb_data, DERIVED_INDICATORS_WB)
 
 # Concat dataframes and append country classifications
 df_prod = pd.concat([wb_data, imf_data])
 
 # Calculate region values for the indicators and attach to df
+df_prod = pd.concat([df_prod, aggregate_classifications(df_prod, weight_indicator=AGGREGATION_WEIGHT)])
 
-selected_cols  = ['Region', 'Income Group', 'Least Developed Countries (LDC)', 
-                  'Land Locked Developing Countries (LLDC)', 
-                  'Small Island Developing States (SIDS)']
-
-for ele in selected_cols: 
-    mean_values = df_prod.groupby([ele , 'Indicator', 'Year'])['Value'].mean().reset_index()
-    mean_values = mean_values[~(mean_values[ele] == 0)]
-    df_prod = pd.concat([df_prod, mean_values])
+# Save as Parquet dataset (and as Excel file if EXPORT_EXCEL)
+save_dataset(df_prod, 'data/production_data.parquet', excel_path='data/production_data.xlsx' if EXPORT_EXCEL else None)
 
-# Save as excel file
-df_prod.to_csv('data/production_data.csv', index=False)
\ No newline at end of file
+# The run is complete, the next run fetches fresh data
+checkpoint.clear()
@@ -1,8 +1,15 @@
 import streamlit as st 
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import plotly.express as px
 from plotly.subplots import make_subplots
+from api_functions.data_export import ExportCache
+from api_functions.data_service import DataService
+from api_functions.download_section import show_download
+from api_functions.data_store import load_dataset
+from api_functions.figure_cache import FigureCache
+from api_functions.profile_bundle import get_chart_data
 
 # Git checkout
 # Use full screen 
@@ -11,15 +18,39 @@ st.set_page_config(layout="wide")
 
 #---------------------------------- LOAD DATA AND PARAMETERS ---------------------------------#
 
-# Create import function with cache (cache so data is only loaded once)
-@st.cache_data
+# Create import function
 def load_data(path):
     df = pd.read_csv(path)
     return df
 
-# Load data 
-df_combined = load_data("data/pbfinance.csv")
-df_hdr = load_data("data/hdr.csv")
+# Data services shared by all sessions (data is only loaded once per server process and again 
+# when the file changes, sessions get views of the same data instead of copies)
+@st.cache_resource
+def get_data_service(path, _loader):
+    return DataService(path, _loader)
+
+# Load data (the merged dataset of publicfinance_get_data.py, years are already integers)
+data_service = get_data_service("data/pbfinance.parquet", load_dataset)
+df_combined = data_service.get_data()
+df_index = data_service.get_index()
+data_cube = data_service.get_cube()
+profile_bundle = data_service.get_profiles("data/pbfinance_profiles.arrow")
+
+# Figure cache shared by all sessions (see get_figure)
+@st.cache_resource
+def get_figure_cache():
+    return FigureCache()
+
+figure_cache = get_figure_cache()
+
+# Export cache shared by all sessions (see show_download)
+@st.cache_resource
+def get_export_cache():
+    return ExportCache()
+
+export_cache = get_export_cache()
+df_hdr = get_data_service("data/hdr.csv", load_data).get_data()
+hdi_ranks = df_hdr.drop_duplicates('Country').set_index('Country')['HDI rank (2021)']
 
 # Get a country, region and indicator list
 df_countries = df_combined['Country'].unique().tolist()
@@ -28,87 +59,187 @@ df_regions = df_combined['Region'].unique().tolist()
 df_subregion = df_combined['Sub-region'].unique().tolist()
 df_sub_region = df_regions + df_subregion
 
-# Turn years into int (str necessary first because Streamlit)
-df_combined = df_combined.dropna(subset=['Year'])
-df_combined['Year'] = df_combined['Year'].astype(str)
-df_combined['Year'] = df_combined['Year'].astype(float).astype(int)
+# Indicators of the charts (the year slider covers the years with data for the indicators
+# of the page)
+CHART_INDICATORS = {
+    'chart1': ['Population'],
+    'chart2': ['Population Growth Rate'],
+    'chart3': ['GDP per capita',
+               'GNI per capita'],
+    'chart4': ['GDP, PPP (constant 2017 international $)'],
+    'chart5': ['Fiscal, General Government, Revenue, 2001 Manual, Domestic Currency',
+               'Fiscal, General Government, Revenue, Tax, 2001 Manual, Domestic Currency'],
+    'chart6': ['Fiscal, General Government, Expense, 2001 Manual, Domestic Currency'],
+    'chart7': ['Prices, Consumer Price Index, All items, Index'],
+    'chart8': ['Labour force participation rate',
+               'Unemployment rate'],
+    'chart9': ['Debt to GDP Ratio'],
+    'chart10': ['Exports of Goods and Services, Nominal, Domestic Currency',
+                'Imports of Goods and Services, Nominal, Domestic Currency'],
+    'chart11': ['Gini index'],
+}
+PAGE_INDICATORS = list(dict.fromkeys(indicator for indicators in CHART_INDICATORS.values() for indicator in indicators))
 
 #------------------------------ Functions  ------------------------------------#
 
 
 # Data Selection 
-def get_filtered_data(df,country_selec, start_year_selec, end_year_selec, indicator_selec):
+def get_filtered_data(country_selec, start_year_selec, end_year_selec, indicator_selec):
 
     """
     Function takes the user selection of the dashboard as an input and retrieves the
-    corresponding data from the dataset. The output is a filtered dataframe. 
+    corresponding data from the dataset (through the index of the dataset). The output is a 
+    filtered dataframe with one row for every year, indicator and country. 
 
     """
 
-    # Turn country selection into list if not list 
-    if isinstance(country_selec, str):
-        country_selec = [country_selec]
-
-    # Create a dataframe with all years and indicators first
-    ## This is necessary to add the missing years with "None" values
-    df_empty = pd.DataFrame([(year, indicator, country) 
-                            for year in range(start_year_selec, end_year_selec+1)
-                            for indicator in indicator_selec
-                            for country in country_selec],
-                            columns=['Year', 'Indicator', 'Country'])
-
-    
-    # Retrieve the selected data from df
-    df_fltr = df[(df['Country'].isin(country_selec)) & 
-                       (df['Year'] >= start_year_selec) & 
-                       (df['Indicator'].isin(indicator_selec)) &
-                       (df['Year'] <= end_year_selec)]
-    
-    ## Merge 
-    df_merged = pd.merge(df_empty, df_fltr, on=['Year', 'Indicator', 'Country'], how='left')
+    return df_index.get_filtered_data(country_selec, start_year_selec, end_year_selec, indicator_selec)
 
-    ## Fill other columns 
-    df_merged['Indicator Code'] = df_merged.groupby('Indicator')['Indicator Code'].apply(lambda x: x.fillna(method='ffill').fillna(method='bfill'))
+# Figure Selection 
+def get_figure(chart_id, country_selec, start_year_selec, end_year_selec, indicator_selec, build_figure):
 
-    for col in ['Country Code', 'Region', 'Sub-region', 'Income Group', 'Least Developed Countries (LDC)', 'Land Locked Developing Countries (LLDC)', 'Small Island Developing States (SIDS)']:
-        df_merged[col] = df_merged.groupby('Country')[col].apply(lambda x: x.fillna(method='ffill').fillna(method='bfill'))
+    """
+    Function takes a chart, the user selection it shows and a function that builds the figure
+    of the chart, and returns the figure from the figure cache. The figure is only built again 
+    if the selection of the chart or the data changed since it was last built.
 
-    # Turn year column into datetime format
+    """
 
-    return df_merged
+    return figure_cache.get_figure(chart_id, country_selec, start_year_selec, end_year_selec, indicator_selec, 
+                                   data_service.version, build_figure)
 
 # Year Selection 
-def get_years(country_input,df): 
+def get_years(country_input, indicator_input=None): 
 
     """
-    Takes a country as an input and retrieves the corresponding minimum and maximum year
-    available. This can be used to adjust the year slider. 
+    Takes the selected countries (and the indicators shown) as an input and retrieves the 
+    minimum and maximum year with data for any of them (from the year coverage of the index), 
+    or the years of the whole dataset if the selection has no data. This can be used to adjust 
+    the year slider. 
 
     """
-    if country_input == None:
+    if country_input[0] == None:
         return 2000, 2022
-    else:
-        start_year_country = int(df[df['Country'] == country_input]['Year'].min())
-        end_year_country = int(df[df['Country'] == country_input]['Year'].max())
-        return start_year_country, end_year_country
-    
-@st.cache_data
-def convert_df(df):
-    return df.to_csv().encode('utf-8')
-df_csv = convert_df(df_combined)
+    first_year, last_year = df_index.get_year_range(country_input, indicator_input)
+    if first_year is None:
+        first_year, last_year = df_index.year_range
 
-# To get HDR and INCOME stats fo countries
-def get_peerstats(country_list, end_year):
+    # The slider needs two different years
+    return first_year, max(last_year, first_year + 1)
+    
+# To get HDR and INCOME stats fo countries (looked up in the country table of the index and the HDI ranks)
+def get_peerstats(country_list):
     
     placeholder = {}
     for country in country_list:
-        df1 = df_combined[(df_combined.Country == country) & (df_combined.Year == end_year)]
         placeholder[country] = {}            
-        placeholder[country]['Income Group'] = df1['Income Group'].unique()[0]
-        df1 = df_hdr[df_hdr.Country == country]
-        placeholder[country]['HDI rank (2021)'] = df1['HDI rank (2021)'].values[0]
+        placeholder[country]['Income Group'] = df_index.country_dim['Income Group'].get(country)
+        placeholder[country]['HDI rank (2021)'] = hdi_ranks.get(country)
     return placeholder
 
+# Average Selection
+def get_average_profile(average_selec, country_selec, peer_selec, start_year_selec, end_year_selec):
+
+    """
+    Function takes the chosen average (of the peer countries, or of the region or income group
+    of the country) and returns it for all indicators in the layout of the profiles, as one 
+    more country of the charts named after the average (computed on the data cube of the 
+    dataset). The output is None if there is no average to show.
+
+    """
+
+    indicators = data_cube.indicators
+    if average_selec == 'Peer countries':
+        if not peer_selec:
+            return None
+        label = 'Peer average'
+        means = data_cube.get_peer_mean(peer_selec, start_year_selec, end_year_selec, indicators)
+    else:
+        group = df_index.country_dim[average_selec].get(country_selec)
+        labels, group_means = data_cube.get_group_means(average_selec, start_year_selec, end_year_selec, indicators)
+        if group not in labels:
+            return None
+        label = f"{group} average"
+        means = group_means[labels.index(group)]
+
+    # Same layout as the profiles (the average is shown after the selected countries)
+    df = data_cube.to_frame(means[np.newaxis], [label], start_year_selec, indicators)
+    return df.assign(Value=df['Value'].round(2), **{'_Country Position': len(peer_selec) + 1})
+
+# Explorer Section
+@st.fragment
+def show_explorer(country_selec, start_year_selec, end_year_selec):
+
+    """
+    Function shows the Explorer mode for the countries and years selected in the sidebar.
+    It runs as a fragment: changing the indicators of the plot only reruns this function, 
+    not the whole page.
+
+    """
+
+    st.header(" This is your Playgroud ")
+    Indicators = list(df_combined.Indicator.unique())
+
+    selected_indicators = st.multiselect("Choose the labels for your plot",
+                                         options= Indicators,
+                                         key='explorer_indicators'
+                                         )
+    # title_txt = st.text_area(
+    # "Give title to your Graph",
+    # "Default",
+    # )
+    count_of_indicators = len(selected_indicators)
+    filtered_data = get_filtered_data(country_selec, start_year_selec, end_year_selec, 
+                            selected_indicators)
+
+    filtered_data = filtered_data.groupby(['Indicator'],group_keys=False,sort=False).apply(pd.DataFrame.sort_values,'Year')
+    
+    # Configure plot (only built again when the selection or the data changed)
+    def build_figure():
+        plots_holder = []
+        for i in range(count_of_indicators):
+            plots_holder.append(px.line(filtered_data[filtered_data.Indicator == selected_indicators[i]],
+                            x="Year", 
+                            y="Value",
+                            line_group='Country',
+                            color='Indicator',
+                            hover_name="Value",
+                            color_discrete_sequence=px.colors.qualitative.Plotly
+       
+                            ))
+        
+        if count_of_indicators ==2:
+            fig = make_subplots(specs=[[{"secondary_y": True}]])  
+            plots_holder[1].update_traces(yaxis="y2")
+        else:
+            fig = make_subplots()  
+
+        fig_data = ()
+        for i in plots_holder:
+            fig_data = fig_data + i.data
+        fig.add_traces(fig_data)
+
+        fig.update_layout(legend=dict(
+                # orientation="h",
+                yanchor="bottom",
+                y=-0.5,
+                xanchor="left",
+                x=0.01
+                ))
+        fig.layout.xaxis.title="Year"
+        fig.layout.yaxis.title="Value"
+
+        if count_of_indicators == 2:
+            fig.update_yaxes(title_text="<b>{}</b>".format(selected_indicators[0]), secondary_y=False)
+            fig.update_yaxes(title_text="<b>{}</b> value".format(selected_indicators[1]), secondary_y=True)
+
+        fig.for_each_trace(lambda t: t.update(line=dict(color=t.marker.color)))
+        return fig
+    fig = get_figure('explorer', country_selec, start_year_selec, end_year_selec, selected_indicators, build_figure)
+
+            
+    st.plotly_chart(fig, use_container_width=True)
+
 #---------------------------------------- SIDEBAR ---------------------------------
 with st.sidebar:
     # upload and example doc
@@ -137,7 +268,13 @@ with st.sidebar:
         df_countries
         )
     
-    START_YEAR, END_YEAR = get_years(selected_country, df_combined)
+    # Indicators of the page: all charts of the Guided mode, the plot of the Explorer mode
+    if choice == 'Guided':
+        page_indicators = PAGE_INDICATORS
+    else:
+        page_indicators = st.session_state.get('explorer_indicators') or df_indicators
+
+    START_YEAR, END_YEAR = get_years([selected_country] + selected_peer, page_indicators)
     if selected_country != None:
         selected_years = st.sidebar.slider(
             "Select the range",
@@ -150,11 +287,15 @@ with st.sidebar:
         selected_end_year = 2022
 
     if selected_country != None:
-        check_competitors = get_peerstats(selected_peer+[selected_country],END_YEAR)
+        check_competitors = get_peerstats(selected_peer+[selected_country])
 
-    st.sidebar.download_button(label="Click here to download data as csv",
-                        data=df_csv, 
-                        file_name='data.csv')
+    # AVERAGE INPUT WIDGET (shown as one more country in the charts of the guided mode)
+    selected_average = st.sidebar.selectbox(
+        "Compare with the average of",
+        ('None', 'Peer countries', 'Region', 'Income Group')
+        )
+
+    show_download(data_service, export_cache, 'data', [selected_country] + selected_peer, selected_start_year, selected_end_year, df_indicators, csv_path="data/pbfinance.csv")
     
     st.sidebar.header("")
 
@@ -312,6 +453,17 @@ if choice == 'Guided':
     # if len(selected_peer) == 0:
     #     st.warning("Please Select atleast 1 peer country for better analysis")
     # else:
+        # Profiles of the selected countries with the data of all charts (one lookup per country)
+        df_profiles = profile_bundle.get_profiles([selected_country] + selected_peer, selected_start_year, selected_end_year)
+
+        # Add the chosen average to the profiles (the charts are cached per countries shown)
+        chart_countries = [selected_country] + selected_peer
+        if selected_average != 'None':
+            df_average = get_average_profile(selected_average, selected_country, selected_peer, selected_start_year, selected_end_year)
+            if df_average is not None:
+                df_profiles = pd.concat([df_profiles, df_average], ignore_index=True)
+                chart_countries = chart_countries + [df_average['Country'].iloc[0]]
+
         ############ ROW 1 ###################################################################33
         st.subheader("Population")
         
@@ -324,29 +476,30 @@ if choice == 'Guided':
                 
         col1, col2, col3 = st.columns([1,0.02,1])
         with col1:
-            chart1_data = get_filtered_data(df_combined,[selected_country] + selected_peer, selected_start_year, selected_end_year, 
-                                        ['Population'])
-            
-            chart1_data = chart1_data.groupby(['Indicator'],group_keys=False,sort=False).apply(pd.DataFrame.sort_values,'Year')
-
-            # Configure plot
-            fig = px.line(chart1_data,
-                            x="Year", 
-                            y="Value",   
-                            color='Country',
-                            title='Chart 1 - Population',
-                            hover_name="Value",
-                            color_discrete_sequence=px.colors.qualitative.Plotly
-                            )
+            chart1_indicators = CHART_INDICATORS['chart1']
+            chart1_data = get_chart_data(df_profiles, chart1_indicators)
+
+            # Configure plot (only built again when the selection or the data changed)
+            def build_figure():
+                fig = px.line(chart1_data,
+                                x="Year", 
+                                y="Value",   
+                                color='Country',
+                                title='Chart 1 - Population',
+                                hover_name="Value",
+                                color_discrete_sequence=px.colors.qualitative.Plotly
+                                )
 
-            # Move legend 
-            fig.update_layout(legend=dict(
-                # orientation="h",
-                yanchor="bottom",
-                y=-0.5,
-                xanchor="left",
-                x=0.01
-                ))
+                # Move legend 
+                fig.update_layout(legend=dict(
+                    # orientation="h",
+                    yanchor="bottom",
+                    y=-0.5,
+                    xanchor="left",
+                    x=0.01
+                    ))
+                return fig
+            fig = get_figure('chart1', chart_countries, selected_start_year, selected_end_year, chart1_indicators, build_figure)
 
             # Display graph
             st.plotly_chart(fig, use_container_width=True)
@@ -354,28 +507,30 @@ if choice == 'Guided':
         with col3: 
             
         # Get data
-            chart2_data = get_filtered_data(df_combined,[selected_country] + selected_peer, selected_start_year, selected_end_year, 
-                                    ['Population Growth Rate'])
-            chart2_data = chart2_data.groupby(['Indicator'],group_keys=False,sort=False).apply(pd.DataFrame.sort_values,'Year')
-
-                # Configure plot
-            fig = px.line(chart2_data,
-                            x="Year", 
-                            y="Value",   
-                            color='Country',
-                            title='Chart 2 - Population Growth Rate',
-                            hover_name="Value",
-                            color_discrete_sequence=px.colors.qualitative.Plotly
-                            )
+            chart2_indicators = CHART_INDICATORS['chart2']
+            chart2_data = get_chart_data(df_profiles, chart2_indicators)
+
+            # Configure plot (only built again when the selection or the data changed)
+            def build_figure():
+                fig = px.line(chart2_data,
+                                x="Year", 
+                                y="Value",   
+                                color='Country',
+                                title='Chart 2 - Population Growth Rate',
+                                hover_name="Value",
+                                color_discrete_sequence=px.colors.qualitative.Plotly
+                                )
 
-                # Move legend 
-            fig.update_layout(legend=dict(
-                # orientation="h",
-                yanchor="bottom",
-                y=-0.5,
-                xanchor="left",
-                x=0.01
-                ))
+                    # Move legend 
+                fig.update_layout(legend=dict(
+                    # orientation="h",
+                    yanchor="bottom",
+                    y=-0.5,
+                    xanchor="left",
+                    x=0.01
+                    ))
+                return fig
+            fig = get_figure('chart2', chart_countries, selected_start_year, selected_end_year, chart2_indicators, build_figure)
                 
             st.plotly_chart(fig, use_container_width=True)
 
@@ -395,49 +550,51 @@ if choice == 'Guided':
 
         col1, col2, col3 = st.columns([1,0.02,1])
         with col1:
-            chart3_data = get_filtered_data(df_combined,[selected_country] + selected_peer, selected_start_year, selected_end_year, 
-                                        ['GDP per capita','GNI per capita'])
-            chart3_data = chart3_data.groupby(['Indicator'],group_keys=False,sort=False).apply(pd.DataFrame.sort_values,'Year')
-
-            # Configure plot
-            fig = make_subplots()
-            subfig1  =  px.line(chart3_data[chart3_data.Indicator == 'GDP per capita'],
-                        x="Year", 
-                        y="Value",
-                        line_group='Country',
-                        color='Indicator',
-                        title='Chart 3 - GDP and Inequality',
-                        hover_name="Value",
-                        color_discrete_sequence=px.colors.qualitative.Plotly
-                        )
+            chart3_indicators = CHART_INDICATORS['chart3']
+            chart3_data = get_chart_data(df_profiles, chart3_indicators)
+
+            # Configure plot (only built again when the selection or the data changed)
+            def build_figure():
+                fig = make_subplots()
+                subfig1  =  px.line(chart3_data[chart3_data.Indicator == 'GDP per capita'],
+                            x="Year", 
+                            y="Value",
+                            line_group='Country',
+                            color='Indicator',
+                            title='Chart 3 - GDP and Inequality',
+                            hover_name="Value",
+                            color_discrete_sequence=px.colors.qualitative.Plotly
+                            )
                         
             
-            subfig2 =   px.line(chart3_data[chart3_data.Indicator == 'GNI per capita'],
-                        x="Year", 
-                        y="Value",
-                        line_group='Country',
-                        color='Indicator',
-                        hover_name="Value",
-                        color_discrete_sequence=px.colors.qualitative.Plotly
-                        )
-            # subfig2.update_traces(yaxis="y2")
-
-            fig.add_traces(subfig1.data + subfig2.data)
-
-            fig.update_layout(legend=dict(
-                    # orientation="h",
-                    yanchor="bottom",
-                    y=-0.5,
-                    xanchor="left",
-                    x=0.01
-                    ),
-                    title_text = 'Chart 3 - GDP & GNI per capita')
-            fig.layout.xaxis.title="Year"
-            fig.layout.yaxis.title="Value"
-
-            # fig.update_yaxes(title_text="<b>GDP</b> Indicator Value", secondary_y=False)
-            # fig.update_yaxes(title_text="<b>GINI Index</b> value", secondary_y=True)
-            fig.for_each_trace(lambda t: t.update(line=dict(color=t.marker.color)))
+                subfig2 =   px.line(chart3_data[chart3_data.Indicator == 'GNI per capita'],
+                            x="Year", 
+                            y="Value",
+                            line_group='Country',
+                            color='Indicator',
+                            hover_name="Value",
+                            color_discrete_sequence=px.colors.qualitative.Plotly
+                            )
+                # subfig2.update_traces(yaxis="y2")
+
+                fig.add_traces(subfig1.data + subfig2.data)
+
+                fig.update_layout(legend=dict(
+                        # orientation="h",
+                        yanchor="bottom",
+                        y=-0.5,
+                        xanchor="left",
+                        x=0.01
+                        ),
+                        title_text = 'Chart 3 - GDP & GNI per capita')
+                fig.layout.xaxis.title="Year"
+                fig.layout.yaxis.title="Value"
+
+                # fig.update_yaxes(title_text="<b>GDP</b> Indicator Value", secondary_y=False)
+                # fig.update_yaxes(title_text="<b>GINI Index</b> value", secondary_y=True)
+                fig.for_each_trace(lambda t: t.update(line=dict(color=t.marker.color)))
+                return fig
+            fig = get_figure('chart3', chart_countries, selected_start_year, selected_end_year, chart3_indicators, build_figure)
 
                 
             st.plotly_chart(fig, use_container_width=True)
@@ -445,28 +602,30 @@ if choice == 'Guided':
         with col3: 
             
         # Get data
-            chart4_data = get_filtered_data(df_combined,[selected_country] + selected_peer, selected_start_year, selected_end_year, 
-                                    ['GDP, PPP (constant 2017 international $)'])
-            chart4_data = chart4_data.groupby(['Indicator'],group_keys=False,sort=False).apply(pd.DataFrame.sort_values,'Year')
-
-            # Configure plot
-            fig = px.line(chart4_data,
-                            x="Year", 
-                            y="Value",   
-                            color='Country',
-                            title='Chart 4 - GDP, PPP (constant 2017 international $)',
-                            hover_name="Value",
-                            color_discrete_sequence=px.colors.qualitative.Plotly
-                            )
+            chart4_indicators = CHART_INDICATORS['chart4']
+            chart4_data = get_chart_data(df_profiles, chart4_indicators)
+
+            # Configure plot (only built again when the selection or the data changed)
+            def build_figure():
+                fig = px.line(chart4_data,
+                                x="Year", 
+                                y="Value",   
+                                color='Country',
+                                title='Chart 4 - GDP, PPP (constant 2017 international $)',
+                                hover_name="Value",
+                                color_discrete_sequence=px.colors.qualitative.Plotly
+                                )
 
-                # Move legend 
-            fig.update_layout(legend=dict(
-                # orientation="h",
-                yanchor="bottom",
-                y=-0.5,
-                xanchor="left",
-                x=0.01
-                ))
+                    # Move legend 
+                fig.update_layout(legend=dict(
+                    # orientation="h",
+                    yanchor="bottom",
+                    y=-0.5,
+                    xanchor="left",
+                    x=0.01
+                    ))
+                return fig
+            fig = get_figure('chart4', chart_countries, selected_start_year, selected_end_year, chart4_indicators, build_figure)
                 
             st.plotly_chart(fig, use_container_width=True)
 
@@ -490,52 +649,53 @@ if choice == 'Guided':
                         indicate a low capacity of the state to sustainably contribute to achieving 
                         the SDGs (Addis Ababa Action Agenda, Addis Tax Initiative Declarations).  </div>""", unsafe_allow_html=True
                                 )
-            chart5_data = get_filtered_data(df_combined,[selected_country] + selected_peer, selected_start_year, selected_end_year, 
-                                        ['Fiscal, General Government, Revenue, 2001 Manual, Domestic Currency',
-                                        'Fiscal, General Government, Revenue, Tax, 2001 Manual, Domestic Currency'])
+            chart5_indicators = CHART_INDICATORS['chart5']
+            chart5_data = get_chart_data(df_profiles, chart5_indicators)
             chart5_data.replace({'Fiscal, General Government, Revenue, 2001 Manual, Domestic Currency':'Revenue',
                                         'Fiscal, General Government, Revenue, Tax, 2001 Manual, Domestic Currency':'Tax Revenue',
                                         }, inplace= True)
-            chart5_data = chart5_data.groupby(['Indicator'],group_keys=False,sort=False).apply(pd.DataFrame.sort_values,'Year')
-
-            # Configure plot
-            fig = make_subplots()
-            subfig1  =  px.line(chart5_data[chart5_data.Indicator == 'Revenue'],
-                        x="Year", 
-                        y="Value",
-                        line_group='Country',
-                        color='Indicator',
-                        hover_name="Value",
-                        color_discrete_sequence=px.colors.qualitative.Plotly
-                        )
+
+            # Configure plot (only built again when the selection or the data changed)
+            def build_figure():
+                fig = make_subplots()
+                subfig1  =  px.line(chart5_data[chart5_data.Indicator == 'Revenue'],
+                            x="Year", 
+                            y="Value",
+                            line_group='Country',
+                            color='Indicator',
+                            hover_name="Value",
+                            color_discrete_sequence=px.colors.qualitative.Plotly
+                            )
                         
             
-            subfig2 =   px.line(chart5_data[chart5_data.Indicator == 'Tax Revenue'],
-                        x="Year", 
-                        y="Value",
-                        line_group='Country',
-                        color='Indicator',
-                        hover_name="Value",
-                        color_discrete_sequence=px.colors.qualitative.Plotly
-                        )
-            # subfig2.update_traces(yaxis="y2")
-
-            fig.add_traces(subfig1.data + subfig2.data)
-
-            fig.update_layout(legend=dict(
-                    # orientation="h",
-                    yanchor="bottom",
-                    y=-0.5,
-                    xanchor="left",
-                    x=0.01
-                    ),
-                    title_text = 'Chart 5 - Revenue and Tax Revenue ')
-            fig.layout.xaxis.title="Year"
-            fig.layout.yaxis.title="Value"
-
-            # fig.update_yaxes(title_text="<b>GDP</b> Indicator Value", secondary_y=False)
-            # fig.update_yaxes(title_text="<b>GINI Index</b> value", secondary_y=True)
-            fig.for_each_trace(lambda t: t.update(line=dict(color=t.marker.color)))
+                subfig2 =   px.line(chart5_data[chart5_data.Indicator == 'Tax Revenue'],
+                            x="Year", 
+                            y="Value",
+                            line_group='Country',
+                            color='Indicator',
+                            hover_name="Value",
+                            color_discrete_sequence=px.colors.qualitative.Plotly
+                            )
+                # subfig2.update_traces(yaxis="y2")
+
+                fig.add_traces(subfig1.data + subfig2.data)
+
+                fig.update_layout(legend=dict(
+                        # orientation="h",
+                        yanchor="bottom",
+                        y=-0.5,
+                        xanchor="left",
+                        x=0.01
+                        ),
+                        title_text = 'Chart 5 - Revenue and Tax Revenue ')
+                fig.layout.xaxis.title="Year"
+                fig.layout.yaxis.title="Value"
+
+                # fig.update_yaxes(title_text="<b>GDP</b> Indicator Value", secondary_y=False)
+                # fig.update_yaxes(title_text="<b>GINI Index</b> value", secondary_y=True)
+                fig.for_each_trace(lambda t: t.update(line=dict(color=t.marker.color)))
+                return fig
+            fig = get_figure('chart5', chart_countries, selected_start_year, selected_end_year, chart5_indicators, build_figure)
 
                 
             st.plotly_chart(fig, use_container_width=True)
@@ -554,32 +714,34 @@ if choice == 'Guided':
 
                         """, unsafe_allow_html=True
                                 )
-            chart6_data = get_filtered_data(df_combined,[selected_country] + selected_peer, selected_start_year, selected_end_year, 
-                                    ['Fiscal, General Government, Expense, 2001 Manual, Domestic Currency'])
+            chart6_indicators = CHART_INDICATORS['chart6']
+            chart6_data = get_chart_data(df_profiles, chart6_indicators)
             chart6_data.replace({'Fiscal, General Government, Expense, 2001 Manual, Domestic Currency':'Expenditure'},
                             inplace= True)
-            chart6_data = chart6_data.groupby(['Indicator'],group_keys=False,sort=False).apply(pd.DataFrame.sort_values,'Year')
             st.write("")
             st.write("")
             st.write("")
-            # Configure plot
-            fig = px.line(chart6_data,
-                            x="Year", 
-                            y="Value",   
-                            color='Country',
-                            title='Chart 6 - Expenditure',
-                            hover_name="Value",
-                            color_discrete_sequence=px.colors.qualitative.Plotly
-                            )
+            # Configure plot (only built again when the selection or the data changed)
+            def build_figure():
+                fig = px.line(chart6_data,
+                                x="Year", 
+                                y="Value",   
+                                color='Country',
+                                title='Chart 6 - Expenditure',
+                                hover_name="Value",
+                                color_discrete_sequence=px.colors.qualitative.Plotly
+                                )
 
-                # Move legend 
-            fig.update_layout(legend=dict(
-                # orientation="h",
-                yanchor="bottom",
-                y=-0.5,
-                xanchor="left",
-                x=0.01
-                ))
+                    # Move legend 
+                fig.update_layout(legend=dict(
+                    # orientation="h",
+                    yanchor="bottom",
+                    y=-0.5,
+                    xanchor="left",
+                    x=0.01
+                    ))
+                return fig
+            fig = get_figure('chart6', chart_countries, selected_start_year, selected_end_year, chart6_indicators, build_figure)
                 
             st.plotly_chart(fig, use_container_width=True)
 
@@ -588,11 +750,10 @@ if choice == 'Guided':
 
         ############### ROW 4 ########################################################
 
-        chart7_data = get_filtered_data(df_combined,[selected_country] + selected_peer, selected_start_year, selected_end_year, 
-                            ['Prices, Consumer Price Index, All items, Index'])
+        chart7_indicators = CHART_INDICATORS['chart7']
+        chart7_data = get_chart_data(df_profiles, chart7_indicators)
         chart7_data.replace({'Prices, Consumer Price Index, All items, Index':'Consumer Price Index'},
                             inplace= True)
-        chart7_data = chart7_data.groupby(['Indicator'],group_keys=False,sort=False).apply(pd.DataFrame.sort_values,'Year')
         col1, col2, col3 = st.columns([1,0.02,1])
         with col1:
             st.subheader("Inflation")
@@ -610,24 +771,27 @@ if choice == 'Guided':
                         to underlying political, economic and financial dynamics and 
                         their consequences.  </div>""", unsafe_allow_html=True)
         with col3:
-                # Configure plot
-            fig = px.line(chart7_data,
-                            x="Year", 
-                            y="Value", 
-                            color='Country',
-                            title='Chart 7 - Consumer Price Index',
-                            hover_name="Value",
-                            color_discrete_sequence=px.colors.qualitative.Plotly
-                            )
+            # Configure plot (only built again when the selection or the data changed)
+            def build_figure():
+                fig = px.line(chart7_data,
+                                x="Year", 
+                                y="Value", 
+                                color='Country',
+                                title='Chart 7 - Consumer Price Index',
+                                hover_name="Value",
+                                color_discrete_sequence=px.colors.qualitative.Plotly
+                                )
 
-            # Move legend 
-            fig.update_layout(legend=dict(
-                # orientation="h",
-                yanchor="bottom",
-                y=-0.5,
-                xanchor="left",
-                x=0.01
-                ))
+                # Move legend 
+                fig.update_layout(legend=dict(
+                    # orientation="h",
+                    yanchor="bottom",
+                    y=-0.5,
+                    xanchor="left",
+                    x=0.01
+                    ))
+                return fig
+            fig = get_figure('chart7', chart_countries, selected_start_year, selected_end_year, chart7_indicators, build_figure)
 
             # Display graph
             st.plotly_chart(fig, use_container_width=True)
@@ -636,11 +800,10 @@ if choice == 'Guided':
 
         ############### ROW 5 ########################################################
 
-        chart8_data = get_filtered_data(df_combined,[selected_country] + selected_peer, selected_start_year, selected_end_year, 
-                            ['Labour force participation rate','Unemployment rate'])
+        chart8_indicators = CHART_INDICATORS['chart8']
+        chart8_data = get_chart_data(df_profiles, chart8_indicators)
         # chart7_data.replace({'Prices, Consumer Price Index, All items, Index':'Consumer Price Index'},
         #                     inplace= True)
-        chart8_data = chart8_data.groupby(['Indicator'],group_keys=False,sort=False).apply(pd.DataFrame.sort_values,'Year')
         col1, col2, col3 = st.columns([1,0.02,1])
         with col1:
             st.subheader("Unemployment")
@@ -654,44 +817,47 @@ if choice == 'Guided':
                         [Unemployment Dashboard](https://employment-dashboard.streamlit.app).</div>""", 
                         unsafe_allow_html=True)
         with col3:
-                # Configure plot
-            fig = make_subplots()
-            subfig1  =  px.line(chart8_data[chart8_data.Indicator == 'Labour force participation rate'],
-                        x="Year", 
-                        y="Value",
-                        line_group='Country',
-                        color='Indicator',
-                        hover_name="Value",
-                        color_discrete_sequence=px.colors.qualitative.Plotly
-                        )
+            # Configure plot (only built again when the selection or the data changed)
+            def build_figure():
+                fig = make_subplots()
+                subfig1  =  px.line(chart8_data[chart8_data.Indicator == 'Labour force participation rate'],
+                            x="Year", 
+                            y="Value",
+                            line_group='Country',
+                            color='Indicator',
+                            hover_name="Value",
+                            color_discrete_sequence=px.colors.qualitative.Plotly
+                            )
                         
             
-            subfig2 =   px.line(chart8_data[chart8_data.Indicator == 'Unemployment rate'],
-                        x="Year", 
-                        y="Value",
-                        line_group='Country',
-                        color='Indicator',
-                        hover_name="Value",
-                        color_discrete_sequence=px.colors.qualitative.Plotly
-                        )
-            # subfig2.update_traces(yaxis="y2")
-
-            fig.add_traces(subfig1.data + subfig2.data)
-
-            fig.update_layout(legend=dict(
-                    # orientation="h",
-                    yanchor="bottom",
-                    y=-0.5,
-                    xanchor="left",
-                    x=0.01
-                    ),
-                    title_text = 'Chart 8 - Unemployment')
-            fig.layout.xaxis.title="Year"
-            fig.layout.yaxis.title="Value"
-
-            # fig.update_yaxes(title_text="<b>GDP</b> Indicator Value", secondary_y=False)
-            # fig.update_yaxes(title_text="<b>GINI Index</b> value", secondary_y=True)
-            fig.for_each_trace(lambda t: t.update(line=dict(color=t.marker.color)))
+                subfig2 =   px.line(chart8_data[chart8_data.Indicator == 'Unemployment rate'],
+                            x="Year", 
+                            y="Value",
+                            line_group='Country',
+                            color='Indicator',
+                            hover_name="Value",
+                            color_discrete_sequence=px.colors.qualitative.Plotly
+                            )
+                # subfig2.update_traces(yaxis="y2")
+
+                fig.add_traces(subfig1.data + subfig2.data)
+
+                fig.update_layout(legend=dict(
+                        # orientation="h",
+                        yanchor="bottom",
+                        y=-0.5,
+                        xanchor="left",
+                        x=0.01
+                        ),
+                        title_text = 'Chart 8 - Unemployment')
+                fig.layout.xaxis.title="Year"
+                fig.layout.yaxis.title="Value"
+
+                # fig.update_yaxes(title_text="<b>GDP</b> Indicator Value", secondary_y=False)
+                # fig.update_yaxes(title_text="<b>GINI Index</b> value", secondary_y=True)
+                fig.for_each_trace(lambda t: t.update(line=dict(color=t.marker.color)))
+                return fig
+            fig = get_figure('chart8', chart_countries, selected_start_year, selected_end_year, chart8_indicators, build_figure)
 
                 
             st.plotly_chart(fig, use_container_width=True)
@@ -700,9 +866,8 @@ if choice == 'Guided':
 
         ############### ROW 6 ########################################################
 
-        chart9_data = get_filtered_data(df_combined,[selected_country] + selected_peer, selected_start_year, selected_end_year, 
-                            ['Debt to GDP Ratio'])
-        chart9_data = chart9_data.groupby(['Indicator'],group_keys=False,sort=False).apply(pd.DataFrame.sort_values,'Year')
+        chart9_indicators = CHART_INDICATORS['chart9']
+        chart9_data = get_chart_data(df_profiles, chart9_indicators)
         col1, col2, col3 = st.columns([1,0.02,1])
         with col1:
             st.subheader("Debt Rate")
@@ -715,24 +880,27 @@ if choice == 'Guided':
                         Details depend on several factors including financing 
                         conditions, type of debt, capacity to repay (e. g. DRM).</div>""", unsafe_allow_html=True)
         with col3:
-                # Configure plot
-            fig = px.line(chart9_data,
-                            x="Year", 
-                            y="Value", 
-                            color='Country',
-                            title='Chart 9 - Debt to GDP Ratio',
-                            hover_name="Value",
-                            color_discrete_sequence=px.colors.qualitative.Plotly
-                            )
+            # Configure plot (only built again when the selection or the data changed)
+            def build_figure():
+                fig = px.line(chart9_data,
+                                x="Year", 
+                                y="Value", 
+                                color='Country',
+                                title='Chart 9 - Debt to GDP Ratio',
+                                hover_name="Value",
+                                color_discrete_sequence=px.colors.qualitative.Plotly
+                                )
 
-            # Move legend 
-            fig.update_layout(legend=dict(
-                # orientation="h",
-                yanchor="bottom",
-                y=-0.5,
-                xanchor="left",
-                x=0.01
-                ))
+                # Move legend 
+                fig.update_layout(legend=dict(
+                    # orientation="h",
+                    yanchor="bottom",
+                    y=-0.5,
+                    xanchor="left",
+                    x=0.01
+                    ))
+                return fig
+            fig = get_figure('chart9', chart_countries, selected_start_year, selected_end_year, chart9_indicators, build_figure)
 
             # Display graph
             st.plotly_chart(fig, use_container_width=True)
@@ -741,52 +909,54 @@ if choice == 'Guided':
 
         ##################### Row 7 #########################################################
         st.subheader("More Indicators Plot")
-        chart10_data = get_filtered_data(df_combined,[selected_country] + selected_peer, selected_start_year, selected_end_year, 
-                            ['Exports of Goods and Services, Nominal, Domestic Currency',
-                            'Imports of Goods and Services, Nominal, Domestic Currency'])
+        chart10_indicators = CHART_INDICATORS['chart10']
+        chart10_data = get_chart_data(df_profiles, chart10_indicators)
         chart10_data.replace({'Exports of Goods and Services, Nominal, Domestic Currency':'Exports',
                             'Imports of Goods and Services, Nominal, Domestic Currency':'Imports'},
                             inplace= True)
-        chart10_data = chart10_data.groupby(['Indicator'],group_keys=False,sort=False).apply(pd.DataFrame.sort_values,'Year')
         col1, col2, col3 = st.columns([1,0.02,1])
         with col1:
-            fig = make_subplots()
-            subfig1  =  px.line(chart10_data[chart10_data.Indicator == 'Exports'],
-                        x="Year", 
-                        y="Value",
-                        line_group='Country',
-                        color='Indicator',
-                        hover_name="Value",
-                        color_discrete_sequence=px.colors.qualitative.Plotly
-                        )
+            # Configure plot (only built again when the selection or the data changed)
+            def build_figure():
+                fig = make_subplots()
+                subfig1  =  px.line(chart10_data[chart10_data.Indicator == 'Exports'],
+                            x="Year", 
+                            y="Value",
+                            line_group='Country',
+                            color='Indicator',
+                            hover_name="Value",
+                            color_discrete_sequence=px.colors.qualitative.Plotly
+                            )
                         
             
-            subfig2 =   px.line(chart10_data[chart10_data.Indicator == 'Imports'],
-                        x="Year", 
-                        y="Value",
-                        line_group='Country',
-                        color='Indicator',
-                        hover_name="Value",
-                        color_discrete_sequence=px.colors.qualitative.Plotly
-                        )
-            # subfig2.update_traces(yaxis="y2")
-
-            fig.add_traces(subfig1.data + subfig2.data)
-
-            fig.update_layout(legend=dict(
-                    # orientation="h",
-                    yanchor="bottom",
-                    y=-0.5,
-                    xanchor="left",
-                    x=0.01
-                    ),
-                    title_text = 'Chart 10 - Exports & Imports')
-            fig.layout.xaxis.title="Year"
-            fig.layout.yaxis.title="Value"
-
-            # fig.update_yaxes(title_text="<b>GDP</b> Indicator Value", secondary_y=False)
-            # fig.update_yaxes(title_text="<b>GINI Index</b> value", secondary_y=True)
-            fig.for_each_trace(lambda t: t.update(line=dict(color=t.marker.color)))
+                subfig2 =   px.line(chart10_data[chart10_data.Indicator == 'Imports'],
+                            x="Year", 
+                            y="Value",
+                            line_group='Country',
+                            color='Indicator',
+                            hover_name="Value",
+                            color_discrete_sequence=px.colors.qualitative.Plotly
+                            )
+                # subfig2.update_traces(yaxis="y2")
+
+                fig.add_traces(subfig1.data + subfig2.data)
+
+                fig.update_layout(legend=dict(
+                        # orientation="h",
+                        yanchor="bottom",
+                        y=-0.5,
+                        xanchor="left",
+                        x=0.01
+                        ),
+                        title_text = 'Chart 10 - Exports & Imports')
+                fig.layout.xaxis.title="Year"
+                fig.layout.yaxis.title="Value"
+
+                # fig.update_yaxes(title_text="<b>GDP</b> Indicator Value", secondary_y=False)
+                # fig.update_yaxes(title_text="<b>GINI Index</b> value", secondary_y=True)
+                fig.for_each_trace(lambda t: t.update(line=dict(color=t.marker.color)))
+                return fig
+            fig = get_figure('chart10', chart_countries, selected_start_year, selected_end_year, chart10_indicators, build_figure)
 
                 
             st.plotly_chart(fig, use_container_width=True)
@@ -794,27 +964,30 @@ if choice == 'Guided':
 
         with col3:
                 # Configure plot
-            chart11_data = get_filtered_data(df_combined,[selected_country] + selected_peer, selected_start_year, selected_end_year, 
-                        ['Gini index'])
-
-            chart11_data = chart11_data.groupby(['Indicator'],group_keys=False,sort=False).apply(pd.DataFrame.sort_values,'Year')    
-            fig = px.line(chart11_data,
-                            x="Year", 
-                            y="Value", 
-                            color='Country',
-                            title='Chart 11 - Gini index',
-                            hover_name="Value",
-                            color_discrete_sequence=px.colors.qualitative.Plotly
-                            )
+            chart11_indicators = CHART_INDICATORS['chart11']
+            chart11_data = get_chart_data(df_profiles, chart11_indicators)
+
+            # Configure plot (only built again when the selection or the data changed)
+            def build_figure():
+                fig = px.line(chart11_data,
+                                x="Year", 
+                                y="Value", 
+                                color='Country',
+                                title='Chart 11 - Gini index',
+                                hover_name="Value",
+                                color_discrete_sequence=px.colors.qualitative.Plotly
+                                )
 
-            # Move legend 
-            fig.update_layout(legend=dict(
-                # orientation="h",
-                yanchor="bottom",
-                y=-0.5,
-                xanchor="left",
-                x=0.01
-                ))
+                # Move legend 
+                fig.update_layout(legend=dict(
+                    # orientation="h",
+                    yanchor="bottom",
+                    y=-0.5,
+                    xanchor="left",
+                    x=0.01
+                    ))
+                return fig
+            fig = get_figure('chart11', chart_countries, selected_start_year, selected_end_year, chart11_indicators, build_figure)
 
             # Display graph
             st.plotly_chart(fig, use_container_width=True)
@@ -823,65 +996,8 @@ if choice == 'Guided':
 
     ####################### Explorer TAB ###########################3
 else:
+    show_explorer([selected_country] + selected_peer, selected_start_year, selected_end_year)
 
-    st.header(" This is your Playgroud ")
-    Indicators = list(df_combined.Indicator.unique())
-
-    selected_indicators = st.multiselect("Choose the labels for your plot",
-                                         options= Indicators
-                                         )
-    # title_txt = st.text_area(
-    # "Give title to your Graph",
-    # "Default",
-    # )
-    count_of_indicators = len(selected_indicators)
-    filtered_data = get_filtered_data(df_combined,[selected_country] + selected_peer, selected_start_year, selected_end_year, 
-                            selected_indicators)
-
-    filtered_data = filtered_data.groupby(['Indicator'],group_keys=False,sort=False).apply(pd.DataFrame.sort_values,'Year')
-    
-    plots_holder = []
-    for i in range(count_of_indicators):
-        plots_holder.append(px.line(filtered_data[filtered_data.Indicator == selected_indicators[i]],
-                        x="Year", 
-                        y="Value",
-                        line_group='Country',
-                        color='Indicator',
-                        hover_name="Value",
-                        color_discrete_sequence=px.colors.qualitative.Plotly
-       
-                        ))
-        
-    if count_of_indicators ==2:
-        fig = make_subplots(specs=[[{"secondary_y": True}]])  
-        plots_holder[1].update_traces(yaxis="y2")
-    else:
-        fig = make_subplots()  
-
-    fig_data = ()
-    for i in plots_holder:
-        fig_data = fig_data + i.data
-    fig.add_traces(fig_data)
-
-    fig.update_layout(legend=dict(
-            # orientation="h",
-            yanchor="bottom",
-            y=-0.5,
-            xanchor="left",
-            x=0.01
-            ))
-    fig.layout.xaxis.title="Year"
-    fig.layout.yaxis.title="Value"
-
-    if count_of_indicators == 2:
-        fig.update_yaxes(title_text="<b>{}</b>".format(selected_indicators[0]), secondary_y=False)
-        fig.update_yaxes(title_text="<b>{}</b> value".format(selected_indicators[1]), secondary_y=True)
-
-    fig.for_each_trace(lambda t: t.update(line=dict(color=t.marker.color)))
-
-            
-    st.plotly_chart(fig, use_container_width=True)
-        
 
     ############# ROW 8 ########################################################
     # 
@@ -1,13 +1,38 @@
+import os
 import pandas as pd 
 from api_functions.wb_data import get_wb_data
 from api_functions.ilo_data import get_ilo_data
 from api_functions.imf_data import get_imf_data_updated
+from api_functions.derived_data import add_derived_indicators
+from api_functions.aggregation import aggregate_classifications
+from api_functions.checkpoint import RefreshCheckpoint
+from api_functions.data_store import merge_datasets, save_dataset
+from api_functions.delta_refresh import ObservationStore, refresh_indicators
+from api_functions.profile_bundle import build_profile_bundle
 
 ########################### SPECIFY START AND END YEAR ###############################
 
 START_YEAR = 2000
 END_YEAR = 2023
 
+########################### SPECIFY THE SOURCES TO FETCH ###############################
+
+# Set to False (or DDPP_FETCH_SOURCES=0) to rebuild the dataset from the stored source files
+# (data/pbfinance_*.csv) without asking the WB, ILO and IMF services again, e.g. when deploying
+FETCH_SOURCES = os.environ.get('DDPP_FETCH_SOURCES', '1') != '0'
+
+########################### SPECIFY THE NUMBER OF PARALLEL REQUESTS ###############################
+
+# Number of indicators fetched at the same time and maximum open requests per data provider
+MAX_WORKERS = 8
+MAX_PER_HOST = 4
+
+########################### SPECIFY THE AGGREGATION ###############################
+
+# Indicator code used to weight the group values of regions, income groups, ... 
+# (e.g. 'SP.POP.TOTL' for population-weighted means, None for simple means)
+AGGREGATION_WEIGHT = None
+
 ########################### SPECIFY THE WB INDICATORS NEEDED ##########################
 
 featureMap_indicators={
@@ -19,6 +44,13 @@ featureMap_indicators={
     'SI.POV.GINI': 'Gini index (income)',
 }
 
+########################### SPECIFY THE DERIVED INDICATORS NEEDED #########################
+
+# Indicators calculated from the retrieved data (see api_functions/derived_data.py for the types)
+
+DERIVED_INDICATORS_WB = {}
+DERIVED_INDICATORS_WB['GDP Growth'] = {'type': 'growth', 'indicator': 'NY.GDP.MKTP.PP.KD'}
+
 ########################### SPECIFY THE ILO INDICATORS NEEDED ##########################
 
 # Initialize an empty dictionary to store indicators and their parameters
@@ -95,96 +127,80 @@ INDICATORS_IMF['Debt to GDP Ratio'] = {'datasetID':'HPDD','CL_FREQ':'A','CL_AREA
                                                                         }
 
 
+########################### SPECIFY THE CHECKPOINT ###############################
 
+# Every request is stored in data/checkpoints/pbfinance as soon as it arrives. If the run fails,
+# start the script again: stored requests are read from disk and only the missing ones are sent
+checkpoint = RefreshCheckpoint('pbfinance')
 
-########################### RETRIEVE WB DATA ##########################
-
-# # World Bank 
-# wb_data = get_wb_data(featureMap_indicators, START_YEAR, END_YEAR)
-
-
-# # ########################### MANUALLY CALCULATE GDP GROWTH ##########################
+########################### SPECIFY THE REFRESH ###############################
 
-# # Step 1: Create an empty list to store new rows
-# new_rows = []
+# Observations of earlier runs are kept in data/observations/pbfinance. Only the years after them
+# are fetched, plus the last REVISION_LOOKBACK years (the sources revise their latest values).
+# Delete the folder to fetch the full history again.
+REVISION_LOOKBACK = 2
+store = ObservationStore('pbfinance')
 
-# # Step 2-3: Iterate through each row in the dataframe
-# for index, row in wb_data.iterrows():
 
-#     if row['Indicator Code'] == 'NY.GDP.MKTP.PP.KD':  # Check if indicators column has the desired value
-#         country = row['Country Code']
-#         year = row['Year']
-#         prev_year = year - 1
+########################### RETRIEVE WB DATA ##########################
 
-#         # Find the corresponding row from the previous year
-#         prev_year_row = wb_data[(wb_data['Country Code'] == country) & 
-#                                 (wb_data['Year'] == prev_year) & 
-#                                 (wb_data['Indicator Code'] == 'NY.GDP.MKTP.PP.KD')]
+if FETCH_SOURCES:
 
-#         if not prev_year_row.empty:
-#                 prev_year_value = prev_year_row['Value'].values[0]
-#                 current_value = row['Value']
+    # World Bank 
+    wb_data = refresh_indicators(store, 'wb', featureMap_indicators, START_YEAR, END_YEAR,
+                                 lambda indicators, start, end: get_wb_data(indicators, start, end, checkpoint=checkpoint),
+                                 lookback=REVISION_LOOKBACK)
 
-#                 # Calculate the new value based on the formula
-#                 new_value =((current_value / prev_year_value) - 1) * 100
-#                 new_value = round(new_value, 2)
+    # Calculate derived indicators
+    wb_data = add_derived_indicators(wb_data, DERIVED_INDICATORS_WB)
 
-#                 # Create a new row with the calculated value and all other columns from the current year's row
-#                 new_row = row.copy()  # Copy all columns
-#                 new_row['Year'] = year
-#                 new_row['Value'] = new_value
-#                 new_row['Indicator'] = 'GDP Growth'
-#                 new_row['Indicator Code'] = 'GDP Growth'
-#                 new_rows.append(new_row)
+    # Calculate region values for the indicators and attach to df
+    wb_data = pd.concat([wb_data, aggregate_classifications(wb_data, weight_indicator=AGGREGATION_WEIGHT)])
+    wb_data.to_csv('data/pbfinance_wb.csv', index=False)
 
-# # Step 4-5: Append new rows to the original dataframe
-# wb_data = wb_data.append(new_rows, ignore_index=True)
-# # Calculate region values for the indicators and attach to df
+########################### RETRIEVE ILO DATA ##########################
 
-# selected_cols  = ['Region', 'Income Group', 'Least Developed Countries (LDC)', 
-#                   'Land Locked Developing Countries (LLDC)', 
-#                   'Small Island Developing States (SIDS)']
+if FETCH_SOURCES:
 
-# for ele in selected_cols: 
-#     mean_values = wb_data.groupby([ele , 'Indicator', 'Year'])['Value'].mean().reset_index()
-#     mean_values = mean_values[~(mean_values[ele] == 0)]
-#     wb_data = pd.concat([wb_data, mean_values])
-# wb_data.to_csv('data/pbfinance_wb.csv', index=False)
+    # ILOSTAT
+    ilo_data = refresh_indicators(store, 'ilo', INDICATORS_ILO, START_YEAR, END_YEAR,
+                                  lambda indicators, start, end: get_ilo_data(indicators, start, end, featureMap_params,
+                                                                              max_workers=MAX_WORKERS, max_per_host=MAX_PER_HOST,
+                                                                              checkpoint=checkpoint),
+                                  lookback=REVISION_LOOKBACK)
 
-########################### RETRIEVE ILO DATA ##########################
+    # Multiply all values in ILO dataframe by 1000 to get normal values (except LFR and UER)
+    conditions = ~ilo_data['Indicator'].isin(['Labour force participation rate', 'Unemployment rate'])
+    ilo_data.loc[conditions, 'Value'] = ilo_data.loc[conditions, 'Value'] * 1000
 
+    # Calculate region values for the indicators and attach to df
+    ilo_data = pd.concat([ilo_data, aggregate_classifications(ilo_data, weight_indicator=AGGREGATION_WEIGHT)])
+    ilo_data.to_csv('data/pbfinance_ilo.csv', index=False)
 
-# # ILOSTAT
-# ilo_data = get_ilo_data(INDICATORS_ILO, START_YEAR, END_YEAR, featureMap_params)
+########################### RETRIEVE IMF DATA ##########################
 
-# # Multiply all values in ILO dataframe by 1000 to get normal values (except LFR and UER)
-# conditions = ~ilo_data['Indicator'].isin(['Labour force participation rate', 'Unemployment rate'])
-# ilo_data.loc[conditions, 'Value'] = ilo_data.loc[conditions, 'Value'] * 1000
+if FETCH_SOURCES:
 
-# # # # Concat dataframes and append country classifications
-# # # df_pb_finance = pd.concat([wb_data, ilo_data])
-# selected_cols  = ['Region', 'Income Group', 'Least Developed Countries (LDC)', 
-#                   'Land Locked Developing Countries (LLDC)', 
-#                   'Small Island Developing States (SIDS)']
+    # IMF 
+    imf_data = refresh_indicators(store, 'imf', INDICATORS_IMF, START_YEAR, END_YEAR,
+                                  lambda indicators, start, end: get_imf_data_updated(indicators, start, end, checkpoint=checkpoint),
+                                  lookback=REVISION_LOOKBACK)
+    imf_data = pd.concat([imf_data, aggregate_classifications(imf_data, weight_indicator=AGGREGATION_WEIGHT)])
+    imf_data.to_csv('data/pbfinance_imf.csv', index=False)
 
-# for ele in selected_cols: 
-#     mean_values = ilo_data.groupby([ele , 'Indicator', 'Year'])['Value'].mean().reset_index()
-#     mean_values = mean_values[~(mean_values[ele] == 0)]
-#     ilo_data = pd.concat([ilo_data, mean_values])
-# ilo_data.to_csv('data/pbfinance_ilo.csv', index=False)
 
-# ########################### RETRIEVE IMF DATA ##########################
+########################### MERGE THE DATASETS ##########################
 
-# # # IMF 
-# imf_data = get_imf_data_updated(INDICATORS_IMF)
-# selected_cols  = ['Region', 'Income Group', 'Least Developed Countries (LDC)', 
-#                   'Land Locked Developing Countries (LLDC)', 
-#                   'Small Island Developing States (SIDS)']
+# Union of the three sources (an indicator in several sources is taken from the first one)
+df_pb_finance = merge_datasets([pd.read_csv('data/pbfinance_wb.csv'),
+                                pd.read_csv('data/pbfinance_ilo.csv'),
+                                pd.read_csv('data/pbfinance_imf.csv')])
 
-# for ele in selected_cols: 
-#     mean_values = imf_data.groupby([ele , 'Indicator', 'Year'])['Value'].mean().reset_index()
-#     mean_values = mean_values[~(mean_values[ele] == 0)]
-#     imf_data = pd.concat([imf_data, mean_values])
-# imf_data.to_csv('data/pbfinance_imf.csv', index=False)
+# Save as Parquet dataset (the dashboard reads it) with a CSV export for the download button
+save_dataset(df_pb_finance, 'data/pbfinance.parquet', csv_path='data/pbfinance.csv')
 
+# Save the country profiles of the Guided pages (written after the dataset, so it is newer)
+build_profile_bundle(df_pb_finance, 'data/pbfinance_profiles.arrow')
 
+# The run is complete, the next run fetches fresh data
+checkpoint.clear()
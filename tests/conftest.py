@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The tests import the api_functions package of the repository
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
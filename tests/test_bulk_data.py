@@ -0,0 +1,65 @@
+import gzip
+import os
+import zipfile
+import pandas as pd
+import pytest
+from api_functions.bulk_data import OUTPUT_COLS, get_ilo_bulk_data, get_wb_bulk_data
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(autouse=True)
+def repo_root(monkeypatch):
+
+    # The country columns are read from country_classifications/ (relative to the repo root)
+    monkeypatch.chdir(ROOT)
+
+
+def write_ilo_file(path, rows, columns):
+    with gzip.open(path, 'wt') as file:
+        pd.DataFrame(rows, columns=columns).to_csv(file, index=False)
+
+
+def test_wb_bulk_data(tmp_path):
+    df_bulk = pd.DataFrame({'Country Name': ['Germany', 'Germany', 'France', 'World'],
+                            'Country Code': ['DEU', 'DEU', 'FRA', 'WLD'],
+                            'Indicator Name': ['Population, total', 'GDP (current US$)', 'Population, total', 'Population, total'],
+                            'Indicator Code': ['SP.POP.TOTL', 'NY.GDP.MKTP.CD', 'SP.POP.TOTL', 'SP.POP.TOTL'],
+                            '2019': [83.1, 3.9, 67.2, 7700.0], '2020': [83.2, 3.8, None, 7800.0], '2021': [83.1, 4.2, 67.7, 7900.0]})
+    archive_path = tmp_path / 'WDI_CSV.zip'
+    with zipfile.ZipFile(archive_path, 'w') as archive:
+        archive.writestr('WDICSV.csv', df_bulk.to_csv(index=False))
+        archive.writestr('WDISeries.csv', 'Series Code\nSP.POP.TOTL\n')
+
+    df = get_wb_bulk_data(archive_path, {'SP.POP.TOTL': 'Total population'}, 2019, 2021)
+
+    # Years up to (not including) the end year, blank values and aggregates dropped
+    assert list(df.columns) == OUTPUT_COLS
+    assert df[['Country Code', 'Indicator', 'Year', 'Value']].values.tolist() == [
+        ['DEU', 'Total population', 2019, 83.1], ['FRA', 'Total population', 2019, 67.2], ['DEU', 'Total population', 2020, 83.2]]
+    assert set(df['Country']) == {'Germany', 'France'}
+
+
+def test_ilo_bulk_data(tmp_path):
+    write_ilo_file(tmp_path / 'EMP_TEMP_SEX_AGE_NB_A.csv.gz',
+                   [['DEU', 'SEX_T', 'AGE_YTHADULT_YGE15', '2020', '41000', 'note'],
+                    ['DEU', 'SEX_F', 'AGE_YTHADULT_YGE15', '2020', '19500', ''],
+                    ['DEU', 'SEX_T', 'AGE_YTHADULT_Y15-24', '2020', '4000', ''],
+                    ['DEU', 'SEX_T', 'AGE_YTHADULT_YGE15', '2015', '39000', '']],
+                   ['ref_area', 'sex', 'classif1', 'time', 'obs_value', 'note_source'])
+    write_ilo_file(tmp_path / 'GDP_211P_NOC_NB_A.csv.gz',
+                   [['FRA', '2020', '40.3'], ['X01', '2020', '12.0']],
+                   ['ref_area', 'time', 'obs_value'])
+
+    indicators = {'Employment': {'indicator': 'EMP_TEMP_SEX_AGE_NB', 'SEX': 'SEX_T', 'AGE': 'AGE_YTHADULT_YGE15'},
+                  'GDP per worker': {'indicator': 'GDP_211P_NOC_NB'},
+                  'Employment female': {'indicator': 'EMP_TEMP_SEX_AGE_NB', 'SEX': 'SEX_F', 'AGE': 'AGE_YTHADULT_YGE15'},
+                  'GDP per worker total': {'indicator': 'GDP_211P_NOC_NB', 'SEX': 'SEX_T'}}
+    df = get_ilo_bulk_data(tmp_path, indicators, 2018, 2022)
+
+    # Rows in the order of the dictionary, a dimension the file does not have matches nothing
+    assert list(df.columns) == OUTPUT_COLS
+    assert df[['Country Code', 'Indicator Code', 'Indicator', 'Year', 'Value']].values.tolist() == [
+        ['DEU', 'EMP_TEMP_SEX_AGE_NB', 'Employment', 2020, 41000.0],
+        ['FRA', 'GDP_211P_NOC_NB', 'GDP per worker', 2020, 40.3],
+        ['DEU', 'EMP_TEMP_SEX_AGE_NB', 'Employment female', 2020, 19500.0]]
@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+from api_functions.data_cube import DataCube
+
+DF = pd.DataFrame({'Country': ['Germany', 'Germany', 'France', 'Italy', 'Italy'],
+                   'Indicator': ['Population', 'Population', 'Population', 'Population', 'Debt'],
+                   'Year': [2020, 2021, 2020, 2021, 2021],
+                   'Value': [83.0, 83.5, 67.0, 59.0, 150.0],
+                   'Region': ['Europe'] * 5,
+                   'Income Group': ['High income', 'High income', 'High income', 'Upper middle income', 'Upper middle income']})
+
+
+def test_slice_and_frame():
+    cube = DataCube(DF)
+    values = cube.get_slice(['France', 'Spain'], 2020, 2022, 'Population')
+    assert values.shape == (2, 1, 3)
+    df = cube.to_frame(values, ['France', 'Spain'], 2020, ['Population'])
+    assert df.columns.tolist() == ['Year', 'Indicator', 'Country', 'Value']
+    assert df['Year'].tolist() == [2020, 2020, 2021, 2021, 2022, 2022]
+    assert df['Value'].iloc[0] == 67.0 and df['Value'].iloc[1:].isna().all()
+
+
+def test_peer_and_group_means():
+    cube = DataCube(DF)
+    means = cube.get_peer_mean(['Germany', 'France', 'Italy'], 2020, 2021, ['Population', 'Debt'])
+    np.testing.assert_allclose(means, [[75.0, 71.25], [np.nan, 150.0]])
+
+    labels, group_means = cube.get_group_means('Income Group', 2020, 2021, ['Population'])
+    assert labels == ['High income', 'Upper middle income']
+    np.testing.assert_allclose(group_means[:, 0], [[75.0, 83.5], [np.nan, 59.0]])
@@ -0,0 +1,16 @@
+import io
+from api_functions.data_export import ExportCache
+
+
+def test_export_cache():
+    cache = ExportCache(max_size=10)
+    assert cache.get_file('a', lambda: b'12345') == b'12345'
+    assert cache.get_file('b', lambda: io.BytesIO(b'67890')) == b'67890'
+    assert 'a' in cache and 'b' in cache
+
+    # The least recently used file is dropped first, a file larger than the cache is not kept
+    cache.get_file('a', None)
+    cache.get_file('c', lambda: b'abc')
+    assert 'b' not in cache and 'a' in cache and 'c' in cache
+    assert cache.get_file('large', lambda: b'x' * 11) == b'x' * 11
+    assert 'large' not in cache and cache.get_file('large', None) is None
@@ -0,0 +1,58 @@
+import pandas as pd
+from api_functions.delta_refresh import ObservationStore, refresh_indicators
+
+INDICATORS = {'NY.GDP.MKTP.CD': 'GDP (current US$)', 'SP.POP.TOTL': 'Total population'}
+
+
+def make_fetch(calls, revision=0):
+
+    # Fetcher that returns one observation per country, indicator and year (as get_wb_data)
+    # and records the years it was asked for
+    def fetch(indicators_map, start_year, end_year):
+        calls.append((tuple(indicators_map), start_year, end_year))
+        rows = [{'Country Code': code, 'Country': country, 'Indicator Code': key, 'Indicator': name,
+                 'Year': year, 'Value': float(year + revision), 'Region': 'Europe'}
+                for code, country in [('DEU', 'Germany'), ('FRA', 'France')]
+                for key, name in indicators_map.items()
+                for year in range(start_year, end_year + 1)]
+        return pd.DataFrame(rows)
+
+    return fetch
+
+
+def test_refresh_fetches_only_the_years_after_the_stored_ones(tmp_path):
+    calls = []
+    refresh_indicators(ObservationStore('test', store_dir=tmp_path), 'wb', INDICATORS, 2000, 2010, make_fetch(calls))
+
+    # A later run (with revised values) asks for the lookback years and the new ones only
+    store = ObservationStore('test', store_dir=tmp_path)
+    df = refresh_indicators(store, 'wb', INDICATORS, 2000, 2012, make_fetch(calls, revision=1000), lookback=2)
+
+    assert calls == [(tuple(INDICATORS), 2000, 2010), (tuple(INDICATORS), 2008, 2012)]
+    assert len(df) == 2 * 2 * 13
+    assert not df.duplicated(['Country Code', 'Indicator', 'Year']).any()
+    values = df.set_index(['Country Code', 'Indicator', 'Year'])['Value']
+    assert values['DEU', 'Total population', 2007] == 2007
+    assert values['DEU', 'Total population', 2009] == 3009
+    assert list(df['Indicator'].unique()) == list(INDICATORS.values())
+
+
+def test_observations_that_differ_in_a_dimension_are_kept(tmp_path):
+    store = ObservationStore('test', store_dir=tmp_path)
+    df = pd.DataFrame({'Country Code': ['DEU'] * 3, 'Indicator Code': ['EMP_TEMP_SEX_AGE_NB'] * 3,
+                       'Indicator': ['Employment'] * 3, 'Year': [2020] * 3, 'Value': [1.0, 2.0, 3.0],
+                       'sex': ['SEX_T', 'SEX_F', 'SEX_M']})
+    store.upsert('ilo', df, ['Employment'], 2020, 2020)
+    store.upsert('ilo', df.assign(Value=[1.5, 2.5, 3.5]).iloc[:1], ['Employment'], 2020, 2020)
+
+    stored = store.get_observations('ilo').set_index('sex')['Value']
+    assert stored.to_dict() == {'SEX_T': 1.5, 'SEX_F': 2.0, 'SEX_M': 3.0}
+
+
+def test_empty_fetch_on_an_empty_store(tmp_path):
+    store = ObservationStore('test', store_dir=tmp_path)
+    df = refresh_indicators(store, 'wb', INDICATORS, 2000, 2010, lambda *args: pd.DataFrame())
+
+    # Nothing is noted as fetched, so the next run asks for all years again
+    assert df.empty and 'Indicator' in df.columns
+    assert store.get_window_start('wb', 'SP.POP.TOTL', 2000, 2010) == 2000
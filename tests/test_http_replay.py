@@ -0,0 +1,100 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from api_functions import http_replay, http_retry, imf_parser
+from api_functions.http_replay import FaultInjector, NotRecordedError, get_replay_adapter
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), 'fixtures', 'http')
+
+# Recorded CompactData response (DE with three years, FR with a single observation)
+IMF_URL = ("http://dataservices.imf.org/REST/SDMX_JSON.svc/CompactData/IFS/A.DE+FR.NGDP_XDC"
+           "?startPeriod=2019&endPeriod=2021")
+
+
+def make_session(mode, fixture_dir, injector=None):
+    adapter, transport = get_replay_adapter(mode, fixture_dir, injector)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session, transport
+
+
+@pytest.fixture(autouse=True)
+def no_waiting(monkeypatch):
+    # Retries and throttled responses do not wait in the tests
+    monkeypatch.setattr(http_retry, 'BACKOFF_BASE', 0.0)
+    monkeypatch.setattr(http_replay, 'THROTTLE_RETRY_AFTER', 0)
+
+
+def test_replay_serves_the_fixture_corpus(monkeypatch):
+    session, _ = make_session('replay', FIXTURE_DIR, FaultInjector(0, 0, 0))
+    monkeypatch.setattr(imf_parser, 'get_session', lambda: session)
+
+    df = imf_parser.read_compact_data(IMF_URL)
+
+    assert list(df.columns) == imf_parser.COLUMNS
+    assert df['area'].tolist() == ['DE', 'DE', 'DE', 'FR']
+    assert df['period'].tolist() == ['2019', '2020', '2021', '2021']
+    assert df['value'].tolist() == [3473260.0, 3403730.0, 3617450.0, 2500870.0]
+    assert df['unit_mult'].tolist() == [6, 6, 6, 6]
+
+
+def test_replay_without_recording_raises_connection_error():
+    session, transport = make_session('replay', FIXTURE_DIR, FaultInjector(0, 0, 0))
+
+    with pytest.raises(requests.ConnectionError) as error:
+        session.get(IMF_URL.replace('NGDP_XDC', 'NX_XDC'))
+
+    # A missing recording is permanent, it is not retried
+    assert isinstance(error.value, NotRecordedError)
+    assert transport.stats['dataservices.imf.org']['retries'] == 0
+
+
+def test_replay_recovers_from_injected_faults():
+    injector = FaultInjector(latency=0, error_rate=0.2, throttle_rate=0.1, seed=7)
+    session, transport = make_session('replay', FIXTURE_DIR, injector)
+
+    for _ in range(10):
+        response = session.get(IMF_URL)
+        assert response.status_code == 200
+        assert response.json()['CompactData']['DataSet']['Series'][0]['@REF_AREA'] == 'DE'
+
+    # The faults were injected and every one of them was retried
+    stats = transport.stats['dataservices.imf.org']
+    assert injector.counts['errors'] > 0 and injector.counts['throttled'] > 0
+    assert stats['retries'] == injector.counts['errors'] + injector.counts['throttled']
+    assert stats['requests'] == injector.counts['requests']
+
+
+def test_record_then_replay_without_the_service(tmp_path):
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = f'{{"path": "{self.path}"}}'.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/v2/country/DEU?format=json"
+    try:
+        session, _ = make_session('record', str(tmp_path))
+        assert session.get(url).json() == {'path': '/v2/country/DEU?format=json'}
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # The service is gone, the recorded response is replayed
+    session, _ = make_session('replay', str(tmp_path), FaultInjector(0, 0, 0))
+    assert session.get(url).json() == {'path': '/v2/country/DEU?format=json'}
@@ -0,0 +1,24 @@
+import pytest
+from api_functions.imf_parser import iter_compact_chunks
+
+PAYLOAD = (b'{"CompactData": {"DataSet": {"Series": ['
+           b'{"@REF_AREA": "DE", "@INDICATOR": "NGDP_XDC", "@UNIT_MULT": "6", "Obs": [{"@TIME_PERIOD": "2020", "@OBS_VALUE": "3403.73"}]}, '
+           b'{"@REF_AREA": "FR", "@INDICATOR": "NGDP_XDC", "Obs": {"@TIME_PERIOD": "2020", "@OBS_VALUE": "2310.47"}}'
+           b']}}}')
+
+
+def split(payload, size=7):
+    return [payload[i:i + size] for i in range(0, len(payload), size)]
+
+
+def test_compact_chunks():
+    df = next(iter_compact_chunks(split(PAYLOAD)))
+    assert df[['area', 'period', 'value', 'unit_mult']].values.tolist() == [['DE', '2020', 3403.73, 6], ['FR', '2020', 2310.47, 0]]
+
+
+def test_truncated_payload_raises():
+
+    # The connection drops between two series
+    truncated = PAYLOAD[:PAYLOAD.index(b'{"@REF_AREA": "FR"')]
+    with pytest.raises(ValueError, match='Truncated CompactData payload'):
+        list(iter_compact_chunks(split(truncated)))